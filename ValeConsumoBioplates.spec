@@ -3,7 +3,8 @@ from PyInstaller.utils.hooks import collect_all
 
 datas = []
 binaries = []
-hiddenimports = ['reportlab', 'numpy', 'PIL', 'openpyxl', 'xlrd', 'pypdf', 'PyPDF2']
+# numpy/pandas se cargan con startup.lazy_module: PyInstaller no los ve solo
+hiddenimports = ['reportlab', 'numpy', 'pandas', 'PIL', 'openpyxl', 'xlrd', 'pypdf', 'PyPDF2']
 tmp_ret = collect_all('numpy')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('reportlab')
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Mediciones reproducibles de las optimizaciones de la interfaz.
+
+Uso::
+
+    python benchmarks.py            # todas
+    python benchmarks.py tree_sync  # una en particular
+
+Las mediciones de Treeview corren sobre un arbol de registro que cuenta las
+operaciones (funciona sin pantalla); si hay display disponible se repiten
+sobre un ``ttk.Treeview`` real para medir tiempo.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tree_sync import TreeSync
+
+
+class RecordingTree:
+    """Imitacion minima de ``ttk.Treeview`` (un solo nivel) que cuenta operaciones."""
+
+    def __init__(self) -> None:
+        self._order: List[str] = []
+        self._detached: set = set()
+        self._items: Dict[str, dict] = {}
+        self.calls: Dict[str, int] = {}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        self.calls[name] = self.calls.get(name, 0) + n
+
+    def get_children(self, _parent: str = '') -> tuple:
+        return tuple(self._order)
+
+    def insert(self, _parent: str, index, iid: str, values=(), tags=()) -> str:
+        self._count('insert')
+        k = len(self._order) if index == 'end' else int(index)
+        self._order.insert(k, iid)
+        self._items[iid] = {'values': tuple(values), 'tags': tuple(tags)}
+        return iid
+
+    def delete(self, *iids: str) -> None:
+        self._count('delete', len(iids))
+        gone = set(iids)
+        self._order = [i for i in self._order if i not in gone]
+        for iid in iids:
+            self._items.pop(iid, None)
+            self._detached.discard(iid)
+
+    def detach(self, *iids: str) -> None:
+        self._count('detach', len(iids))
+        gone = set(iids)
+        self._order = [i for i in self._order if i not in gone]
+        self._detached.update(iids)
+
+    def move(self, iid: str, _parent: str, index) -> None:
+        self._count('move')
+        if iid in self._detached:
+            self._detached.discard(iid)
+        else:
+            self._order.remove(iid)
+        self._order.insert(int(index), iid)
+
+    def item(self, iid: str, option: Optional[str] = None, **kw):
+        self._count('item')
+        if option is not None:
+            return self._items[iid][option]
+        self._items[iid].update({k: tuple(v) for k, v in kw.items()})
+
+    def reset_calls(self) -> None:
+        self.calls = {}
+
+
+def _rebuild(tree, rows: Sequence[Tuple[str, tuple, tuple]]) -> None:
+    """El refresco anterior: borrar todo y volver a insertar."""
+    for iid in tree.get_children(''):
+        tree.delete(iid)
+    for iid, values, tags in rows:
+        tree.insert('', 'end', iid=iid, values=values, tags=tags)
+
+
+def _stripe_all(tree) -> None:
+    """La pasada de zebra anterior: leer y reescribir los tags de cada fila."""
+    for n, iid in enumerate(tree.get_children('')):
+        current = tree.item(iid, 'tags')
+        if current and ('vencimiento_proximo' in current or 'vencido' in current):
+            continue
+        tree.item(iid, tags=('evenrow' if n % 2 == 0 else 'oddrow',))
+
+
+def _history_rows(n: int) -> List[Tuple[str, tuple, tuple]]:
+    return [
+        (str(num), (num, 'Pendiente', f'2026-01-{1 + num % 28:02d} 10:00', f'vale_{num}.pdf', 1 + num % 9), ())
+        for num in range(n, 0, -1)
+    ]
+
+
+def _edit_sequences(n: int) -> Dict[str, Tuple[list, list]]:
+    rnd = random.Random(7)
+    base = _history_rows(n)
+    seqs: Dict[str, Tuple[list, list]] = {}
+    # Vale nuevo: una fila arriba
+    seqs['vale nuevo'] = (base, _history_rows(n + 1))
+    # Cambio de estado de un vale
+    changed = list(base)
+    k = rnd.randrange(n)
+    iid, vals, tags = changed[k]
+    changed[k] = (iid, (vals[0], 'Aprobado') + vals[2:], tags)
+    seqs['cambio de estado'] = (base, changed)
+    # Busqueda que deja ~10%
+    seqs['busqueda'] = (base, [r for r in base if r[0].endswith('7')])
+    # Borrar la busqueda
+    seqs['limpiar busqueda'] = (seqs['busqueda'][1], base)
+    # Anular un vale en el gestor filtrado por estado (sale de la lista)
+    seqs['vale sale del filtro'] = (base, base[:k] + base[k + 1:])
+    # Linea agregada a la solicitud con orden por recorrido (queda al medio)
+    lines = [(f'val-{i}', (f'Producto {i}', f'L{i}', f'A-{i:02d}', '2026-06-30', 1), ()) for i in range(40)]
+    seqs['linea en solicitud'] = (lines, lines[:17] + [('val-new', ('Nuevo', 'L', 'A-17', '2026-06-30', 2), ())] + lines[17:])
+    # Orden invertido (peor caso para el diff)
+    seqs['orden invertido'] = (base, base[::-1])
+    return seqs
+
+
+def bench_tree_sync(n: int = 2000) -> None:
+    print(f'Treeview: borrar+reinsertar vs TreeSync ({n} filas de historial)')
+    print(f'  {"secuencia":<22}{"reconstruir":>12}{"diff":>8}   detalle')
+    for name, (before, after) in _edit_sequences(n).items():
+        full = RecordingTree()
+        _rebuild(full, before)
+        full.reset_calls()
+        _rebuild(full, after)
+        full_ops = sum(full.calls.values())
+
+        tree = RecordingTree()
+        sync = TreeSync(tree)
+        sync.apply(before)
+        tree.reset_calls()
+        stats = sync.apply(after)
+        assert list(tree.get_children('')) == [r[0] for r in after]
+        detail = ', '.join(f'{k}={v}' for k, v in sorted(tree.calls.items())) or '-'
+        print(f'  {name:<22}{full_ops:>12}{stats.ops:>8}   {detail}')
+    _bench_tree_sync_tk(n)
+
+
+def bench_stripes(n: int = 10000) -> None:
+    print(f'Zebra: pasada completa vs tags al insertar ({n} filas de historial)')
+    print(f'  {"secuencia":<22}{"reconstruir+pasada":>19}{"diff+zebra":>12}{"filas retocadas":>17}')
+    seqs = _edit_sequences(n)
+    seqs['ordenar por numero'] = (seqs['vale nuevo'][0], sorted(seqs['vale nuevo'][0], key=lambda r: int(r[0])))
+    for name, (before, after) in seqs.items():
+        legacy = RecordingTree()
+        _rebuild(legacy, before)
+        _stripe_all(legacy)
+        legacy.reset_calls()
+        _rebuild(legacy, after)
+        _stripe_all(legacy)
+        legacy_ops = sum(legacy.calls.values())
+
+        tree = RecordingTree()
+        sync = TreeSync(tree, stripes=('evenrow', 'oddrow'), keep=('vencimiento_proximo', 'vencido'))
+        sync.apply(before)
+        tree.reset_calls()
+        stats = sync.apply(after)
+        assert [tree._items[i]['tags'] for i in tree.get_children('')] == [
+            (('evenrow', 'oddrow')[k % 2],) for k in range(len(after))
+        ]
+        print(f'  {name:<22}{legacy_ops:>19}{stats.ops:>12}{stats.updated:>17}')
+
+
+FRAME_MS = 16.0
+
+
+def _picker_inventory(n: int):
+    import pandas as pd
+    from inventory_index import prepare_search_columns
+
+    rnd = random.Random(11)
+    words = ['placa', 'petri', 'agar', 'medio', 'cultivo', 'tubo', 'sangre', 'caldo', 'cromogenico', 'hisopo']
+    df = pd.DataFrame({
+        'Nombre_del_Producto': [' '.join(rnd.sample(words, 3)).title() + f' {i % 977}' for i in range(n)],
+        'Codigo': [f'C{i % 5000:05d}' for i in range(n)],
+        'Lote': [f'L{rnd.randrange(10 ** 6)}' for _ in range(n)],
+        'Bodega': [rnd.choice(('Bodega Central', 'Frio', 'Cuarentena')) for _ in range(n)],
+        'Ubicacion': [f'A-{i % 40:02d}-{i % 7}' for i in range(n)],
+        'Vencimiento': ['2026-06-30'] * n,
+        'Stock': [rnd.randrange(1, 50) for _ in range(n)],
+    })
+    prepare_search_columns(df)
+    return df
+
+
+def _picker_legacy(df, term: str) -> None:
+    """El selector anterior: cinco str.contains por tecla y 500 filas con iterrows."""
+    if term:
+        mask = None
+        for col in ('Nombre_del_Producto', 'Codigo', 'Lote', 'Bodega', 'Ubicacion'):
+            hit = df[col].astype(str).str.lower().str.contains(term, na=False, regex=False)
+            mask = hit if mask is None else mask | hit
+        df = df[mask]
+    for _idx, row in df.head(500).iterrows():
+        tuple(str(row.get(c, '')) for c in ('Nombre_del_Producto', 'Codigo', 'Lote', 'Bodega', 'Ubicacion', 'Vencimiento', 'Stock'))
+
+
+def bench_picker(n: int = 100000) -> None:
+    from inventory_index import RowSearch
+
+    df = _picker_inventory(n)
+    t0 = time.perf_counter()
+    search = RowSearch.from_frame(df)
+    build_ms = (time.perf_counter() - t0) * 1000
+    print(f'Selector de productos: {n} filas (claves armadas una vez en {build_ms:.0f} ms)')
+    print(f'  {"termino":<12}{"anterior ms":>12}{"indice ms":>11}{"aciertos":>10}')
+    cols = ['Nombre_del_Producto', 'Codigo', 'Lote', 'Bodega', 'Ubicacion', 'Vencimiento', 'Stock']
+    worst = 0.0
+    for term in ('p', 'pl', 'pla', 'plac', 'placa', 'placa 12', 'c0012', 'l99'):
+        t0 = time.perf_counter()
+        _picker_legacy(df, term)
+        legacy_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        pos = search.search(term)
+        # La tabla virtual solo extrae la ventana visible (~30 filas)
+        df.iloc[pos[:30]][cols].to_numpy()
+        new_ms = (time.perf_counter() - t0) * 1000
+        worst = max(worst, new_ms)
+        print(f'  {term:<12}{legacy_ms:>12.1f}{new_ms:>11.1f}{len(pos):>10}')
+    assert worst <= FRAME_MS * 2, f'busqueda de {worst:.1f} ms, mas de dos cuadros'
+    print(f'  peor tecla: {worst:.1f} ms (cuadro: {FRAME_MS:.0f} ms)')
+
+
+# Presupuesto de tiempo hasta la primera ventana (ms desde el primer import)
+FIRST_WINDOW_BUDGET_MS = float(os.environ.get('VALE_FIRST_WINDOW_BUDGET_MS', '1000'))
+
+_STARTUP_SCRIPT = '''
+import json, sys
+import startup
+from startup import STARTUP, loaded_heavy_modules
+if sys.argv[1] == 'eager':
+    # Como antes: numpy, pandas y reportlab al importar la app
+    import numpy, pandas, pdf_utils
+import vale_consumo_bioplates as app
+STARTUP.mark('imports')
+out = {'imports': STARTUP.elapsed('imports'), 'heavy': loaded_heavy_modules()}
+try:
+    root = app.open_main_window()
+except Exception as exc:
+    out['no_display'] = exc.__class__.__name__
+else:
+    out['ventana'] = STARTUP.elapsed('ventana')
+    out['heavy'] = loaded_heavy_modules()
+    root.destroy()
+print(json.dumps(out))
+'''
+
+
+def _startup_run(mode: str) -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-c', _STARTUP_SCRIPT, mode],
+        cwd=here, capture_output=True, text=True, check=True,
+    )
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out['proceso'] = (time.perf_counter() - t0) * 1000
+    return out
+
+
+def bench_startup(runs: int = 5) -> None:
+    print(f'Arranque: imports diferidos vs imports al inicio (mediana de {runs} procesos)')
+    results = {mode: [_startup_run(mode) for _ in range(runs)] for mode in ('eager', 'lazy')}
+    has_window = 'ventana' in results['lazy'][0]
+    phase = 'ventana' if has_window else 'imports'
+    print(f'  {"modo":<10}{"imports ms":>12}{"ventana ms":>12}{"proceso ms":>12}   modulos pesados cargados')
+    medians = {}
+    for mode, runs_out in results.items():
+        med = {k: statistics.median(r[k] for r in runs_out) for k in ('imports', 'ventana', 'proceso') if k in runs_out[0]}
+        medians[mode] = med
+        heavy = ', '.join(runs_out[-1]['heavy']) or '-'
+        window = f'{med["ventana"]:.0f}' if 'ventana' in med else '-'
+        print(f'  {mode:<10}{med["imports"]:>12.0f}{window:>12}{med["proceso"]:>12.0f}   {heavy}')
+    if not has_window:
+        print(f'  (sin display: el presupuesto se verifica sobre los imports; {results["lazy"][0]["no_display"]})')
+    lazy = results['lazy'][-1]
+    assert not lazy['heavy'], f'modulos pesados cargados antes de la ventana: {lazy["heavy"]}'
+    assert medians['lazy'][phase] <= FIRST_WINDOW_BUDGET_MS, (
+        f'primera ventana en {medians["lazy"][phase]:.0f} ms, presupuesto {FIRST_WINDOW_BUDGET_MS:.0f} ms'
+    )
+    print(f'  {phase}: {medians["lazy"][phase]:.0f} ms <= presupuesto {FIRST_WINDOW_BUDGET_MS:.0f} ms')
+
+
+def _bench_tree_sync_tk(n: int) -> None:
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+    except Exception as exc:
+        print(f'  (sin display, se omite la medicion en ttk: {exc.__class__.__name__})')
+        return
+    try:
+        cols = ('n', 'estado', 'fecha', 'pdf', 'items')
+        print(f'  {"secuencia":<22}{"reconstruir ms":>15}{"diff ms":>10}')
+        for name, (before, after) in _edit_sequences(n).items():
+            timings = []
+            for fn in (_rebuild, None):
+                tree = ttk.Treeview(root, columns=cols, show='headings')
+                sync = TreeSync(tree)
+                sync.apply(before)
+                t0 = time.perf_counter()
+                if fn is None:
+                    sync.apply(after)
+                else:
+                    fn(tree, after)
+                root.update_idletasks()
+                timings.append((time.perf_counter() - t0) * 1000)
+                tree.destroy()
+            print(f'  {name:<22}{timings[0]:>15.1f}{timings[1]:>10.1f}')
+    finally:
+        root.destroy()
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    'tree_sync': bench_tree_sync,
+    'stripes': bench_stripes,
+    'startup': bench_startup,
+    'picker': bench_picker,
+}
+
+
+def main(argv: List[str]) -> int:
+    names = argv or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f'Benchmarks desconocidos: {", ".join(unknown)} (disponibles: {", ".join(BENCHMARKS)})')
+        return 2
+    for name in names:
+        BENCHMARKS[name]()
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
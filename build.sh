@@ -117,7 +117,7 @@ new_app_package() {
     args+=("--icon" "$ICON")
   fi
 
-  args+=("--hidden-import=reportlab" "--hidden-import=numpy" "--hidden-import=PIL" "--hidden-import=openpyxl")
+  args+=("--hidden-import=reportlab" "--hidden-import=numpy" "--hidden-import=pandas" "--hidden-import=PIL" "--hidden-import=openpyxl")
   args+=("--hidden-import=xlrd" "--hidden-import=pypdf" "--hidden-import=PyPDF2")
   args+=("--collect-all" "numpy" "--collect-all" "reportlab" "--collect-all" "PIL" "--collect-all" "openpyxl")
   args+=("--collect-all" "pypdf")
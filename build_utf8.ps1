@@ -203,6 +203,7 @@ function New-AppPackage {
 # Hidden-imports necesarios
     $argsList += @('--hidden-import=reportlab')
     $argsList += @('--hidden-import=numpy')
+    $argsList += @('--hidden-import=pandas')
     $argsList += @('--hidden-import=PIL')
     $argsList += @('--hidden-import=openpyxl')
     $argsList += @('--hidden-import=xlrd')
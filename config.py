@@ -14,6 +14,9 @@ AREA_FILTER: Final[str] = "Bioplates"
 # Carpeta para guardar vales generados
 HISTORY_DIR: Final[str] = "Vales_Historial"
 
+# Tramos de vencimiento (dias): vencido, <=30, <=60, <=90, mas de 90
+EXPIRY_BUCKET_DAYS: Final[tuple] = (30, 60, 90)
+
 # Márgenes PDF (en puntos)
 PDF_MARGIN_LEFT: Final[int] = 50
 PDF_MARGIN_RIGHT: Final[int] = 50
@@ -34,6 +37,11 @@ SUMATRA_PDF_PATH = os.environ.get("SUMATRA_PDF_PATH")
 # Mostrar emojis en la UI (puede causar texto corrupto en algunos Windows)
 USE_EMOJIS: Final[bool] = False
 
+# Vigia de latencia de la interfaz: latido del loop de Tk y umbral de congelamiento (ms).
+# VALE_UI_STALL_MS=0 desactiva la medicion.
+UI_LATENCY_INTERVAL_MS: Final[int] = 100
+UI_STALL_MS = int(os.environ.get("VALE_UI_STALL_MS", "250") or 0)
+
 # Logging
 LOG_LEVEL = os.environ.get("VALE_LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -8,7 +8,9 @@ import os
 import unicodedata
 from typing import Iterable, Callable, Optional
 
-import pandas as pd
+from startup import lazy_module
+
+pd = lazy_module('pandas')
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Ejecutor unico y cancelable para los filtros asincronos de la grilla.
+
+Un solo hilo de larga vida atiende las solicitudes. Solo se conserva la ultima
+pendiente (las anteriores se descartan sin ejecutarse) y el trabajo en curso
+consulta ``cancelled()`` entre etapas para abandonar cuanto antes si llego una
+solicitud mas nueva.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Optional, Tuple
+
+from filters import FilterCancelled
+
+log = logging.getLogger(__name__)
+
+# job(token, cancelled) -> None; el propio job publica su resultado (p. ej. en una Queue)
+FilterJob = Callable[[int, Callable[[], bool]], None]
+
+
+class FilterWorker:
+    """Hilo de filtrado que coalesce solicitudes: siempre corre la mas reciente."""
+
+    def __init__(self, name: str = 'filter-worker') -> None:
+        self._name = name
+        self._cond = threading.Condition()
+        self._pending: Optional[Tuple[int, FilterJob]] = None
+        self._latest = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def submit(self, job: FilterJob) -> int:
+        """Encola ``job`` reemplazando cualquier pendiente; devuelve su token."""
+        with self._cond:
+            self._latest += 1
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (self._latest, job)
+            self._ensure_thread()
+            self._cond.notify()
+            return self._latest
+
+    def cancel(self) -> None:
+        """Invalida el trabajo pendiente y el que este en curso."""
+        with self._cond:
+            self._latest += 1
+            self._pending = None
+
+    def is_current(self, token: int) -> bool:
+        return token == self._latest
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._latest += 1
+            self._cond.notify()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                token, job = self._pending
+                self._pending = None
+            try:
+                job(token, lambda: token != self._latest)
+            except FilterCancelled:
+                self.cancelled += 1
+            except Exception as exc:
+                log.error("Trabajo de filtro fallo: %s", exc)
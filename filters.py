@@ -3,11 +3,74 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
-import pandas as pd
+from inventory_index import InventoryIndex, location_parts, location_prefix_mask
+from startup import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+# Campos de texto filtrables: nombre -> [(columna en minusculas, columna original)]
+_TEXT_FIELDS = {
+    'lote': [('_lc_lote', 'Lote')],
+    'ubicacion': [('_lc_ubicacion', 'Ubicacion')],
+    'producto': [('_lc_producto', 'Nombre_del_Producto'), ('_lc_codigo', 'Codigo')],
+    'subfamilia': [('_lc_subfam', 'Subfamilia')],
+}
+
+# Costo relativo de evaluar un str.contains por fila frente a una comparacion numerica
+_STR_SCAN_COST = 8
+
+
+class FilterCancelled(Exception):
+    """El filtro en curso fue abandonado porque llego una solicitud mas nueva."""
+
+
+class QueryError(ValueError):
+    """Token del buscador que no se puede interpretar (fecha, cantidad u operador)."""
+
+    def __init__(self, message: str, token: str = '') -> None:
+        super().__init__(message)
+        self.token = token
+
+
+def _lc_values(df: pd.DataFrame, lc_col: str, src_col: str, pos: np.ndarray) -> pd.Series:
+    if lc_col in df.columns:
+        col = df[lc_col]
+    else:
+        col = df[src_col].fillna('').astype(str).str.lower()
+    return col.iloc[pos]
+
+
+def _contains(values: pd.Series, term: str) -> np.ndarray:
+    return values.str.contains(term, na=False, regex=False).to_numpy(dtype=bool)
+
+
+@dataclass
+class PlanStep:
+    """Un predicado del plan: como se evalua y cuantas filas se esperan."""
+
+    name: str
+    method: str  # 'index' | 'scan'
+    estimate: int
+    rows_in: int = 0
+    rows_out: int = 0
+    ms: float = 0.0
+
+
+@dataclass
+class _Predicate:
+    name: str
+    estimate: int
+    scan: Callable[[np.ndarray], np.ndarray]
+    lookup: Optional[Callable[[], np.ndarray]] = None
+    lookup_cost: int = 0
+    scan_weight: int = 1
 
 
 @dataclass
@@ -19,63 +82,616 @@ class FilterOptions:
     venc_hasta: str = ""
     subfamilia: str = "(Todas)"
     solo_con_stock: bool = False
+    stock_min: Optional[int] = None
+    stock_max: Optional[int] = None
+    # Prefijo jerarquico de ubicacion: "B-03" = todo el pasillo B-03 (componentes completos)
+    en_ubicacion: str = ""
+    # Negaciones: pares (campo, termino) con campo en lote/ubicacion/producto/subfamilia/en_ubicacion
+    excluir: Tuple[Tuple[str, str], ...] = ()
+    # Rangos negados: (campo, desde, hasta) con campo 'stock' (enteros) o 'venc'
+    # (YYYY-MM-DD); ambos extremos incluidos, None = abierto
+    excluir_rangos: Tuple[Tuple[str, Any, Any], ...] = ()
+
+    def signature(self) -> tuple:
+        """Tupla normalizada y hashable que identifica el resultado del filtro."""
+        return (
+            (self.producto or '').strip().lower(),
+            (self.lote or '').strip().lower(),
+            (self.ubicacion or '').strip().lower(),
+            (self.venc_desde or '').strip(),
+            (self.venc_hasta or '').strip(),
+            self.subfamilia or '(Todas)',
+            self.stock_threshold(),
+            self.stock_max,
+            tuple(sorted((f, (t or '').strip().lower()) for f, t in self.excluir)),
+            location_parts(self.en_ubicacion),
+            tuple(sorted(self.excluir_rangos, key=repr)),
+        )
+
+    def combine(self, other: 'FilterOptions') -> 'FilterOptions':
+        """Combina con ``other``: sus campos no vacios tienen prioridad."""
+        out = replace(self)
+        for name in ('producto', 'lote', 'ubicacion', 'venc_desde', 'venc_hasta', 'en_ubicacion'):
+            val = getattr(other, name)
+            if val:
+                setattr(out, name, val)
+        if other.subfamilia and other.subfamilia != '(Todas)':
+            out.subfamilia = other.subfamilia
+        out.solo_con_stock = self.solo_con_stock or other.solo_con_stock
+        if other.stock_min is not None:
+            out.stock_min = other.stock_min if self.stock_min is None else max(self.stock_min, other.stock_min)
+        if other.stock_max is not None:
+            out.stock_max = other.stock_max if self.stock_max is None else min(self.stock_max, other.stock_max)
+        out.excluir = tuple(self.excluir) + tuple(other.excluir)
+        out.excluir_rangos = tuple(self.excluir_rangos) + tuple(other.excluir_rangos)
+        return out
+
+    def stock_threshold(self) -> Optional[int]:
+        """Stock minimo exigido (None si no hay minimo)."""
+        thr = 1 if self.solo_con_stock else None
+        if self.stock_min is not None:
+            thr = self.stock_min if thr is None else max(thr, self.stock_min)
+        return thr
+
+    def _stock_ranges(self) -> List[Tuple[Optional[int], Optional[int]]]:
+        return [(lo, hi) for f, lo, hi in self.excluir_rangos if f == 'stock']
 
-    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+    def stock_cuts(self) -> Tuple[int, ...]:
+        """Valores de stock donde puede cambiar la pertenencia al filtro.
+
+        Un cambio de stock afecta al resultado solo si cruza alguno (ver
+        :meth:`FilterCache.affected_by`); vacio si el filtro no depende del stock.
+        """
+        cuts = set()
+        thr = self.stock_threshold()
+        if thr is not None:
+            cuts.add(thr)
+        if self.stock_max is not None:
+            cuts.add(self.stock_max + 1)
+        for lo, hi in self._stock_ranges():
+            if lo is not None:
+                cuts.add(lo)
+            if hi is not None:
+                cuts.add(hi + 1)
+        return tuple(sorted(cuts))
+
+    def stock_accepts(self, value: int) -> bool:
+        """True si un stock ``value`` cumple los filtros de stock."""
+        thr = self.stock_threshold()
+        if thr is not None and value < thr:
+            return False
+        if self.stock_max is not None and value > self.stock_max:
+            return False
+        for lo, hi in self._stock_ranges():
+            if (lo is None or value >= lo) and (hi is None or value <= hi):
+                return False
+        return True
+
+    def apply(self, df: pd.DataFrame, index: Optional[InventoryIndex] = None) -> pd.DataFrame:
         if df is None or df.empty:
             return df
+        return df.iloc[self.positions(df, index)]
+
+    def positions(
+        self,
+        df: pd.DataFrame,
+        index: Optional[InventoryIndex] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+    ) -> np.ndarray:
+        """Posiciones (iloc, ascendentes) de las filas que cumplen los filtros.
+
+        Si se entrega ``cancelled``, se consulta antes de cada predicado y se
+        lanza :class:`FilterCancelled` cuando devuelve True.
+        """
+        pos, _steps = self._execute(df, index, cancelled)
+        return pos
+
+    def explain(self, df: pd.DataFrame, index: Optional[InventoryIndex] = None) -> Dict[str, Any]:
+        """Ejecuta el filtro y devuelve el plan elegido con filas y tiempos por paso."""
+        t0 = time.perf_counter()
+        pos, steps = self._execute(df, index)
+        return {
+            'rows_total': 0 if df is None else len(df),
+            'rows_out': int(len(pos)),
+            'ms': (time.perf_counter() - t0) * 1000.0,
+            'indexed': index is not None and df is not None and index.matches(df),
+            'steps': [asdict(s) for s in steps],
+        }
 
-        out = df
+    def plan(self, df: pd.DataFrame, index: Optional[InventoryIndex] = None) -> List[PlanStep]:
+        """Plan sin ejecutar: predicados en orden de evaluacion y metodo elegido."""
+        return [s for s, _p in self._plan(df, index)]
 
-        # Solo con stock (filtro barato primero)
-        if self.solo_con_stock and 'Stock' in out.columns:
-            out = out[out['Stock'] > 0]
-            if out.empty:
-                return out
+    # ---------------- Internals ----------------
+    def _predicates(self, df: pd.DataFrame, index: Optional[InventoryIndex]) -> List[_Predicate]:
+        n = len(df)
+        stats = index.stats if index is not None else {}
+        preds: List[_Predicate] = []
+
+        # Stock: minimo, maximo y rangos negados (el stock cambia en caliente:
+        # siempre scan numerico)
+        thr = self.stock_threshold()
+        stock_max = self.stock_max
+        stock_out = self._stock_ranges()
+        if (thr is not None or stock_max is not None or stock_out) and 'Stock' in df.columns:
+            stock = df['Stock'].to_numpy()
+
+            def _scan_stock(pos: np.ndarray) -> np.ndarray:
+                vals = stock[pos]
+                keep = np.ones(len(pos), dtype=bool)
+                if thr is not None:
+                    keep &= vals >= thr
+                if stock_max is not None:
+                    keep &= vals <= stock_max
+                for lo, hi in stock_out:
+                    inside = np.ones(len(pos), dtype=bool)
+                    if lo is not None:
+                        inside &= vals >= lo
+                    if hi is not None:
+                        inside &= vals <= hi
+                    keep &= ~inside
+                return pos[keep]
+
+            positive = index is not None and thr is not None and thr >= 1
+            preds.append(_Predicate('stock', index.stock_positive if positive else n, _scan_stock))
 
         # Subfamilia exacta
-        if self.subfamilia and self.subfamilia != '(Todas)' and 'Subfamilia' in out.columns:
-            col = out['_subfam'] if '_subfam' in out.columns else out['Subfamilia'].astype(str)
-            out = out[col == self.subfamilia]
-            if out.empty:
-                return out
+        if self.subfamilia and self.subfamilia != '(Todas)' and 'Subfamilia' in df.columns:
+            subfam = self.subfamilia
+            col = df['_subfam'] if '_subfam' in df.columns else df['Subfamilia'].astype(str)
+            st = stats.get('_subfam')
+            preds.append(_Predicate(
+                'subfamilia',
+                st.frequency(subfam) if st is not None else n,
+                lambda pos: pos[col.to_numpy()[pos] == subfam],
+                (lambda: st.postings(st.exact_codes(subfam))) if st is not None else None,
+                lookup_cost=1,
+            ))
 
         # Vencimiento rango (YYYY-MM-DD)
         d1 = pd.to_datetime(self.venc_desde, errors='coerce') if self.venc_desde else pd.NaT
         d2 = pd.to_datetime(self.venc_hasta, errors='coerce') if self.venc_hasta else pd.NaT
-        if (pd.notna(d1) or pd.notna(d2)) and 'Vencimiento' in out.columns:
-            vdt = out['_venc_dt'] if '_venc_dt' in out.columns else pd.to_datetime(out['Vencimiento'], errors='coerce')
-            if pd.notna(d1):
-                out = out[vdt >= d1]
-            if pd.notna(d2):
-                out = out[vdt <= d2]
-            if out.empty:
-                return out
-
-        # Lote
-        lote_t = (self.lote or "").strip().lower()
-        if lote_t and 'Lote' in out.columns:
-            col = out['_lc_lote'] if '_lc_lote' in out.columns else out['Lote'].fillna('').astype(str).str.lower()
-            out = out[col.str.contains(lote_t, na=False, regex=False)]
-            if out.empty:
-                return out
-
-        # Ubicacion
-        ubi_t = (self.ubicacion or "").strip().lower()
-        if ubi_t and 'Ubicacion' in out.columns:
-            col = out['_lc_ubicacion'] if '_lc_ubicacion' in out.columns else out['Ubicacion'].fillna('').astype(str).str.lower()
-            out = out[col.str.contains(ubi_t, na=False, regex=False)]
-            if out.empty:
-                return out
-
-        # Texto de producto/codigo (al final para reducir filas)
-        term = (self.producto or "").strip().lower()
-        if term:
-            prod_col = out['_lc_producto'] if '_lc_producto' in out.columns else out['Nombre_del_Producto'].fillna('').astype(str).str.lower()
-            if 'Codigo' in out.columns:
-                code_col = out['_lc_codigo'] if '_lc_codigo' in out.columns else out['Codigo'].fillna('').astype(str).str.lower()
-                out = out[prod_col.str.contains(term, na=False, regex=False) | code_col.str.contains(term, na=False, regex=False)]
+        if (pd.notna(d1) or pd.notna(d2)) and 'Vencimiento' in df.columns:
+            lo_d = d1 if pd.notna(d1) else None
+            hi_d = d2 if pd.notna(d2) else None
+
+            def _scan_venc(pos: np.ndarray) -> np.ndarray:
+                vdt = df['_venc_dt'] if '_venc_dt' in df.columns else pd.to_datetime(df['Vencimiento'], errors='coerce')
+                vdt = vdt.iloc[pos]
+                mask = vdt.notna()
+                if lo_d is not None:
+                    mask &= vdt >= lo_d
+                if hi_d is not None:
+                    mask &= vdt <= hi_d
+                return pos[mask.to_numpy(dtype=bool)]
+
+            if index is not None:
+                lo, hi = index.venc_bounds(lo_d, hi_d)
+                preds.append(_Predicate(
+                    'vencimiento', hi - lo, _scan_venc,
+                    lambda: index.venc_order[lo:hi], lookup_cost=1,
+                ))
             else:
-                out = out[prod_col.str.contains(term, na=False, regex=False)]
+                preds.append(_Predicate('vencimiento', n, _scan_venc))
 
-        return out
+        # Rangos de vencimiento negados: se descartan las fechas dentro del rango
+        for f, lo_s, hi_s in self.excluir_rangos:
+            if f != 'venc' or 'Vencimiento' not in df.columns:
+                continue
+            lo_x = pd.Timestamp(lo_s) if lo_s else None
+            hi_x = pd.Timestamp(hi_s) if hi_s else None
+
+            def _scan_not_venc(pos: np.ndarray, lo_x=lo_x, hi_x=hi_x) -> np.ndarray:
+                vdt = df['_venc_dt'] if '_venc_dt' in df.columns else pd.to_datetime(df['Vencimiento'], errors='coerce')
+                vdt = vdt.iloc[pos]
+                inside = vdt.notna()
+                if lo_x is not None:
+                    inside &= vdt >= lo_x
+                if hi_x is not None:
+                    inside &= vdt <= hi_x
+                return pos[~inside.to_numpy(dtype=bool)]
+
+            if index is not None:
+                x_lo, x_hi = index.venc_bounds(lo_x, hi_x)
+                preds.append(_Predicate('no_vencimiento', max(0, n - (x_hi - x_lo)), _scan_not_venc))
+            else:
+                preds.append(_Predicate('no_vencimiento', n, _scan_not_venc))
+
+        # Textos (substring): la estimacion se obtiene de los valores distintos
+        def _text(name: str, term: str, cols: List[tuple], negate: bool = False) -> None:
+            present = [(lc, src) for lc, src in cols if src in df.columns]
+            if not term or not present:
+                return
+
+            def _scan(pos: np.ndarray) -> np.ndarray:
+                hit = None
+                for lc, src in present:
+                    h = _contains(_lc_values(df, lc, src, pos), term)
+                    hit = h if hit is None else (hit | h)
+                return pos[~hit] if negate else pos[hit]
+
+            col_stats = [stats.get(lc) for lc, _src in present]
+            if any(st is None for st in col_stats):
+                preds.append(_Predicate(name, n, _scan, scan_weight=_STR_SCAN_COST))
+                return
+            codes = [st.contains_codes(term) for st in col_stats]
+            matched = min(n, sum(st.rows_for(c) for st, c in zip(col_stats, codes)))
+            if negate:
+                # El complemento de una lista de postings no es un lookup util: solo scan
+                preds.append(_Predicate(name, max(0, n - matched), _scan, scan_weight=_STR_SCAN_COST))
+                return
+
+            def _lookup() -> np.ndarray:
+                parts = [st.postings(c) for st, c in zip(col_stats, codes)]
+                rows = parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+                return rows
+
+            preds.append(_Predicate(
+                name, matched, _scan, _lookup,
+                lookup_cost=sum(st.distinct for st in col_stats),
+                scan_weight=_STR_SCAN_COST,
+            ))
+
+        # Prefijo de ubicacion: slice del arbol zona/pasillo/rack/nivel
+        def _location(name: str, prefix: str, negate: bool = False) -> None:
+            if not location_parts(prefix) or 'Ubicacion' not in df.columns:
+                return
+
+            def _scan(pos: np.ndarray) -> np.ndarray:
+                hit = location_prefix_mask(df['Ubicacion'].iloc[pos], prefix)
+                return pos[~hit] if negate else pos[hit]
+
+            if index is None:
+                preds.append(_Predicate(name, n, _scan, scan_weight=_STR_SCAN_COST))
+                return
+            node = index.location_node(prefix)
+            matched = 0 if node is None else node.rows
+            if negate:
+                preds.append(_Predicate(name, n - matched, _scan, scan_weight=_STR_SCAN_COST))
+                return
+            preds.append(_Predicate(
+                name, matched, _scan, lambda: index.location_rows(prefix),
+                lookup_cost=1, scan_weight=_STR_SCAN_COST,
+            ))
+
+        _text('lote', (self.lote or "").strip().lower(), _TEXT_FIELDS['lote'])
+        _text('ubicacion', (self.ubicacion or "").strip().lower(), _TEXT_FIELDS['ubicacion'])
+        _text('producto', (self.producto or "").strip().lower(), _TEXT_FIELDS['producto'])
+        _location('en_ubicacion', self.en_ubicacion)
+        for field_name, term in self.excluir:
+            if field_name == 'en_ubicacion':
+                _location('no_en_ubicacion', term, negate=True)
+                continue
+            cols = _TEXT_FIELDS.get(field_name)
+            if cols:
+                _text('no_' + field_name, (term or "").strip().lower(), cols, negate=True)
+        return preds
 
+    def _plan(self, df: pd.DataFrame, index: Optional[InventoryIndex]) -> List[tuple]:
+        if index is not None and not index.matches(df):
+            index = None
+        n = len(df)
+        preds = self._predicates(df, index)
+        if index is not None:
+            # Mas selectivo primero; sin estadisticas se respeta el orden fijo
+            preds.sort(key=lambda p: p.estimate)
+        plan: List[tuple] = []
+        candidates = n
+        for p in preds:
+            method = 'scan'
+            if p.lookup is not None:
+                # Lookup: recorrer distintos + postings. Scan: evaluar los candidatos actuales.
+                if p.lookup_cost + p.estimate < candidates * p.scan_weight:
+                    method = 'index'
+            plan.append((PlanStep(p.name, method, int(p.estimate)), p))
+            if n:
+                candidates = max(1, int(candidates * (p.estimate / n)))
+        return plan
+
+    def _execute(
+        self,
+        df: pd.DataFrame,
+        index: Optional[InventoryIndex],
+        cancelled: Optional[Callable[[], bool]] = None,
+    ) -> tuple:
+        if df is None or df.empty:
+            return np.empty(0, dtype=np.int64), []
+        n = len(df)
+        pos: Optional[np.ndarray] = None
+        steps: List[PlanStep] = []
+        for step, pred in self._plan(df, index):
+            if cancelled is not None and cancelled():
+                raise FilterCancelled()
+            t0 = time.perf_counter()
+            step.rows_in = n if pos is None else len(pos)
+            if step.method == 'index':
+                rows = pred.lookup()
+                if pos is None:
+                    pos = np.sort(rows)
+                else:
+                    keep = np.zeros(n, dtype=bool)
+                    keep[rows] = True
+                    pos = pos[keep[pos]]
+            else:
+                pos = pred.scan(np.arange(n, dtype=np.int64) if pos is None else pos)
+            step.rows_out = len(pos)
+            step.ms = (time.perf_counter() - t0) * 1000.0
+            steps.append(step)
+            if not len(pos):
+                break
+        if pos is None:
+            pos = np.arange(n, dtype=np.int64)
+        return pos, steps
+
+
+def exclusion_signature(excluded: Iterable[str]) -> tuple:
+    """Ubicaciones excluidas normalizadas (parte de la clave de cache del filtro)."""
+    return tuple(sorted(str(x).strip().lower() for x in excluded if str(x).strip()))
+
+
+@dataclass
+class FilterPreset:
+    """Filtro con nombre guardado en Ajustes: campos del panel + ubicaciones excluidas."""
+
+    name: str
+    busqueda: str = ""
+    lote: str = ""
+    ubicacion: str = ""
+    venc_desde: str = ""
+    venc_hasta: str = ""
+    subfamilia: str = "(Todas)"
+    solo_con_stock: bool = True
+    excluidas: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> 'FilterPreset':
+        known = {k: v for k, v in (data or {}).items() if k in cls.__dataclass_fields__ and k != 'name'}
+        known['excluidas'] = tuple(str(x) for x in known.get('excluidas', ()) or ())
+        known['solo_con_stock'] = bool(known.get('solo_con_stock', True))
+        return cls(name=name, **known)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop('name', None)
+        data['excluidas'] = list(self.excluidas)
+        return data
+
+    def options(self, subfamilias: Optional[Iterable[str]] = None) -> FilterOptions:
+        """Mismo ``FilterOptions`` que arma la UI con estos campos en el panel."""
+        widgets = FilterOptions(
+            lote=self.lote.strip(),
+            ubicacion=self.ubicacion.strip(),
+            venc_desde=self.venc_desde.strip(),
+            venc_hasta=self.venc_hasta.strip(),
+            subfamilia=self.subfamilia.strip() or '(Todas)',
+            solo_con_stock=bool(self.solo_con_stock),
+        )
+        return widgets.combine(parse_query(self.busqueda, subfamilias))
+
+    def cache_key(self, subfamilias: Optional[Iterable[str]] = None) -> tuple:
+        return (self.options(subfamilias).signature(), exclusion_signature(self.excluidas))
+
+
+class FilterCache:
+    """LRU de firma de filtro -> posiciones resultantes (en orden de despliegue).
+
+    Las entradas sobreviven a los cambios de stock salvo que una fila cambiada
+    cruce algun corte de stock (:meth:`FilterOptions.stock_cuts`) del filtro
+    que las genero. Las entradas fijadas
+    (filtros guardados pre-calculados) no se desalojan por LRU.
+    """
+
+    def __init__(self, capacity: int = 16) -> None:
+        self.capacity = max(1, int(capacity))
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._pinned: set = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._entries
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(
+        self,
+        key: tuple,
+        positions: np.ndarray,
+        stock_cuts: Sequence[int] = (),
+        pinned: bool = False,
+    ) -> None:
+        self._entries[key] = (positions, tuple(stock_cuts or ()))
+        self._entries.move_to_end(key)
+        if pinned:
+            self._pinned.add(key)
+        evictable = [k for k in self._entries if k not in self._pinned]
+        for k in evictable[:max(0, len(evictable) - self.capacity)]:
+            del self._entries[k]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pinned.clear()
+
+    @staticmethod
+    def affected_by(cuts: Sequence[int], changes: Sequence[Tuple[int, int, int]]) -> bool:
+        """True si algun cambio ``(fila, viejo, nuevo)`` cruza alguno de los cortes de stock."""
+        return any((old >= c) != (new >= c) for c in cuts or () for _pos, old, new in changes)
+
+    def invalidate_rows(self, changes: Iterable[Tuple[int, int, int]]) -> int:
+        """Descarta entradas cuya membresia puede cambiar por ``(fila, viejo, nuevo)``.
+
+        Devuelve cuantas entradas se descartaron.
+        """
+        changes = list(changes)
+        if not changes:
+            return 0
+        stale = [key for key, (_positions, cuts) in self._entries.items() if self.affected_by(cuts, changes)]
+        for key in stale:
+            del self._entries[key]
+            self._pinned.discard(key)
+        return len(stale)
+
+
+# ---------------- Mini-lenguaje de consulta ----------------
+# Ejemplo: "lote:AB12 ubic:B-03 en:B-03 venc<2026-06 stock>0 sub:Placas -muestra"
+_QUERY_TOKEN = re.compile(
+    r'(?P<neg>-)?(?:(?P<key>[A-Za-z_]+)(?P<op><=|>=|:|<|>|=))?(?P<val>"[^"]*"|\S+)'
+)
+_KEY_ALIASES = {
+    'lote': 'lote', 'lot': 'lote',
+    'ubic': 'ubicacion', 'ubicacion': 'ubicacion', 'ubi': 'ubicacion',
+    'en': 'en_ubicacion', 'zona': 'en_ubicacion', 'pasillo': 'en_ubicacion', 'rack': 'en_ubicacion',
+    'sub': 'subfamilia', 'subfam': 'subfamilia', 'subfamilia': 'subfamilia',
+    'venc': 'venc', 'vencimiento': 'venc',
+    'stock': 'stock',
+    'prod': 'producto', 'producto': 'producto', 'cod': 'producto', 'codigo': 'producto',
+}
+
+
+def _date_bounds(text: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Primer y ultimo dia cubiertos por YYYY, YYYY-MM o YYYY-MM-DD."""
+    text = text.strip()
+    m = re.fullmatch(r'(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?', text)
+    if not m:
+        return None
+    try:
+        year = int(m.group(1))
+        if m.group(3):
+            start = pd.Timestamp(year=year, month=int(m.group(2)), day=int(m.group(3)))
+            return start, start
+        if m.group(2):
+            start = pd.Timestamp(year=year, month=int(m.group(2)), day=1)
+            return start, start + pd.offsets.MonthEnd(0)
+        return pd.Timestamp(year=year, month=1, day=1), pd.Timestamp(year=year, month=12, day=31)
+    except ValueError:
+        return None
+
+
+def _fmt(ts: pd.Timestamp) -> str:
+    return ts.strftime('%Y-%m-%d')
+
+
+def _resolve_subfamilia(value: str, subfamilias: Optional[Iterable[str]]) -> str:
+    if not subfamilias:
+        return value
+    low = value.lower()
+    names = [str(s) for s in subfamilias if s and s != '(Todas)']
+    for name in names:
+        if name.lower() == low:
+            return name
+    for cond in (lambda n: n.lower().startswith(low), lambda n: low in n.lower()):
+        hits = [n for n in names if cond(n)]
+        if len(hits) == 1:
+            return hits[0]
+    return value
+
+
+def _venc_range(op: str, val: str, token: str) -> Tuple[Optional[str], Optional[str]]:
+    """Rango (desde, hasta) de ``venc<op><val>``; extremos incluidos, None = abierto."""
+    bounds = _date_bounds(val)
+    if bounds is None:
+        raise QueryError(f'Fecha no valida en "{token}" (use AAAA, AAAA-MM o AAAA-MM-DD)', token)
+    first, last = bounds
+    if op in (':', '='):
+        return _fmt(first), _fmt(last)
+    if op == '<':
+        return None, _fmt(first - pd.Timedelta(days=1))
+    if op == '<=':
+        return None, _fmt(last)
+    if op == '>':
+        return _fmt(last + pd.Timedelta(days=1)), None
+    return _fmt(first), None
+
+
+def _stock_range(op: str, val: str, token: str) -> Tuple[Optional[int], Optional[int]]:
+    """Rango (desde, hasta) de ``stock<op><val>``; extremos incluidos, None = abierto."""
+    try:
+        qty = int(val)
+    except ValueError:
+        raise QueryError(f'Cantidad no valida en "{token}" (use un numero entero)', token) from None
+    if op in (':', '='):
+        return qty, qty
+    if op == '<':
+        return None, qty - 1
+    if op == '<=':
+        return None, qty
+    if op == '>':
+        return qty + 1, None
+    return qty, None
+
+
+def parse_query(text: str, subfamilias: Optional[Iterable[str]] = None) -> FilterOptions:
+    """Convierte el texto del buscador en un ``FilterOptions``.
+
+    Palabras sueltas se buscan en producto/codigo; ``clave:valor`` filtra por
+    lote, ubic, sub, venc y stock. venc y stock aceptan ``<``, ``<=``, ``>``,
+    ``>=`` y ``:``/``=`` (venc: todo el anio, mes o dia; stock: cantidad
+    exacta). ``en:B-03`` (o zona/pasillo/rack) limita a una ubicacion y todo
+    lo que cuelga de ella. Un ``-`` inicial niega la palabra o el filtro que
+    le sigue (``-stock>0`` = sin stock, ``-venc<2026`` = vence en 2026 o
+    despues, o sin fecha).
+
+    Lanza :class:`QueryError` si una fecha, una cantidad o un operador no se
+    pueden interpretar, en lugar de ignorar el token.
+    """
+    opts = FilterOptions()
+    words: List[str] = []
+    excluir: List[Tuple[str, str]] = []
+    rangos: List[Tuple[str, Any, Any]] = []
+    for m in _QUERY_TOKEN.finditer(text or ''):
+        neg = bool(m.group('neg'))
+        key = _KEY_ALIASES.get((m.group('key') or '').lower())
+        op = m.group('op') or ''
+        val = m.group('val').strip('"')
+        token = m.group(0)
+        if m.group('key') and key is None:
+            # Clave desconocida: se trata como texto literal
+            val = m.group('key') + op + val
+            op = ''
+        if not val:
+            continue
+        if key is None or op == '':
+            if neg:
+                excluir.append(('producto', val))
+            else:
+                words.append(val)
+            continue
+        if key in ('lote', 'ubicacion', 'producto', 'subfamilia', 'en_ubicacion'):
+            if op not in (':', '='):
+                raise QueryError(f'"{m.group("key")}" solo admite ":" (en "{token}")', token)
+            if neg:
+                excluir.append((key, val))
+            elif key == 'subfamilia':
+                opts.subfamilia = _resolve_subfamilia(val, subfamilias)
+            elif key == 'producto':
+                words.append(val)
+            else:
+                setattr(opts, key, val)
+        elif key == 'venc':
+            lo, hi = _venc_range(op, val, token)
+            if neg:
+                rangos.append(('venc', lo, hi))
+                continue
+            if lo is not None:
+                opts.venc_desde = lo
+            if hi is not None:
+                opts.venc_hasta = hi
+        elif key == 'stock':
+            lo, hi = _stock_range(op, val, token)
+            if neg:
+                rangos.append(('stock', lo, hi))
+                continue
+            if lo is not None:
+                opts.stock_min = lo if opts.stock_min is None else max(opts.stock_min, lo)
+            if hi is not None:
+                opts.stock_max = hi if opts.stock_max is None else min(opts.stock_max, hi)
+    opts.producto = ' '.join(words)
+    opts.excluir = tuple(excluir)
+    opts.excluir_rangos = tuple(rangos)
+    return opts
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Interpretacion de lecturas de codigos de barra (GS1 y codigos simples).
+
+Soporta la forma transmitida por el lector (separador FNC1 = ``\\x1d``) y la
+forma legible con parentesis, p. ej. ``(01)07801234567895(17)260131(10)L123``.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional
+
+GS = '\x1d'
+
+# AI -> largo fijo del dato (None = variable, termina en GS o fin de cadena)
+_AI_LENGTHS: Dict[str, Optional[int]] = {
+    '00': 18,   # SSCC
+    '01': 14,   # GTIN
+    '02': 14,   # GTIN de contenido
+    '10': None, # Lote
+    '11': 6,    # Fecha de produccion
+    '13': 6,    # Fecha de envasado
+    '15': 6,    # Consumir preferentemente antes de
+    '17': 6,    # Vencimiento
+    '21': None, # Serie
+    '30': None, # Cantidad variable
+    '37': None, # Cantidad de unidades
+    '240': None,  # Identificacion adicional del producto
+    '241': None,  # Numero de parte del cliente
+}
+
+# Prefijos de simbologia (AIM) que algunos lectores anteponen: ]C1, ]d2, ]Q3, ]e0
+_SYMBOLOGY = re.compile(r'^\][A-Za-z][0-9A-Za-z]')
+_PAREN_AI = re.compile(r'\((\d{2,4})\)([^(]*)')
+
+
+@dataclass
+class ScanCode:
+    """Resultado de interpretar una lectura."""
+
+    raw: str
+    is_gs1: bool = False
+    gtin: Optional[str] = None
+    lot: Optional[str] = None
+    expiry: Optional[str] = None  # YYYY-MM-DD
+    serial: Optional[str] = None
+    quantity: Optional[int] = None
+    ais: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def code(self) -> str:
+        """Codigo de producto a buscar: GTIN, AI 240 o la lectura completa."""
+        return self.gtin or self.ais.get('240') or ('' if self.is_gs1 else self.raw)
+
+
+def _gs1_date(value: str) -> Optional[str]:
+    """YYMMDD -> YYYY-MM-DD (DD=00 es el ultimo dia del mes, segun GS1)."""
+    if len(value) != 6 or not value.isdigit():
+        return None
+    yy, mm, dd = int(value[:2]), int(value[2:4]), int(value[4:])
+    # Ventana de siglo GS1: -49/+50 anos respecto del ano actual
+    this_year = date.today().year
+    year = (this_year // 100) * 100 + yy
+    if year - this_year > 50:
+        year -= 100
+    elif this_year - year > 49:
+        year += 100
+    if not 1 <= mm <= 12:
+        return None
+    if dd == 0:
+        nxt = date(year + (mm == 12), mm % 12 + 1, 1)
+        dd = (nxt - date(year, mm, 1)).days
+    try:
+        return date(year, mm, dd).isoformat()
+    except ValueError:
+        return None
+
+
+def _split_element_string(data: str) -> Optional[Dict[str, str]]:
+    """Separa una cadena GS1 sin parentesis en ``{AI: valor}`` (None si no es GS1)."""
+    out: Dict[str, str] = {}
+    i = 0
+    while i < len(data):
+        if data[i] == GS:
+            i += 1
+            continue
+        ai = next((data[i:i + k] for k in (2, 3) if data[i:i + k] in _AI_LENGTHS), None)
+        if ai is None:
+            return None
+        i += len(ai)
+        length = _AI_LENGTHS[ai]
+        if length is None:
+            end = data.find(GS, i)
+            end = len(data) if end < 0 else end
+        else:
+            end = i + length
+            if end > len(data):
+                return None
+        out[ai] = data[i:end]
+        i = end
+    return out or None
+
+
+def parse_scan(text: str) -> ScanCode:
+    """Interpreta una lectura; si no es GS1 la deja como codigo simple."""
+    raw = (text or '').strip().strip('\r\n')
+    data = _SYMBOLOGY.sub('', raw)
+    ais: Optional[Dict[str, str]] = None
+    if data.startswith('('):
+        found = _PAREN_AI.findall(data)
+        if found and all(ai in _AI_LENGTHS for ai, _v in found):
+            ais = {ai: v.strip(GS) for ai, v in found}
+    elif data[:2] in ('01', '02') and len(data) >= 16 and data[2:16].isdigit():
+        # Sin parentesis solo se acepta si parte con un GTIN: evita confundir codigos simples
+        ais = _split_element_string(data)
+    if not ais:
+        return ScanCode(raw=data)
+    scan = ScanCode(raw=data, is_gs1=True, ais=ais)
+    scan.gtin = ais.get('01') or ais.get('02')
+    scan.lot = ais.get('10') or None
+    scan.expiry = _gs1_date(ais.get('17', '')) or _gs1_date(ais.get('15', ''))
+    scan.serial = ais.get('21') or None
+    for qty_ai in ('30', '37'):
+        if ais.get(qty_ai, '').isdigit():
+            scan.quantity = int(ais[qty_ai])
+            break
+    return scan
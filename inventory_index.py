@@ -0,0 +1,701 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Indices del inventario construidos una sola vez por carga.
+
+Los filtros de la UI consultan estas estructuras en lugar de recorrer columnas
+completas en cada pulsacion de tecla.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from config import EXPIRY_BUCKET_DAYS
+from startup import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+
+def prepare_search_columns(df: pd.DataFrame) -> None:
+    """Agrega (in place) columnas auxiliares en minusculas y fechas parseadas."""
+    if '_lc_producto' not in df.columns and 'Nombre_del_Producto' in df.columns:
+        df['_lc_producto'] = df['Nombre_del_Producto'].fillna('').astype(str).str.lower()
+    if '_lc_codigo' not in df.columns and 'Codigo' in df.columns:
+        df['_lc_codigo'] = df['Codigo'].fillna('').astype(str).str.lower()
+    if '_lc_lote' not in df.columns and 'Lote' in df.columns:
+        df['_lc_lote'] = df['Lote'].fillna('').astype(str).str.lower()
+    if '_lc_ubicacion' not in df.columns and 'Ubicacion' in df.columns:
+        df['_lc_ubicacion'] = df['Ubicacion'].fillna('').astype(str).str.lower()
+    if '_subfam' not in df.columns and 'Subfamilia' in df.columns:
+        df['_subfam'] = df['Subfamilia'].astype(str)
+    if '_lc_subfam' not in df.columns and 'Subfamilia' in df.columns:
+        df['_lc_subfam'] = df['Subfamilia'].fillna('').astype(str).str.lower()
+    if '_venc_dt' not in df.columns and 'Vencimiento' in df.columns:
+        df['_venc_dt'] = pd.to_datetime(df['Vencimiento'], errors='coerce')
+
+
+# Campos del selector de productos: (columna en minusculas, columna original)
+PICKER_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ('_lc_producto', 'Nombre_del_Producto'),
+    ('_lc_codigo', 'Codigo'),
+    ('_lc_lote', 'Lote'),
+    ('_lc_bodega', 'Bodega'),
+    ('_lc_ubicacion', 'Ubicacion'),
+)
+
+
+class RowSearch:
+    """Busqueda por subcadena en varias columnas de texto, una clave por fila.
+
+    Las claves juntan las columnas ya en minusculas (separadas por ``\x1f``,
+    asi un termino no cruza de una columna a otra) y se arman una vez por
+    inventario. Como se escribe de a una letra, si el termino nuevo extiende
+    al anterior solo se revisan los aciertos previos.
+    """
+
+    def __init__(self, keys: List[str]) -> None:
+        self.keys = keys
+        self._term = ''
+        self._hits: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, fields: Tuple[Tuple[str, str], ...] = PICKER_FIELDS) -> 'RowSearch':
+        columns = []
+        for lc_col, src_col in fields:
+            if lc_col in df.columns:
+                columns.append(df[lc_col].tolist())
+            elif src_col in df.columns:
+                # Sin columna auxiliar: se pliegan solo los valores distintos (p. ej. Bodega)
+                codes, uniques = pd.factorize(df[src_col].fillna('').astype(str))
+                lowered = np.array([u.lower() for u in uniques] + [''], dtype=object)
+                columns.append(lowered[codes].tolist())
+        if not columns:
+            return cls([''] * len(df))
+        return cls(['\x1f'.join(parts) for parts in zip(*columns)])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def search(self, term: str) -> np.ndarray:
+        """Posiciones (iloc, en orden) cuyas claves contienen ``term``."""
+        job = self.scan(term, chunk=max(1, len(self.keys)))
+        while True:
+            try:
+                next(job)
+            except StopIteration as done:
+                return done.value
+
+    def scan(self, term: str, chunk: int = 20000):
+        """Como :meth:`search`, pero cede (``yield``) cada ``chunk`` claves revisadas.
+
+        El resultado es el valor de retorno del generador (``yield from``).
+        """
+        term = (term or '').strip().lower()
+        keys = self.keys
+        if not term:
+            hits = np.arange(len(keys), dtype=np.int64)
+        else:
+            if self._term and term.startswith(self._term) and self._hits is not None:
+                candidates = self._hits.tolist()
+            else:
+                candidates = range(len(keys))
+            found: List[int] = []
+            for start in range(0, len(candidates), chunk):
+                found += [i for i in candidates[start:start + chunk] if term in keys[i]]
+                yield
+            hits = np.array(found, dtype=np.int64)
+        self._term = term
+        self._hits = hits
+        return hits
+
+
+def _to_ns(value) -> Optional[int]:
+    """Convierte una fecha a entero ns (None si no es valida)."""
+    if value is None or value == '':
+        return None
+    ts = pd.to_datetime(value, errors='coerce')
+    if pd.isna(ts):
+        return None
+    return int(pd.Timestamp(ts).value)
+
+
+@dataclass
+class ColumnStats:
+    """Estadisticas y listas de postings (formato CSR) de una columna.
+
+    ``order[offsets[k]:offsets[k + 1]]`` son las posiciones con valor ``uniques[k]``.
+    """
+
+    uniques: np.ndarray
+    counts: np.ndarray
+    order: np.ndarray
+    offsets: np.ndarray
+    codes_by_value: Dict[str, int]
+
+    @classmethod
+    def build(cls, col: pd.Series) -> 'ColumnStats':
+        codes, uniques = pd.factorize(col.fillna('').astype(str), sort=False)
+        codes = np.asarray(codes, dtype=np.int64)
+        counts = np.bincount(codes, minlength=len(uniques)).astype(np.int64)
+        offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        uniques = np.asarray(uniques, dtype=object)
+        return cls(
+            uniques=uniques,
+            counts=counts,
+            order=np.argsort(codes, kind='stable'),
+            offsets=offsets,
+            codes_by_value={str(v): k for k, v in enumerate(uniques)},
+        )
+
+    @property
+    def distinct(self) -> int:
+        return len(self.uniques)
+
+    def frequency(self, value: str) -> int:
+        code = self.codes_by_value.get(value)
+        return 0 if code is None else int(self.counts[code])
+
+    def postings(self, codes: np.ndarray) -> np.ndarray:
+        """Posiciones de todas las filas cuyo codigo esta en ``codes``."""
+        if len(codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        if len(codes) == 1:
+            k = int(codes[0])
+            return self.order[self.offsets[k]:self.offsets[k + 1]]
+        return np.concatenate([self.order[self.offsets[k]:self.offsets[k + 1]] for k in codes])
+
+    def exact_codes(self, value: str) -> np.ndarray:
+        code = self.codes_by_value.get(value)
+        return np.empty(0, dtype=np.int64) if code is None else np.array([code], dtype=np.int64)
+
+    def contains_codes(self, term: str) -> np.ndarray:
+        """Codigos de los valores distintos que contienen ``term``."""
+        hit = pd.Series(self.uniques, dtype=object).str.contains(term, na=False, regex=False)
+        return np.flatnonzero(hit.to_numpy(dtype=bool))
+
+    def rows_for(self, codes: np.ndarray) -> int:
+        return int(self.counts[codes].sum()) if len(codes) else 0
+
+
+def scan_key(value) -> str:
+    """Normaliza un codigo/lote leido o del inventario para busqueda exacta.
+
+    Minusculas y sin espacios; los codigos numericos pierden los ceros a la
+    izquierda para que un GTIN-14 (``0780...``) encuentre ``780...``.
+    """
+    key = str(value if value is not None else '').strip().lower()
+    if key.isdigit():
+        key = key.lstrip('0') or '0'
+    return key
+
+
+def product_key(value) -> str:
+    """Normaliza un nombre de producto para busqueda exacta."""
+    return str(value if value is not None else '').strip().lower()
+
+
+# Niveles de una ubicacion tipo "B-03-2-1"
+LOCATION_LEVELS = ('Zona', 'Pasillo', 'Rack', 'Nivel')
+_LOCATION_SPLIT = re.compile(r'[\s\-./_]+')
+
+
+def location_tokens(value) -> List[str]:
+    """Componentes de una ubicacion tal como aparecen (a lo mas ``LOCATION_LEVELS``).
+
+    Se separa por guion, punto, barra, guion bajo o espacio; lo que exceda el
+    ultimo nivel se une a el con ``-``.
+    """
+    tokens = [t for t in _LOCATION_SPLIT.split(str(value if value is not None else '').strip()) if t]
+    keep = len(LOCATION_LEVELS) - 1
+    if len(tokens) > len(LOCATION_LEVELS):
+        tokens = tokens[:keep] + ['-'.join(tokens[keep:])]
+    return tokens
+
+
+def location_parts(value) -> Tuple[str, ...]:
+    """Componentes normalizados (ver :func:`scan_key`): ``"B-03-2"`` -> ``('b', '3', '2')``."""
+    return tuple(scan_key(t) for t in location_tokens(value))
+
+
+def _natural_key(parts: Tuple[str, ...]) -> tuple:
+    return tuple((0, int(p), '') if p.isdigit() else (1, 0, p) for p in parts)
+
+
+def location_prefix_mask(values: pd.Series, prefix) -> np.ndarray:
+    """True donde la ubicacion cae bajo ``prefix`` (por componentes completos)."""
+    want = location_parts(prefix)
+    codes, uniques = pd.factorize(values.fillna('').astype(str), sort=False)
+    hit = np.fromiter(
+        (location_parts(u)[:len(want)] == want for u in uniques), dtype=bool, count=len(uniques),
+    )
+    return hit[codes] if len(hit) else np.zeros(len(values), dtype=bool)
+
+
+def _component_ranks(values: List[str]) -> np.ndarray:
+    """Rango denso (orden natural) de cada componente; -1 si falta."""
+    distinct = sorted({v for v in values if v}, key=lambda v: _natural_key((v,)))
+    rank = {v: k for k, v in enumerate(distinct)}
+    return np.fromiter((rank.get(v, -1) for v in values), dtype=np.int64, count=len(values))
+
+
+def _ordinal_within(group: np.ndarray, key: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Ordinal denso de ``key`` dentro de cada ``group`` y cuantos distintos hay por grupo."""
+    pairs = np.unique(np.stack([group, key], axis=1), axis=0)
+    first = np.r_[True, pairs[1:, 0] != pairs[:-1, 0]]
+    starts = np.flatnonzero(first)
+    ordinal = np.arange(len(pairs)) - np.repeat(starts, np.diff(np.r_[starts, len(pairs)]))
+    counts = np.diff(np.r_[starts, len(pairs)])
+    idx = np.searchsorted(pairs[:, 0] * (key.max() + 2) + pairs[:, 1], group * (key.max() + 2) + key)
+    return ordinal[idx], np.repeat(counts, counts)[idx]
+
+
+def route_order(locations) -> np.ndarray:
+    """Permutacion que recorre las ubicaciones en orden de picking.
+
+    Zona y pasillo en orden natural; dentro de cada pasillo los racks se
+    recorren en serpentina (un pasillo de ida, el siguiente de vuelta) y los
+    niveles alternan sentido rack a rack. Lineas sin ubicacion van al final y
+    las de una misma ubicacion conservan su orden. Solo se parsean las
+    ubicaciones distintas; el resto es un ``lexsort`` sobre las lineas.
+    """
+    values = pd.Series(list(locations), dtype=object)
+    n = len(values)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    codes, uniques = pd.factorize(values.fillna('').astype(str).str.strip(), sort=False)
+    codes = np.asarray(codes, dtype=np.int64)
+    levels = len(LOCATION_LEVELS)
+    parts = [location_parts(u) + ('',) * (levels - len(location_parts(u))) for u in uniques]
+    zone, aisle, rack, level = (_component_ranks([p[i] for p in parts]) for i in range(levels))
+    missing = np.fromiter((not p[0] for p in parts), dtype=bool, count=len(parts))
+    # Serpentina: sentido del pasillo segun su ordinal en la zona, y del rack
+    # segun su ordinal en el sentido de recorrido del pasillo
+    aisle_id = zone * (aisle.max() + 2) + aisle
+    aisle_ord, _n = _ordinal_within(zone, aisle)
+    backwards = aisle_ord % 2 == 1
+    rack_ord, racks = _ordinal_within(aisle_id, rack)
+    rack_ord = np.where(backwards, racks - 1 - rack_ord, rack_ord)
+    rack_key = np.where(backwards, -rack, rack)
+    level_key = np.where(rack_ord % 2 == 1, -level, level)
+    return np.lexsort((
+        np.arange(n),
+        level_key[codes],
+        rack_key[codes],
+        aisle[codes],
+        zone[codes],
+        missing[codes],
+    )).astype(np.int64)
+
+
+@dataclass
+class LocationNode:
+    """Nodo del arbol de ubicaciones; sus filas son ``loc_order[start:end]``.
+
+    ``locations`` son los valores originales de Ubicacion que terminan
+    exactamente en este nodo (un nodo puede tener ademas hijos).
+    """
+
+    name: str = ''
+    path: Tuple[str, ...] = ()
+    start: int = 0
+    end: int = 0
+    children: Dict[str, 'LocationNode'] = field(default_factory=dict)
+    locations: List[str] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return self.end - self.start
+
+    def iter_locations(self):
+        """Ubicaciones originales del subarbol, en orden natural."""
+        yield from self.locations
+        for child in self.children.values():
+            yield from child.iter_locations()
+
+
+def _build_location_tree(values: pd.Series) -> Tuple[LocationNode, np.ndarray]:
+    """Arbol de prefijos sobre zona/pasillo/rack/nivel y su permutacion de filas.
+
+    Las filas se ordenan por ubicacion (orden natural de componentes), asi cada
+    nodo cubre un rango contiguo y consultar un prefijo es un slice.
+    """
+    originals = values.fillna('').astype(str).str.strip()
+    codes, uniques = pd.factorize(originals, sort=False)
+    codes = np.asarray(codes, dtype=np.int64)
+    tokens = [location_tokens(u) for u in uniques]
+    parts = [tuple(scan_key(t) for t in tk) for tk in tokens]
+    by_rank = sorted(range(len(uniques)), key=lambda k: (_natural_key(parts[k]), uniques[k]))
+    rank = np.empty(len(uniques), dtype=np.int64)
+    rank[by_rank] = np.arange(len(uniques), dtype=np.int64)
+    row_rank = rank[codes]
+    order = np.argsort(row_rank, kind='stable').astype(np.int64)
+    bounds = np.searchsorted(row_rank[order], np.arange(len(uniques) + 1), side='left')
+    root = LocationNode(start=len(order), end=len(order))
+    for r, k in enumerate(by_rank):
+        if not parts[k]:
+            continue
+        start, end = int(bounds[r]), int(bounds[r + 1])
+        root.start = min(root.start, start)
+        node = root
+        for depth, comp in enumerate(parts[k]):
+            child = node.children.get(comp)
+            if child is None:
+                child = LocationNode(name=tokens[k][depth], path=parts[k][:depth + 1], start=start, end=end)
+                node.children[comp] = child
+            else:
+                child.end = end
+            node = child
+        node.locations.append(str(uniques[k]))
+    return root, order
+
+
+def _group_positions(keys: list, sort_key: Optional[np.ndarray] = None) -> Dict:
+    """``{clave: posiciones}`` en una pasada vectorizada (claves vacias se omiten).
+
+    Dentro de cada grupo las posiciones quedan ordenadas por ``sort_key`` (si se
+    entrega) y luego por fila.
+    """
+    if not len(keys):
+        return {}
+    codes, uniques = pd.factorize(pd.Series(keys, dtype=object), sort=False)
+    codes = np.asarray(codes, dtype=np.int64)
+    n = len(codes)
+    order = np.lexsort((np.arange(n), codes) if sort_key is None else (np.arange(n), sort_key, codes))
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    out: Dict = {}
+    for part in np.split(order, bounds):
+        key = uniques[codes[part[0]]]
+        if key and key != ('', ''):
+            out[key] = part
+    return out
+
+
+def _earliest_in_group(productos: pd.Series, vdt: pd.Series, valid: np.ndarray) -> np.ndarray:
+    """True en las filas cuyo vencimiento es el minimo de su producto."""
+    mask = valid & productos.ne('').to_numpy()
+    if not mask.any():
+        return np.zeros(len(productos), dtype=bool)
+    earliest = vdt.where(mask).groupby(productos.to_numpy()).transform('min')
+    return mask & (vdt == earliest).to_numpy()
+
+
+# Tramos de vencimiento: codigo -> etiqueta. Los limites (dias) se entregan a
+# build(); por defecto config.EXPIRY_BUCKET_DAYS. El codigo 0 es "Vencido",
+# 1..len(limites) los tramos "<= N dias", luego "Mas de N dias" y al final
+# "Sin fecha" (su codigo depende de cuantos limites haya)
+BUCKET_VENCIDO = 0
+
+
+def expiry_bucket_labels(edges=EXPIRY_BUCKET_DAYS) -> Tuple[str, ...]:
+    return (
+        ('Vencido',)
+        + tuple(f'<= {d} dias' for d in edges)
+        + (f'Mas de {edges[-1]} dias', 'Sin fecha')
+    )
+
+
+# Columnas (ya normalizadas) sobre las que se recolectan estadisticas
+STATS_COLUMNS = ('_subfam', '_lc_subfam', '_lc_lote', '_lc_ubicacion', '_lc_producto', '_lc_codigo')
+
+
+@dataclass
+class InventoryIndex:
+    """Indices posicionales (iloc) sobre el DataFrame de inventario cargado.
+
+    - ``venc_order``: permutacion argsort de las filas con vencimiento valido.
+    - ``venc_keys``: fechas de vencimiento (int64 ns) en el orden de ``venc_order``.
+    - ``stats``: estadisticas por columna para el planificador de filtros.
+    - ``by_codigo`` / ``by_lote`` / ``by_codigo_lote``: hash de clave normalizada
+      (ver :func:`scan_key`) a posiciones, para lecturas del lector de labels.
+    - ``by_producto``: nombre de producto normalizado a posiciones. En
+      ``by_codigo`` y ``by_producto`` cada grupo esta pre-ordenado por
+      vencimiento (sin fecha al final), listo para asignar FEFO.
+    - ``fefo_earliest``: la fila es el lote de vencimiento mas proximo de su producto.
+    - ``fefo_order`` / ``fefo_rank``: orden FEFO global (primero los lotes mas
+      proximos de cada producto, por fecha; luego el resto en orden de fila) y
+      su inversa. No depende de la fecha actual.
+    - ``venc_days``: dias hasta el vencimiento respecto de ``days_ref``; se
+      recalcula solo cuando cambia el dia (ver :meth:`refresh_days`).
+    - ``bucket_codes``: tramo de vencimiento por fila (ver
+      :func:`expiry_bucket_labels`), recalculado junto con ``venc_days``;
+      ``bucket_sin_fecha`` es el codigo de las filas sin fecha valida.
+    - ``agg_lots`` / ``agg_units``: lotes con stock y unidades por
+      tramo x subfamilia x bodega. Se reconstruyen al cambiar el dia y se
+      ajustan en O(1) con cada cambio de stock (:meth:`on_stock_change`).
+    - ``loc_tree`` / ``loc_order``: arbol de prefijos zona/pasillo/rack/nivel
+      sobre Ubicacion; cada nodo es un slice de ``loc_order`` (ver
+      :meth:`location_rows`).
+    """
+
+    labels: pd.Index = field(default_factory=lambda: pd.Index([]))
+    venc_order: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    venc_keys: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    stats: Dict[str, ColumnStats] = field(default_factory=dict)
+    stock_positive: int = 0
+    by_codigo: Dict[str, np.ndarray] = field(default_factory=dict)
+    by_lote: Dict[str, np.ndarray] = field(default_factory=dict)
+    by_codigo_lote: Dict[Tuple[str, str], np.ndarray] = field(default_factory=dict)
+    by_producto: Dict[str, np.ndarray] = field(default_factory=dict)
+    venc_ns: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    fefo_earliest: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+    fefo_order: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    fefo_rank: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    venc_days: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    days_ref: Optional[date] = None
+    bucket_edges: Tuple[int, ...] = EXPIRY_BUCKET_DAYS
+    bucket_codes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int8))
+    bucket_sin_fecha: int = len(expiry_bucket_labels()) - 1
+    stock: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    subfam_codes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    subfam_labels: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=object))
+    bodega_codes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    bodega_labels: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=object))
+    agg_lots: np.ndarray = field(default_factory=lambda: np.zeros((len(expiry_bucket_labels()), 0, 0), dtype=np.int64))
+    agg_units: np.ndarray = field(default_factory=lambda: np.zeros((len(expiry_bucket_labels()), 0, 0), dtype=np.int64))
+    loc_tree: LocationNode = field(default_factory=LocationNode)
+    loc_order: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, bucket_days: Tuple[int, ...] = EXPIRY_BUCKET_DAYS) -> 'InventoryIndex':
+        if df is None:
+            return cls()
+        if '_venc_dt' in df.columns:
+            vdt = df['_venc_dt']
+        elif 'Vencimiento' in df.columns:
+            vdt = pd.to_datetime(df['Vencimiento'], errors='coerce')
+        else:
+            vdt = pd.Series(pd.NaT, index=df.index)
+        valid = vdt.notna().to_numpy()
+        keys = vdt.to_numpy(dtype='datetime64[ns]').view('i8')
+        valid_pos = np.flatnonzero(valid)
+        order = valid_pos[np.argsort(keys[valid_pos], kind='stable')]
+        stats = {c: ColumnStats.build(df[c]) for c in STATS_COLUMNS if c in df.columns}
+        stock_positive = int((df['Stock'].to_numpy() > 0).sum()) if 'Stock' in df.columns else len(df)
+        codigos = [scan_key(v) for v in df['Codigo'].tolist()] if 'Codigo' in df.columns else []
+        lotes = [scan_key(v) for v in df['Lote'].tolist()] if 'Lote' in df.columns else []
+        if '_lc_producto' in df.columns:
+            productos = df['_lc_producto']
+        elif 'Nombre_del_Producto' in df.columns:
+            productos = df['Nombre_del_Producto'].fillna('').astype(str).str.lower()
+        else:
+            productos = pd.Series('', index=df.index)
+        earliest = _earliest_in_group(productos, vdt, valid)
+        # Sin fecha = "infinito" para que los lotes sin vencimiento se usen al final
+        expiry_key = np.where(valid, keys, np.iinfo(np.int64).max)
+        # FEFO: lotes "mas proximos" primero por fecha; el resto conserva el orden de fila
+        n = len(df)
+        fefo_keys = np.where(earliest, expiry_key, np.iinfo(np.int64).max)
+        fefo_order = np.lexsort((np.arange(n), fefo_keys, ~earliest))
+        fefo_rank = np.empty(n, dtype=np.int64)
+        fefo_rank[fefo_order] = np.arange(n, dtype=np.int64)
+        inst = cls(
+            labels=df.index,
+            venc_order=order,
+            venc_keys=keys[order],
+            stats=stats,
+            stock_positive=stock_positive,
+            by_codigo=_group_positions(codigos, expiry_key),
+            by_lote=_group_positions(lotes),
+            by_codigo_lote=_group_positions(list(zip(codigos, lotes))) if codigos and lotes else {},
+            by_producto=_group_positions([product_key(v) for v in productos.tolist()], expiry_key),
+            venc_ns=np.where(valid, keys, np.iinfo(np.int64).min),
+            fefo_earliest=earliest,
+            fefo_order=fefo_order,
+            fefo_rank=fefo_rank,
+        )
+        inst.bucket_edges = tuple(int(d) for d in bucket_days)
+        inst.bucket_sin_fecha = len(inst.bucket_labels) - 1
+        if 'Stock' in df.columns:
+            inst.stock = pd.to_numeric(df['Stock'], errors='coerce').fillna(0).to_numpy(dtype=np.int64).copy()
+        else:
+            inst.stock = np.zeros(n, dtype=np.int64)
+        for name, col in (('subfam', 'Subfamilia'), ('bodega', 'Bodega')):
+            values = df[col].fillna('').astype(str) if col in df.columns else pd.Series('', index=df.index)
+            codes, uniques = pd.factorize(values, sort=True)
+            setattr(inst, f'{name}_codes', np.asarray(codes, dtype=np.int64))
+            setattr(inst, f'{name}_labels', np.asarray(uniques, dtype=object))
+        if 'Ubicacion' in df.columns:
+            inst.loc_tree, inst.loc_order = _build_location_tree(df['Ubicacion'])
+        inst.refresh_days()
+        return inst
+
+    @property
+    def size(self) -> int:
+        return len(self.labels)
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """True si el indice fue construido sobre este mismo DataFrame."""
+        if df is None or len(df) != self.size:
+            return False
+        return df.index is self.labels or df.index.equals(self.labels)
+
+    def venc_bounds(self, desde=None, hasta=None) -> tuple:
+        """Limites ``(lo, hi)`` del slice de ``venc_order`` para el rango dado."""
+        lo_ns = _to_ns(desde)
+        hi_ns = _to_ns(hasta)
+        lo = 0 if lo_ns is None else int(np.searchsorted(self.venc_keys, lo_ns, side='left'))
+        hi = len(self.venc_keys) if hi_ns is None else int(np.searchsorted(self.venc_keys, hi_ns, side='right'))
+        return lo, max(lo, hi)
+
+    def venc_range(self, desde=None, hasta=None) -> np.ndarray:
+        """Posiciones con ``desde <= vencimiento <= hasta`` (limites opcionales).
+
+        Dos ``searchsorted`` sobre las fechas ordenadas delimitan un slice de la
+        permutacion; el resultado queda en orden de vencimiento, no de fila.
+        """
+        lo, hi = self.venc_bounds(desde, hasta)
+        return self.venc_order[lo:hi]
+
+    def scan_lookup(self, codigo: Optional[str] = None, lote: Optional[str] = None) -> np.ndarray:
+        """Posiciones que coinciden exactamente con codigo y/o lote (O(1) por clave)."""
+        empty = np.empty(0, dtype=np.int64)
+        ck = scan_key(codigo) if codigo else ''
+        lk = scan_key(lote) if lote else ''
+        if ck and lk:
+            return self.by_codigo_lote.get((ck, lk), empty)
+        if ck:
+            return self.by_codigo.get(ck, empty)
+        if lk:
+            return self.by_lote.get(lk, empty)
+        return empty
+
+    def location_node(self, prefix) -> Optional[LocationNode]:
+        """Nodo del arbol para ``prefix`` (``"B"``, ``"B-03"``...), None si no existe."""
+        node = self.loc_tree
+        for comp in location_parts(prefix):
+            node = node.children.get(comp)
+            if node is None:
+                return None
+        return node
+
+    def location_rows(self, prefix) -> np.ndarray:
+        """Posiciones bajo ``prefix`` (p. ej. todo el pasillo ``"B-03"``) en O(resultado).
+
+        Igual que :meth:`venc_range`, el resultado queda en orden de ubicacion.
+        """
+        node = self.location_node(prefix)
+        if node is None:
+            return np.empty(0, dtype=np.int64)
+        return self.loc_order[node.start:node.end]
+
+    _NAT_DAYS = 999999
+
+    def refresh_days(self, today: Optional[date] = None) -> bool:
+        """Recalcula ``venc_days`` si cambio el dia; True si hubo recalculo."""
+        today = today or date.today()
+        if self.days_ref == today and len(self.venc_days) == len(self.venc_ns):
+            return False
+        today_ns = pd.Timestamp(today).value
+        valid = self.venc_ns != np.iinfo(np.int64).min
+        days = np.full(len(self.venc_ns), self._NAT_DAYS, dtype=np.int64)
+        days[valid] = (self.venc_ns[valid] - today_ns) // (86400 * 10**9)
+        self.venc_days = days
+        self.days_ref = today
+        codes = np.searchsorted(np.asarray(self.bucket_edges), days, side='left').astype(np.int8) + 1
+        codes[days < 0] = BUCKET_VENCIDO
+        codes[~valid] = self.bucket_sin_fecha
+        self.bucket_codes = codes
+        self._rebuild_aggregates()
+        return True
+
+    @property
+    def bucket_labels(self) -> Tuple[str, ...]:
+        return expiry_bucket_labels(self.bucket_edges)
+
+    def bucket_series(self) -> pd.Series:
+        """Columna categorica de tramos de vencimiento (alineada a ``labels``)."""
+        cat = pd.Categorical.from_codes(self.bucket_codes, categories=list(self.bucket_labels))
+        return pd.Series(cat, index=self.labels)
+
+    def _cells(self, pos) -> np.ndarray:
+        n_s = max(1, len(self.subfam_labels))
+        n_w = max(1, len(self.bodega_labels))
+        return (self.bucket_codes[pos].astype(np.int64) * n_s + self.subfam_codes[pos]) * n_w + self.bodega_codes[pos]
+
+    def _rebuild_aggregates(self) -> None:
+        n_s = max(1, len(self.subfam_labels))
+        n_w = max(1, len(self.bodega_labels))
+        shape = (len(self.bucket_labels), n_s, n_w)
+        if not len(self.bucket_codes) or len(self.subfam_codes) != len(self.bucket_codes):
+            self.agg_lots = np.zeros(shape, dtype=np.int64)
+            self.agg_units = np.zeros(shape, dtype=np.int64)
+            return
+        cells = self._cells(slice(None))
+        size = shape[0] * shape[1] * shape[2]
+        stock = np.clip(self.stock, 0, None)
+        self.agg_units = np.bincount(cells, weights=stock, minlength=size).astype(np.int64).reshape(shape)
+        self.agg_lots = np.bincount(cells, weights=(stock > 0), minlength=size).astype(np.int64).reshape(shape)
+
+    def on_stock_change(self, label, old: int, new: int) -> None:
+        """Ajusta stock y agregados de una fila en O(1)."""
+        if not len(self.stock):
+            return
+        try:
+            pos = self.labels.get_loc(label)
+        except KeyError:
+            return
+        if not isinstance(pos, (int, np.integer)):
+            return
+        self.stock[pos] = int(new)
+        if self.agg_units.size:
+            cell = np.unravel_index(int(self._cells(pos)), self.agg_units.shape)
+            self.agg_units[cell] += max(0, int(new)) - max(0, int(old))
+            self.agg_lots[cell] += int(new > 0) - int(old > 0)
+
+    def bucket_totals(self) -> list:
+        """``[(etiqueta, lotes, unidades)]`` por tramo, sobre los agregados."""
+        lots = self.agg_lots.sum(axis=(1, 2))
+        units = self.agg_units.sum(axis=(1, 2))
+        return [(lbl, int(lots[k]), int(units[k])) for k, lbl in enumerate(self.bucket_labels)]
+
+    def bucket_breakdown(self, bucket: int) -> list:
+        """``[(subfamilia, bodega, lotes, unidades)]`` con stock en un tramo."""
+        lots = self.agg_lots[bucket]
+        units = self.agg_units[bucket]
+        out = []
+        for s_i, w_i in zip(*np.nonzero(lots)):
+            subfam = self.subfam_labels[s_i] if len(self.subfam_labels) else ''
+            bodega = self.bodega_labels[w_i] if len(self.bodega_labels) else ''
+            out.append((str(subfam), str(bodega), int(lots[s_i, w_i]), int(units[s_i, w_i])))
+        return out
+
+    def expiry_tags(self, pos: np.ndarray) -> np.ndarray:
+        """Tag de vencimiento por posicion, segun el tramo materializado.
+
+        'vencido' (tramo 0), 'vencimiento_proximo' (tramo 1: vence dentro del
+        primer limite, p. ej. 30 dias) o ''.
+        """
+        pos = np.asarray(pos, dtype=np.int64)
+        codes = self.bucket_codes[pos]
+        tags = np.full(len(pos), '', dtype=object)
+        tags[codes == BUCKET_VENCIDO + 1] = 'vencimiento_proximo'
+        tags[codes == BUCKET_VENCIDO] = 'vencido'
+        return tags
+
+    def fefo_sort(self, pos: np.ndarray) -> np.ndarray:
+        """Ordena posiciones segun el rango FEFO precomputado.
+
+        Subconjuntos grandes se resuelven con un gather O(n) sobre ``fefo_order``;
+        los chicos con un argsort de sus rangos.
+        """
+        pos = np.asarray(pos, dtype=np.int64)
+        n = len(self.fefo_order)
+        if len(pos) * 16 >= n:
+            keep = np.zeros(n, dtype=bool)
+            keep[pos] = True
+            return self.fefo_order[keep[self.fefo_order]]
+        return pos[np.argsort(self.fefo_rank[pos], kind='stable')]
+
+    def fefo_rows(self, codigo_or_product: str) -> np.ndarray:
+        """Posiciones del producto (por codigo o nombre) ordenadas por vencimiento."""
+        empty = np.empty(0, dtype=np.int64)
+        rows = self.by_codigo.get(scan_key(codigo_or_product))
+        if rows is None:
+            rows = self.by_producto.get(product_key(codigo_or_product), empty)
+        return rows
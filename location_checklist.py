@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Checklist virtual de ubicaciones a excluir del listado de productos.
+
+Antes cada tecla en la busqueda destruia y recreaba un ``ttk.Checkbutton`` por
+ubicacion. Aqui el checklist es un ``ttk.Treeview`` sobre
+:class:`virtual_table.VirtualTable`: solo existen las filas visibles, el
+estado de exclusion es un arreglo booleano y la busqueda corre sobre un arreglo
+de ubicaciones ya en minusculas. Como se escribe de a una letra, si el termino
+nuevo extiende al anterior solo se revisan los aciertos previos.
+
+Las ubicaciones se guardan en el orden del arbol de prefijos (zona, pasillo,
+rack, nivel), por lo que cada grupo cubre un rango contiguo y contar sus
+coincidencias o exclusiones es una resta de sumas acumuladas o un slice.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from tkinter import ttk
+
+from inventory_index import LOCATION_LEVELS, LocationNode
+from virtual_table import VirtualTable
+from startup import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+_CHECK = {0: '☐', 1: '◪', 2: '☑'}   # ninguna / algunas / todas excluidas
+_INDENT = '    '
+
+
+class LocationChecklist:
+    """Lista virtual con casillas de exclusion, agrupada por niveles de ubicacion.
+
+    Clic en la casilla o en el nombre marca/desmarca; clic en la columna del
+    triangulo (o flechas izquierda/derecha) colapsa o expande un grupo; la
+    barra espaciadora marca la fila seleccionada. ``on_change`` se llama cada
+    vez que cambia el conjunto excluido.
+    """
+
+    def __init__(self, parent, on_change: Callable[[], None], height: int = 6) -> None:
+        self._on_change = on_change
+        self.tree = ttk.Treeview(parent, columns=('exp', 'item'), show='', height=height, selectmode='browse')
+        self.tree.column('exp', width=22, minwidth=22, stretch=False, anchor='center')
+        self.tree.column('item', width=180, stretch=True, anchor='w')
+        vsb = ttk.Scrollbar(parent, orient='vertical')
+        self.tree.grid(row=0, column=0, sticky='ew')
+        vsb.grid(row=0, column=1, sticky='ns')
+        parent.columnconfigure(0, weight=1)
+        self.table = VirtualTable(self.tree, vsb, self._rows, self._locate, overscan=4)
+
+        self.locations: List[str] = []
+        self._lower = np.empty(0, dtype=object)
+        self._loc_index: Dict[str, int] = {}
+        self._excluded = np.zeros(0, dtype=bool)
+        self._root: Optional[LocationNode] = None
+        self._ranges: Dict[tuple, Tuple[int, int]] = {}
+        self._loose: Tuple[int, int] = (0, 0)     # ubicaciones fuera del arbol
+        self.expanded: set = set()
+        self._term = ''
+        self._match: Optional[np.ndarray] = None
+        self._match_cum = np.zeros(1, dtype=np.int64)
+        self._flat: List[tuple] = []
+        self._flat_index: Dict[str, int] = {}
+
+        self.tree.bind('<Button-1>', self._on_click, add='+')
+        self.tree.bind('<space>', lambda _e: self._toggle_selected())
+        self.tree.bind('<Right>', lambda _e: self._expand_selected(True))
+        self.tree.bind('<Left>', lambda _e: self._expand_selected(False))
+
+    # ---------------- Modelo ----------------
+    def set_locations(self, locations: Iterable[str], root: Optional[LocationNode] = None) -> None:
+        """Reemplaza las ubicaciones (una vez por carga); conserva las exclusiones vigentes."""
+        wanted = list(dict.fromkeys(str(x) for x in locations))
+        keep = set(self.excluded())
+        present = set(wanted)
+        order: List[str] = []
+        ranges: Dict[tuple, Tuple[int, int]] = {}
+        seen: set = set()
+
+        def walk(node: LocationNode) -> None:
+            lo = len(order)
+            for loc in node.locations:
+                if loc in present and loc not in seen:
+                    seen.add(loc)
+                    order.append(loc)
+            for child in node.children.values():
+                walk(child)
+            ranges[node.path] = (lo, len(order))
+
+        if root is not None and root.children:
+            walk(root)
+        else:
+            root = None
+        loose_start = len(order)
+        order.extend(loc for loc in sorted(wanted, key=str.lower) if loc not in seen)
+        self.locations = order
+        self._root = root
+        self._ranges = ranges
+        self._loose = (loose_start, len(order))
+        self._loc_index = {loc: i for i, loc in enumerate(order)}
+        self._lower = np.array([loc.lower() for loc in order], dtype=object)
+        self._excluded = np.array([loc in keep for loc in order], dtype=bool)
+        term, self._term = self._term, None
+        self.search(term)
+
+    def excluded(self) -> List[str]:
+        """Ubicaciones excluidas, en orden de ubicacion."""
+        return [self.locations[i] for i in np.flatnonzero(self._excluded)]
+
+    def set_excluded(self, locations: Iterable[str]) -> None:
+        """Reemplaza las exclusiones (comparando sin mayusculas); no avisa ``on_change``."""
+        wanted = {str(x).strip().lower() for x in locations}
+        self._excluded = np.array([low.strip() in wanted for low in self._lower], dtype=bool)
+        self.table.refresh()
+
+    def clear(self) -> None:
+        self._excluded[:] = False
+        self.table.refresh()
+
+    # ---------------- Busqueda ----------------
+    def search(self, term: str) -> None:
+        term = (term or '').strip().lower()
+        if term == self._term:
+            return
+        n = len(self.locations)
+        if not term or not n:
+            match = None
+        elif self._term and term.startswith(self._term) and self._match is not None:
+            # Se afina la busqueda anterior: solo se revisan sus aciertos
+            match = np.zeros(n, dtype=bool)
+            prev = np.flatnonzero(self._match)
+            match[prev[_contains(self._lower[prev], term)]] = True
+        else:
+            match = _contains(self._lower, term)
+        self._term = term
+        self._match = match
+        if match is not None:
+            self._match_cum = np.concatenate(([0], np.cumsum(match, dtype=np.int64)))
+        self._rebuild()
+
+    def _count(self, lo: int, hi: int) -> int:
+        if self._match is None:
+            return hi - lo
+        return int(self._match_cum[hi] - self._match_cum[lo])
+
+    def _matched(self, lo: int, hi: int) -> np.ndarray:
+        idx = np.arange(lo, hi)
+        return idx if self._match is None else idx[self._match[lo:hi]]
+
+    def _visible(self, i: int) -> bool:
+        return self._match is None or bool(self._match[i])
+
+    # ---------------- Filas ----------------
+    def _rebuild(self) -> None:
+        """Aplana grupos y ubicaciones visibles; la tabla dibuja solo la ventana."""
+        flat: List[tuple] = []
+
+        def walk(node: LocationNode, depth: int) -> None:
+            for loc in node.locations:
+                i = self._loc_index.get(loc)
+                if i is not None and self._visible(i):
+                    flat.append(('loc', i, depth))
+            for child in node.children.values():
+                lo, hi = self._ranges.get(child.path, (0, 0))
+                count = self._count(lo, hi)
+                if not count:
+                    continue
+                if count == 1:
+                    # Grupo de una sola ubicacion: se muestra directo, sin encabezado
+                    flat.append(('loc', int(self._matched(lo, hi)[0]), depth))
+                    continue
+                flat.append(('grp', child, depth))
+                if self._term or child.path in self.expanded:
+                    walk(child, depth + 1)
+
+        if self._root is not None:
+            walk(self._root, 0)
+        lo, hi = self._loose
+        flat.extend(('loc', int(i), 0) for i in self._matched(lo, hi))
+        if not flat:
+            flat.append(('empty', None, 0))
+        self._flat = flat
+        self._flat_index = {self._iid(entry): k for k, entry in enumerate(flat)}
+        self.table.set_positions(np.arange(len(flat), dtype=np.int64), keep_offset=True)
+
+    @staticmethod
+    def _iid(entry: tuple) -> str:
+        kind, ref, _depth = entry
+        if kind == 'grp':
+            return 'grp:' + '\x1f'.join(ref.path)
+        if kind == 'loc':
+            return f'loc:{ref}'
+        return 'empty'
+
+    def _locate(self, iid: str) -> Optional[int]:
+        return self._flat_index.get(iid)
+
+    def _rows(self, positions: np.ndarray, _start: int) -> list:
+        rows = []
+        for k in positions:
+            entry = self._flat[int(k)]
+            kind, ref, depth = entry
+            pad = _INDENT * depth
+            if kind == 'grp':
+                lo, hi = self._ranges[ref.path]
+                idx = self._matched(lo, hi)
+                done = int(self._excluded[idx].sum())
+                state = 2 if done == len(idx) else (1 if done else 0)
+                level = LOCATION_LEVELS[min(depth, len(LOCATION_LEVELS) - 1)]
+                open_ = bool(self._term) or ref.path in self.expanded
+                text = f'{pad}{_CHECK[state]} {level} {ref.name} ({len(idx)})'
+                rows.append((self._iid(entry), ('▾' if open_ else '▸', text), ()))
+            elif kind == 'loc':
+                state = 2 if self._excluded[ref] else 0
+                rows.append((self._iid(entry), ('', f'{pad}{_CHECK[state]} {self.locations[ref]}'), ()))
+            else:
+                rows.append(('empty', ('', '(sin ubicaciones)'), ()))
+        return rows
+
+    # ---------------- Acciones ----------------
+    def toggle(self, iid: str) -> None:
+        k = self._flat_index.get(iid)
+        if k is None:
+            return
+        kind, ref, _depth = self._flat[k]
+        if kind == 'loc':
+            self._excluded[ref] = not self._excluded[ref]
+        elif kind == 'grp':
+            idx = self._matched(*self._ranges[ref.path])
+            self._excluded[idx] = not bool(self._excluded[idx].all())
+        else:
+            return
+        self.table.refresh()
+        self._on_change()
+
+    def toggle_group(self, iid: str, expand: Optional[bool] = None) -> None:
+        k = self._flat_index.get(iid)
+        if k is None or self._flat[k][0] != 'grp' or self._term:
+            return
+        path = self._flat[k][1].path
+        if expand is None:
+            expand = path not in self.expanded
+        if expand == (path in self.expanded):
+            return
+        if expand:
+            self.expanded.add(path)
+        else:
+            self.expanded.discard(path)
+        self._rebuild()
+
+    def _on_click(self, event) -> None:
+        iid = self.tree.identify_row(event.y)
+        if not iid:
+            return
+        if self.tree.identify_column(event.x) == '#1' and iid.startswith('grp:'):
+            self.toggle_group(iid)
+        else:
+            self.toggle(iid)
+
+    def _toggle_selected(self) -> str:
+        iid = self.table.focus()
+        if iid:
+            self.toggle(iid)
+        return 'break'
+
+    def _expand_selected(self, expand: bool) -> str:
+        iid = self.table.focus()
+        if iid:
+            self.toggle_group(iid, expand)
+        return 'break'
+
+
+def _contains(values: np.ndarray, term: str) -> np.ndarray:
+    if not len(values):
+        return np.zeros(0, dtype=bool)
+    return pd.Series(values, dtype=object).str.contains(term, regex=False, na=False).to_numpy(dtype=bool)
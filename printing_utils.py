@@ -101,8 +101,29 @@ def _close_preview_window(filename: str, delay_sec: float = 2.0) -> None:
     threading.Thread(target=_worker, daemon=True).start()
 
 
+class PrintError(Exception):
+    """Fallo al enviar un PDF a la impresora; el mensaje esta listo para mostrarse."""
+
+    def __init__(self, message: str, title: str = "Error de Impresi?n") -> None:
+        super().__init__(message)
+        self.title = title
+
+
 def print_pdf_windows(filename: str, copies: int = 1, preview: bool = False) -> None:
-    """Imprime un PDF en Windows con varias rutas de respaldo.
+    """Imprime un PDF en Windows y avisa el resultado con un dialogo."""
+    try:
+        message = send_pdf_to_printer(filename, copies=copies, preview=preview)
+    except PrintError as e:
+        messagebox.showerror(e.title, str(e))
+        return
+    messagebox.showinfo("Impresi?n Enviada", message)
+
+
+def send_pdf_to_printer(filename: str, copies: int = 1, preview: bool = False) -> str:
+    """Envia un PDF a la impresora en Windows con varias rutas de respaldo.
+
+    No toca Tk, por lo que puede correr en un hilo de fondo. Devuelve el
+    mensaje de confirmacion o lanza :class:`PrintError`.
 
     Intentos:
       1) ShellExecute 'print' (requiere asociaci?n de impresi?n para .pdf)
@@ -110,17 +131,12 @@ def print_pdf_windows(filename: str, copies: int = 1, preview: bool = False) ->
       3) SumatraPDF en modo silencioso si est? instalado
     """
     if not getattr(app_config, 'WINDOWS_OS', False):
-        messagebox.showerror(
-            "Error de Impresi?n",
-            "La impresi?n autom?tica requiere Windows y el m?dulo pywin32.",
-        )
         logger.warning("Intento de impresi?n en OS no soportado")
-        return
+        raise PrintError("La impresi?n autom?tica requiere Windows y el m?dulo pywin32.")
 
     if not os.path.exists(filename):
-        messagebox.showerror("Error de Impresi?n", "El archivo PDF no existe.")
         logger.error("Archivo para impresi?n no existe: %s", filename)
-        return
+        raise PrintError("El archivo PDF no existe.")
 
     try:
         import win32api  # type: ignore
@@ -153,24 +169,16 @@ def print_pdf_windows(filename: str, copies: int = 1, preview: bool = False) ->
                     if int(copies) > 1:
                         cmd += ["-print-settings", f"copies={int(copies)}"]
                     subprocess.Popen(cmd)
-                    messagebox.showinfo(
-                        "Impresi?n Enviada",
-                        f"Se han enviado {copies} copias del vale a la {printer_label}.",
-                    )
                     logger.info("PDF enviado a SumatraPDF con preview copias=%s", copies)
-                    return
+                    return f"Se han enviado {copies} copias del vale a la {printer_label}."
                 for _ in range(max(1, int(copies))):
                     if configured_printer:
                         cmd = [runner_pref, "-silent", "-print-to", configured_printer, filename]
                     else:
                         cmd = [runner_pref, "-silent", "-print-to-default", filename]
                     subprocess.run(cmd, check=True, creationflags=0x08000000)
-                messagebox.showinfo(
-                    "Impresi?n Enviada",
-                    f"Se han enviado {copies} copias del vale a la {printer_label}.",
-                )
                 logger.info("PDF enviado a SumatraPDF (default printer) copias=%s", copies)
-                return
+                return f"Se han enviado {copies} copias del vale a la {printer_label}."
             except Exception:
                 # seguir? con ShellExecute
                 logger.warning("SumatraPDF no pudo imprimir, se intentara ShellExecute", exc_info=True)
@@ -186,12 +194,10 @@ def print_pdf_windows(filename: str, copies: int = 1, preview: bool = False) ->
                 default_printer = None
 
         if not default_printer:
-            messagebox.showerror(
-                "Error de Impresi?n",
-                "No hay impresora predeterminada configurada en Windows. Configure una e intente nuevamente.",
-            )
             logger.error("No hay impresora predeterminada configurada en Windows")
-            return
+            raise PrintError(
+                "No hay impresora predeterminada configurada en Windows. Configure una e intente nuevamente."
+            )
 
         opened_preview = False
         if preview:
@@ -241,24 +247,21 @@ def print_pdf_windows(filename: str, copies: int = 1, preview: bool = False) ->
         if last_err:
             msg = str(last_err)
             if "31" in msg:  # SE_ERR_NOASSOC
-                messagebox.showerror(
-                    "Error de Impresion",
+                raise PrintError(
                     "No hay asociacion para imprimir PDFs (error 31).\n"
                     "Soluciones: instale/establezca como predeterminado un lector PDF con soporte de impresion (Adobe Reader, SumatraPDF, etc.)\n"
                     "o configure la asociacion de impresion para archivos PDF.\n"
                     "Alternativa: coloque SumatraPDF.exe junto al ejecutable o defina SUMATRA_PDF_PATH.",
+                    title="Error de Impresion",
                 )
-            else:
-                messagebox.showerror("Error de Impresi?n", f"Fallo al enviar a la impresora: {last_err}")
-            return
+            raise PrintError(f"Fallo al enviar a la impresora: {last_err}")
 
         if opened_preview:
             _close_preview_window(filename, delay_sec=2.0)
-        messagebox.showinfo(
-            "Impresi?n Enviada",
-            f"Se han enviado {copies} copias del vale a la {printer_label}.",
-        )
         logger.info("PDF enviado a impresora predeterminada via ShellExecute copias=%s", copies)
+        return f"Se han enviado {copies} copias del vale a la {printer_label}."
+    except PrintError:
+        raise
     except Exception as e:
-        messagebox.showerror("Error de Impresi?n", f"Fallo al enviar a la impresora: {e}")
         logger.exception("Fallo inesperado al enviar a la impresora")
+        raise PrintError(f"Fallo al enviar a la impresora: {e}") from e
@@ -15,6 +15,12 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
 
+try:
+    # Primer import: marca el inicio del cronometro de arranque
+    import startup  # noqa: F401
+except Exception:
+    pass
+
 try:
     # Pylance/pyright puede no resolver este import en modo script suelto.
     # type: ignore[import-not-found]
@@ -36,4 +42,7 @@ except Exception:
 
 
 if __name__ == "__main__":
+    # Necesario para el subproceso de filtrado en ejecutables congelados (PyInstaller)
+    import multiprocessing
+    multiprocessing.freeze_support()
     run_app()
@@ -126,3 +126,64 @@ def set_history_dir(path: str) -> None:
     data = _load()
     data['history_dir'] = path
     _save(data)
+
+
+# --- Filtering preferences ---
+def get_shm_filter_enabled() -> bool:
+    return bool(_load().get('shm_filter_enabled', False))
+
+
+def set_shm_filter_enabled(enabled: bool) -> None:
+    data = _load()
+    data['shm_filter_enabled'] = bool(enabled)
+    _save(data)
+
+
+# --- Vale line ordering ---
+def get_route_order_enabled() -> bool:
+    return bool(_load().get('route_order_enabled', True))
+
+
+def set_route_order_enabled(enabled: bool) -> None:
+    data = _load()
+    data['route_order_enabled'] = bool(enabled)
+    _save(data)
+
+
+# --- Label scanner preferences ---
+def get_scanner_qty() -> int:
+    try:
+        return max(1, int(_load().get('scanner_qty', 1)))
+    except Exception:
+        return 1
+
+
+def set_scanner_qty(qty: int) -> None:
+    data = _load()
+    data['scanner_qty'] = max(1, int(qty))
+    _save(data)
+
+
+# --- Saved filter presets ---
+def get_filter_presets() -> dict:
+    """``{nombre: campos}`` de los filtros guardados (ver ``filters.FilterPreset``)."""
+    presets = _load().get('filter_presets', {})
+    return presets if isinstance(presets, dict) else {}
+
+
+def set_filter_preset(name: str, fields: dict) -> None:
+    data = _load()
+    presets = data.get('filter_presets')
+    if not isinstance(presets, dict):
+        presets = {}
+    presets[name] = fields
+    data['filter_presets'] = presets
+    _save(data)
+
+
+def delete_filter_preset(name: str) -> None:
+    data = _load()
+    presets = data.get('filter_presets')
+    if isinstance(presets, dict) and name in presets:
+        del presets[name]
+        _save(data)
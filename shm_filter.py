@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Filtrado fuera de proceso sobre columnas publicadas en memoria compartida.
+
+pandas ``str.contains`` retiene el GIL, por lo que incluso el filtro en hilo
+hace tartamudear el loop de Tk con inventarios grandes. En este modo las
+columnas de busqueda se publican una vez por carga en
+``multiprocessing.shared_memory`` y un subproceso dedicado evalua los filtros.
+Por el Pipe solo viajan las opciones del filtro y el largo del resultado; las
+posiciones (iloc) vuelven por un bloque compartido, sin serializar DataFrames.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing as mp
+from dataclasses import asdict, dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from config import EXPIRY_BUCKET_DAYS
+from filters import FilterCancelled, FilterOptions
+from inventory_index import InventoryIndex
+from startup import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+log = logging.getLogger(__name__)
+
+# Columnas de texto publicadas -> columna de origen que los predicados exigen presente
+_TEXT_COLUMNS: Dict[str, str] = {
+    '_lc_producto': 'Nombre_del_Producto',
+    '_lc_codigo': 'Codigo',
+    '_lc_lote': 'Lote',
+    '_lc_ubicacion': 'Ubicacion',
+    '_lc_subfam': 'Subfamilia',
+    '_subfam': 'Subfamilia',
+}
+
+
+def _new_block(nbytes: int) -> shared_memory.SharedMemory:
+    return shared_memory.SharedMemory(create=True, size=max(1, int(nbytes)))
+
+
+def _release(blocks: List[shared_memory.SharedMemory], unlink: bool) -> None:
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # Aun hay vistas numpy vivas; el bloque se libera al recolectarlas
+            pass
+        except Exception:
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except Exception:
+                pass
+    blocks.clear()
+
+
+def _publish_strings(values: pd.Series, blocks: list) -> Tuple[str, int, str]:
+    """Publica una columna de texto como bytes UTF-8 + offsets int64."""
+    encoded = [str(v).encode('utf-8') for v in values.fillna('').tolist()]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    data = b''.join(encoded)
+    data_shm = _new_block(len(data))
+    blocks.append(data_shm)
+    data_shm.buf[:len(data)] = data
+    off_shm = _new_block(offsets.nbytes)
+    blocks.append(off_shm)
+    np.ndarray(offsets.shape, dtype=np.int64, buffer=off_shm.buf)[:] = offsets
+    return data_shm.name, len(data), off_shm.name
+
+
+def _publish_int64(values: np.ndarray, blocks: list) -> shared_memory.SharedMemory:
+    shm = _new_block(values.nbytes)
+    blocks.append(shm)
+    np.ndarray(values.shape, dtype=np.int64, buffer=shm.buf)[:] = values
+    return shm
+
+
+# ---------------- Subproceso ----------------
+class _ChildState:
+    """Vista del inventario publicado, reconstruida en el subproceso."""
+
+    def __init__(self, desc: dict) -> None:
+        self.generation = desc['generation']
+        self.blocks: List[shared_memory.SharedMemory] = []
+        n = desc['rows']
+        cols: Dict[str, pd.Series] = {}
+        for col, (data_name, nbytes, off_name) in desc['strings'].items():
+            data = self._attach(data_name)
+            off = self._attach(off_name)
+            offsets = np.ndarray((n + 1,), dtype=np.int64, buffer=off.buf).tolist()
+            raw = bytes(data.buf[:nbytes])
+            cols[col] = pd.Series([raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(n)], dtype=object)
+        venc = np.ndarray((n,), dtype=np.int64, buffer=self._attach(desc['venc']).buf).copy()
+        cols['_venc_dt'] = pd.Series(venc.view('datetime64[ns]'))
+        # Los predicados solo comprueban que la columna de origen exista
+        for col, src in _TEXT_COLUMNS.items():
+            if col in cols and src not in cols:
+                cols[src] = cols['_subfam'] if src == 'Subfamilia' and '_subfam' in cols else cols[col]
+        cols['Vencimiento'] = cols['_venc_dt']
+        self.stock = np.ndarray((n,), dtype=np.int64, buffer=self._attach(desc['stock']).buf)
+        self.result = np.ndarray((n,), dtype=np.int64, buffer=self._attach(desc['result']).buf)
+        cols['Stock'] = pd.Series(self.stock.copy())
+        self.df = pd.DataFrame(cols)
+        self.index = InventoryIndex.build(self.df, EXPIRY_BUCKET_DAYS)
+
+    def _attach(self, name: str) -> shared_memory.SharedMemory:
+        shm = shared_memory.SharedMemory(name=name)
+        self.blocks.append(shm)
+        return shm
+
+    def run(self, opts: FilterOptions, excluded: tuple, cancelled) -> int:
+        self.df['Stock'] = self.stock.copy()
+        pos = opts.positions(self.df, self.index, cancelled)
+        if excluded and len(pos):
+            if cancelled():
+                raise FilterCancelled()
+            col = self.df['_lc_ubicacion'].iloc[pos]
+            pos = pos[~col.isin(set(excluded)).to_numpy(dtype=bool)]
+        self.result[:len(pos)] = pos
+        return len(pos)
+
+    def close(self) -> None:
+        self.stock = self.result = None
+        _release(self.blocks, unlink=False)
+
+
+def _serve(conn) -> None:
+    """Loop del subproceso: coalesce filtros y corre solo el mas reciente."""
+    state: Optional[_ChildState] = None
+    while True:
+        try:
+            msgs = [conn.recv()]
+            while conn.poll():
+                msgs.append(conn.recv())
+        except (EOFError, OSError):
+            break
+        pending = None
+        for msg in msgs:
+            kind = msg[0]
+            if kind == 'load':
+                if state is not None:
+                    state.close()
+                state = None
+                pending = None
+                try:
+                    state = _ChildState(msg[1])
+                except Exception as exc:
+                    conn.send(('error', 0, f'No se pudo adjuntar memoria compartida: {exc}'))
+            elif kind == 'filter':
+                pending = msg
+            elif kind == 'close':
+                if state is not None:
+                    state.close()
+                return
+        if pending is None or state is None:
+            continue
+        _kind, req_id, generation, opts_dict, excluded = pending
+        if generation != state.generation:
+            continue
+        try:
+            count = state.run(FilterOptions(**opts_dict), excluded, conn.poll)
+            conn.send(('done', req_id, count))
+        except FilterCancelled:
+            continue
+        except Exception as exc:
+            conn.send(('error', req_id, str(exc)))
+    if state is not None:
+        state.close()
+
+
+# ---------------- Lado UI ----------------
+@dataclass
+class SharedSnapshot:
+    """Bloques compartidos de una carga, listos para entregarse al subproceso."""
+
+    blocks: List[shared_memory.SharedMemory]
+    labels: pd.Index
+    desc: dict
+    stock: np.ndarray
+    result: np.ndarray
+
+    def discard(self) -> None:
+        self.stock = self.result = None
+        _release(self.blocks, unlink=True)
+
+
+class SharedFilterService:
+    """Publica el inventario en memoria compartida y delega filtros a un subproceso."""
+
+    def __init__(self) -> None:
+        self._ctx = mp.get_context('spawn')
+        self._conn = None
+        self._proc = None
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self._labels: pd.Index = pd.Index([])
+        self._stock: Optional[np.ndarray] = None
+        self._result: Optional[np.ndarray] = None
+        self._generation = 0
+        self._last_request = 0
+        self._atexit = False
+
+    @property
+    def ready(self) -> bool:
+        return self._proc is not None and self._proc.is_alive() and self._result is not None
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """True si lo publicado corresponde a ``df`` (mismas filas y orden)."""
+        return df is not None and len(df) == len(self._labels) and (
+            df.index is self._labels or df.index.equals(self._labels)
+        )
+
+    def start(self) -> None:
+        if self._proc is not None and self._proc.is_alive():
+            return
+        parent, child = self._ctx.Pipe()
+        self._proc = self._ctx.Process(target=_serve, args=(child,), name='shm-filter', daemon=True)
+        self._proc.start()
+        child.close()
+        self._conn = parent
+        if not self._atexit:
+            atexit.register(self.close)
+            self._atexit = True
+
+    def publish(self, df: pd.DataFrame) -> None:
+        """Publica las columnas de busqueda de ``df`` (una vez por carga)."""
+        self.activate(self.prepare(df))
+
+    @staticmethod
+    def prepare(df: pd.DataFrame) -> 'SharedSnapshot':
+        """Copia las columnas a bloques compartidos nuevos.
+
+        No toca el estado del servicio, por lo que puede correr en el hilo de
+        carga; :meth:`activate` (hilo UI) la entrega luego al subproceso.
+        """
+        n = len(df)
+        blocks: List[shared_memory.SharedMemory] = []
+        try:
+            strings = {
+                col: _publish_strings(df[col], blocks)
+                for col in _TEXT_COLUMNS if col in df.columns
+            }
+            if '_venc_dt' in df.columns:
+                vdt = df['_venc_dt']
+            else:
+                vdt = pd.to_datetime(df['Vencimiento'], errors='coerce')
+            venc_shm = _publish_int64(vdt.to_numpy(dtype='datetime64[ns]').view('i8'), blocks)
+            stock = pd.to_numeric(df['Stock'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+            stock_shm = _publish_int64(stock, blocks)
+            result_shm = _new_block(n * 8)
+            blocks.append(result_shm)
+        except Exception:
+            _release(blocks, unlink=True)
+            raise
+        return SharedSnapshot(
+            blocks=blocks,
+            labels=df.index,
+            desc={
+                'rows': n,
+                'strings': strings,
+                'venc': venc_shm.name,
+                'stock': stock_shm.name,
+                'result': result_shm.name,
+            },
+            stock=np.ndarray((n,), dtype=np.int64, buffer=stock_shm.buf),
+            result=np.ndarray((n,), dtype=np.int64, buffer=result_shm.buf),
+        )
+
+    def activate(self, snapshot: 'SharedSnapshot') -> None:
+        """Reemplaza lo publicado por ``snapshot`` y avisa al subproceso."""
+        self.start()
+        self._stock = self._result = None
+        _release(self._blocks, unlink=True)
+        self._blocks = snapshot.blocks
+        self._labels = snapshot.labels
+        self._stock = snapshot.stock
+        self._result = snapshot.result
+        self._generation += 1
+        self._conn.send(('load', dict(snapshot.desc, generation=self._generation)))
+
+    def update_stock(self, changes) -> None:
+        """Escribe en el bloque compartido los cambios ``(fila, viejo, nuevo)``."""
+        if self._stock is None or not changes:
+            return
+        pos = self._labels.get_indexer([c[0] for c in changes])
+        new = np.array([c[2] for c in changes], dtype=np.int64)
+        ok = pos >= 0
+        self._stock[pos[ok]] = new[ok]
+
+    def submit(self, opts: FilterOptions, excluded: tuple) -> int:
+        """Envia un filtro; devuelve su id (solo el ultimo id enviado es valido)."""
+        self._last_request += 1
+        self._conn.send(('filter', self._last_request, self._generation, asdict(opts), tuple(excluded)))
+        return self._last_request
+
+    def poll(self) -> List[tuple]:
+        """Resultados listos: ``('done', id, posiciones)`` o ``('error', id, texto)``.
+
+        Las posiciones se copian del bloque compartido; solo se leen para la
+        ultima solicitud, asi el subproceso nunca escribe mientras se copian.
+        """
+        out: List[tuple] = []
+        if self._conn is None:
+            return out
+        try:
+            while self._conn.poll():
+                kind, req_id, payload = self._conn.recv()
+                if kind == 'done':
+                    if req_id == self._last_request and self._result is not None:
+                        out.append(('done', req_id, self._result[:payload].copy()))
+                else:
+                    out.append(('error', req_id, payload))
+        except (EOFError, OSError) as exc:
+            out.append(('error', self._last_request, f'Subproceso de filtro termino: {exc}'))
+            self._conn = None
+        return out
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.send(('close',))
+            except Exception:
+                pass
+        if self._proc is not None:
+            self._proc.join(timeout=1.0)
+            if self._proc.is_alive():
+                self._proc.terminate()
+        self._conn = self._proc = None
+        self._stock = self._result = None
+        _release(self._blocks, unlink=True)
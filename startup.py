@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Arranque rapido: modulos pesados diferidos y tiempos por fase.
+
+numpy y pandas (y reportlab via ``pdf_utils``) sumaban cerca de medio segundo
+de imports antes de que apareciera cualquier ventana. Los modulos de la app
+los toman con :func:`lazy_module`, que devuelve un modulo sustituto: el import
+real ocurre en el primer acceso a un atributo (``np.arange``, ``pd.Series``...)
+y desde ahi el sustituto expone los mismos atributos que el modulo real. Como
+las anotaciones son texto (``from __future__ import annotations``) y ningun
+modulo usa numpy/pandas al importarse, importar la app ya no los carga.
+reportlab y pypdf se importan dentro de las funciones que generan o unen PDFs.
+
+:data:`STARTUP` anota el tiempo de cada fase desde que se importo este modulo
+(``run_app.py`` lo importa primero).
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import threading
+import time
+import types
+from typing import List, Optional, Tuple
+
+_T0 = time.perf_counter()
+
+# Modulos que no deben cargarse antes de la primera ventana
+HEAVY_MODULES: Tuple[str, ...] = ('numpy', 'pandas', 'reportlab', 'pypdf', 'PyPDF2')
+
+
+class _LazyModule(types.ModuleType):
+    """Sustituto de un modulo que lo importa en el primer acceso a un atributo."""
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self.__name__)
+        # Copiar el espacio de nombres: los accesos siguientes no pasan por aqui
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """``np = lazy_module('numpy')`` en lugar de ``import numpy as np``."""
+    module = sys.modules.get(name)
+    return module if module is not None else _LazyModule(name)
+
+
+def loaded_heavy_modules() -> List[str]:
+    """Modulos de :data:`HEAVY_MODULES` ya importados en este proceso."""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+class StartupTimer:
+    """Marcas de tiempo del arranque, en ms desde la importacion de este modulo."""
+
+    def __init__(self, t0: float = _T0) -> None:
+        self.t0 = t0
+        self.marks: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> float:
+        now = time.perf_counter()
+        with self._lock:
+            self.marks.append((phase, now))
+        return (now - self.t0) * 1000.0
+
+    def has(self, phase: str) -> bool:
+        return any(name == phase for name, _t in self.marks)
+
+    def elapsed(self, phase: str) -> Optional[float]:
+        """ms desde el inicio hasta ``phase`` (None si aun no ocurre)."""
+        for name, t in self.marks:
+            if name == phase:
+                return (t - self.t0) * 1000.0
+        return None
+
+    def report(self) -> str:
+        """``Arranque: imports 80 ms, ventana 60 ms, ... (total 900 ms)``."""
+        with self._lock:
+            marks = list(self.marks)
+        if not marks:
+            return 'Arranque: sin marcas'
+        parts = []
+        prev = self.t0
+        for name, t in marks:
+            parts.append(f'{name} {(t - prev) * 1000.0:.0f} ms')
+            prev = t
+        return f"Arranque: {', '.join(parts)} (total {(marks[-1][1] - self.t0) * 1000.0:.0f} ms)"
+
+
+STARTUP = StartupTimer()
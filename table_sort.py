@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Orden de tablas sobre los datos de respaldo, no sobre las celdas del Treeview.
+
+Cada columna se convierte a un rango entero segun su tipo (fecha real, entero,
+numero o texto sin acentos ni mayusculas) y el orden de varias columnas sale de
+un solo ``np.lexsort``, que es estable: las filas empatadas conservan el orden
+que traian. Los vacios quedan siempre al final, en ambas direcciones.
+"""
+
+from __future__ import annotations
+
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+from startup import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+TEXT = 'text'
+INT = 'int'
+NUMBER = 'number'
+DATE = 'date'
+
+
+def fold_text(value) -> str:
+    """Clave de texto para comparar: sin acentos y en minusculas (``Ñandú`` -> ``nandu``)."""
+    s = unicodedata.normalize('NFD', str(value))
+    return ''.join(ch for ch in s if unicodedata.category(ch) != 'Mn').casefold().strip()
+
+
+def sort_ranks(values, kind: str = TEXT, reverse: bool = False) -> np.ndarray:
+    """Rango denso de cada valor segun ``kind``; los vacios reciben el mayor rango."""
+    s = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    s = s.reset_index(drop=True)
+    if kind == DATE:
+        s = pd.to_datetime(s, errors='coerce')
+    elif kind in (INT, NUMBER):
+        s = pd.to_numeric(s, errors='coerce')
+    elif s.dtype == object or str(s.dtype) in ('string', 'category'):
+        # Se pliegan solo los valores distintos
+        codes, uniques = pd.factorize(s)
+        # El ultimo elemento recibe los vacios (codigo -1)
+        folded = np.array([fold_text(u) or None for u in uniques] + [None], dtype=object)
+        s = pd.Series(folded[codes], dtype=object)
+    codes, uniques = pd.factorize(s, sort=True)
+    n = len(uniques)
+    ranks = codes.astype(np.int64)
+    valid = ranks >= 0
+    if reverse:
+        ranks[valid] = n - 1 - ranks[valid]
+    ranks[~valid] = n
+    return ranks
+
+
+@dataclass
+class SortSpec:
+    """Columnas de orden activas de una tabla: ``[(columna, descendente), ...]``."""
+
+    keys: List[Tuple[str, bool]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.keys)
+
+    def click(self, col: str, extend: bool = False) -> None:
+        """Clic en un encabezado; con ``extend`` (Shift) agrega o invierte un criterio."""
+        for i, (name, rev) in enumerate(self.keys):
+            if name == col:
+                if extend:
+                    self.keys[i] = (col, not rev)
+                else:
+                    self.keys = [(col, not rev if i == 0 else False)]
+                return
+        if extend:
+            self.keys.append((col, False))
+        else:
+            self.keys = [(col, False)]
+
+    def clear(self) -> None:
+        self.keys = []
+
+    def heading(self, col: str, text: str) -> str:
+        """Texto del encabezado con la flecha (y el orden, si hay varios criterios)."""
+        for i, (name, rev) in enumerate(self.keys):
+            if name == col:
+                arrow = '▼' if rev else '▲'
+                return f'{text} {arrow}{i + 1 if len(self.keys) > 1 else ""}'
+        return text
+
+
+def sort_order(columns: Mapping[str, Sequence], spec: SortSpec, kinds: Dict[str, str]) -> np.ndarray:
+    """Permutacion que ordena las filas segun ``spec`` (estable).
+
+    ``columns`` da, por nombre de columna, los valores de todas las filas en su
+    orden actual; solo se leen las columnas que participan del orden.
+    """
+    keys = [sort_ranks(columns[col], kinds.get(col, TEXT), rev) for col, rev in spec.keys if col in columns]
+    if not keys:
+        n = len(next(iter(columns.values()))) if columns else 0
+        return np.arange(n, dtype=np.int64)
+    # lexsort usa la ultima clave como principal
+    return np.lexsort(keys[::-1]).astype(np.int64)
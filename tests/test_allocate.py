@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from inventory_index import InventoryIndex, prepare_search_columns
+from vale_manager import ValeManager
+
+
+def _day(offset: int) -> str:
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+@pytest.fixture
+def manager():
+    df = pd.DataFrame({
+        'Nombre_del_Producto': ['Agar Sangre'] * 4 + ['Caldo'],
+        'Codigo': ['A1'] * 4 + ['C1'],
+        'Lote': ['VENCIDO', 'L-200', 'L-030', 'L-090', 'C-1'],
+        'Vencimiento': [_day(-10), _day(200), _day(30), _day(90), _day(60)],
+        'Ubicacion': ['A-01-1', 'A-02-1', 'B-01-1', 'A-01-2', 'C-01-1'],
+        'Bodega': ['Central'] * 5,
+        'Stock': [50, 10, 4, 5, 3],
+    })
+    prepare_search_columns(df)
+    vm = ValeManager(bioplates_inventory=df, index=InventoryIndex.build(df))
+    vm.sort_by_route_enabled = False
+    return vm
+
+
+def _taken(result):
+    return [(it['Lote'], it['Cantidad']) for it in result.lines]
+
+
+def test_fefo_skips_expired_lots(manager):
+    result = manager.allocate('A1', 6)
+    assert result.complete
+    # Vence antes primero; el lote vencido no se toca
+    assert _taken(result) == [('L-030', 4), ('L-090', 2)]
+    stock = manager.bioplates_inventory['Stock'].tolist()
+    assert stock == [50, 10, 0, 3, 3]
+
+
+def test_include_expired(manager):
+    result = manager.allocate('A1', 52, include_expired=True)
+    assert _taken(result) == [('VENCIDO', 50), ('L-030', 2)]
+
+
+def test_same_product_by_code_and_by_name_shares_stock(manager):
+    result = manager.allocate([('A1', 3), ('agar sangre', 3)])
+    assert result.complete
+    # La segunda linea sigue donde la primera dejo el lote L-030 (4 -> 1)
+    assert [(it['Lote'], it['Cantidad']) for it in manager.current_vale] == [('L-030', 4), ('L-090', 2)]
+
+
+def test_shortfall_is_reported(manager):
+    result = manager.allocate([('A1', 25), ('C1', 1), ('NO-EXISTE', 2)])
+    assert not result.complete
+    assert dict(result.shortfall) == {'A1': 6, 'NO-EXISTE': 2}
+    # Lo disponible se asigna igual
+    assert sum(q for lot, q in _taken(result) if lot.startswith('L-')) == 19
+
+
+def test_invalid_quantity(manager):
+    with pytest.raises(ValueError):
+        manager.allocate('A1', 0)
+    with pytest.raises(ValueError):
+        manager.allocate('A1')
+
+
+def test_readd_items_after_reload(manager):
+    manager.add_to_vale(1, 3)
+    manager.add_to_vale(4, 2)
+    items = manager.current_vale
+    manager.current_vale = []
+    # Recarga: filas en otro orden y el stock sin el descuento anterior
+    df = manager.bioplates_inventory.iloc[::-1].reset_index(drop=True)
+    df.loc[df['Lote'] == 'L-200', 'Stock'] = 10
+    df.loc[df['Lote'] == 'C-1', 'Stock'] = 1
+    prepare_search_columns(df)
+    manager.bioplates_inventory = df
+    manager.index = InventoryIndex.build(df)
+
+    missing = manager.readd_items(items)
+    assert [it['Lote'] for it in missing] == ['C-1']
+    assert [(it['Lote'], it['Cantidad']) for it in manager.current_vale] == [('L-200', 3)]
+    row = manager.current_vale[0]['Stock_Original_Index']
+    assert df.at[row, 'Lote'] == 'L-200' and df.at[row, 'Stock'] == 7
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from inventory_index import InventoryIndex, expiry_bucket_labels
+
+
+def _inventory():
+    def day(offset):
+        return (date.today() + timedelta(days=offset)).isoformat()
+
+    return pd.DataFrame({
+        'Nombre_del_Producto': ['Agar'] * 6,
+        'Vencimiento': [day(-1), day(10), day(45), day(150), day(400), ''],
+        'Stock': [1, 2, 3, 4, 5, 6],
+        'Subfamilia': ['Placas'] * 6,
+        'Bodega': ['Central'] * 6,
+    })
+
+
+@pytest.mark.parametrize('edges', [(30, 60, 90), (30, 60, 90, 180), (15,)])
+def test_bucket_codes_follow_the_edges(edges):
+    index = InventoryIndex.build(_inventory(), edges)
+    labels = expiry_bucket_labels(edges)
+    assert index.bucket_sin_fecha == len(labels) - 1
+    assert index.agg_units.shape[0] == len(labels)
+    totals = {label: units for label, _lots, units in index.bucket_totals()}
+    assert totals['Sin fecha'] == 6
+    over = sum(units for days, units in ((45, 3), (150, 4), (400, 5)) if days > edges[-1])
+    assert totals[f'Mas de {edges[-1]} dias'] == over
+    assert sum(totals.values()) == 21
+
+
+def test_expiry_tags_from_buckets():
+    index = InventoryIndex.build(_inventory(), (30, 60, 90))
+    # Todos los lotes de un mismo producto: se marca por tramo, no solo el mas proximo
+    assert index.expiry_tags(range(6)).tolist() == ['vencido', 'vencimiento_proximo', '', '', '', '']
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import pytest
+
+from filters import FilterCache, QueryError, parse_query
+from inventory_index import InventoryIndex, prepare_search_columns
+
+
+@pytest.fixture
+def inventory():
+    df = pd.DataFrame({
+        'Nombre_del_Producto': ['Agar Sangre', 'Agar Chocolate', 'Caldo Tioglicolato', 'Placa Petri'],
+        'Codigo': ['A1', 'A2', 'C1', 'P1'],
+        'Lote': ['L1', 'L2', 'L3', 'L4'],
+        'Bodega': ['Central'] * 4,
+        'Ubicacion': ['A-01-1', 'A-02-1', 'B-01-2', 'B-03-1'],
+        'Vencimiento': ['2025-12-01', '2026-01-15', '2026-03-10', ''],
+        'Stock': [0, 3, 5, 7],
+        'Subfamilia': ['Placas', 'Placas', 'Caldos', 'Placas'],
+    })
+    prepare_search_columns(df)
+    return df, InventoryIndex.build(df)
+
+
+def _rows(df, index, query):
+    opts = parse_query(query)
+    scanned = opts.positions(df).tolist()
+    # Con y sin indice el resultado debe ser el mismo
+    assert opts.positions(df, index).tolist() == scanned
+    return scanned
+
+
+def test_words_and_negated_words(inventory):
+    df, index = inventory
+    assert _rows(df, index, 'agar') == [0, 1]
+    assert _rows(df, index, 'agar -chocolate') == [0]
+    assert _rows(df, index, '-lote:l3 -ubic:b-03') == [0, 1]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('stock>0', [1, 2, 3]),
+    ('stock<5', [0, 1]),
+    ('stock<=5', [0, 1, 2]),
+    ('stock=3', [1]),
+    ('stock:3', [1]),
+    ('stock>=3 stock<=5', [1, 2]),
+    ('-stock>0', [0]),
+    ('-stock=3', [0, 2, 3]),
+    ('-stock<5', [2, 3]),
+])
+def test_stock_predicates(inventory, query, expected):
+    df, index = inventory
+    assert _rows(df, index, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('venc:2026', [1, 2]),
+    ('venc:2026-01', [1]),
+    ('venc<2026', [0]),
+    ('venc<=2026-01', [0, 1]),
+    ('venc>2026-01', [2]),
+    ('venc>=2026-01-15', [1, 2]),
+    # Negado: se descartan las fechas del rango; las filas sin fecha quedan
+    ('-venc<2026', [1, 2, 3]),
+    ('-venc:2026-01', [0, 2, 3]),
+    ('venc>=2026 -venc:2026-03', [1]),
+])
+def test_venc_month_and_year_bounds(inventory, query, expected):
+    df, index = inventory
+    assert _rows(df, index, query) == expected
+
+
+def test_negated_ranges_in_signature():
+    assert parse_query('stock>0').signature() != parse_query('-stock>0').signature()
+    assert parse_query('venc<2026').signature() != parse_query('-venc<2026').signature()
+
+
+@pytest.mark.parametrize('query', ['venc:2026-13', 'venc<ayer', 'stock>abc', '-stock>=1.5', 'lote>3'])
+def test_bad_tokens_raise(query):
+    with pytest.raises(QueryError) as err:
+        parse_query('agar ' + query)
+    assert err.value.token == query
+
+
+def test_cache_drops_entries_crossing_stock_cuts():
+    cache = FilterCache()
+    cache.put(('max',), None, parse_query('stock<=5').stock_cuts())
+    cache.put(('text',), None, parse_query('agar').stock_cuts())
+    # 5 -> 6 cruza el maximo; el filtro de texto no depende del stock
+    assert cache.invalidate_rows([(0, 5, 6)]) == 1
+    assert ('max',) not in cache and ('text',) in cache
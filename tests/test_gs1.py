@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from gs1 import GS, parse_scan
+
+
+def test_parenthesized_form():
+    scan = parse_scan('(01)07801234567895(17)260131(10)L123')
+    assert scan.is_gs1
+    assert scan.gtin == '07801234567895'
+    assert scan.expiry == '2026-01-31'
+    assert scan.lot == 'L123'
+    assert scan.code == '07801234567895'
+
+
+def test_fnc1_form_with_symbology_prefix():
+    # Lote (variable) terminado por FNC1 y seguido de serie y cantidad
+    scan = parse_scan(']C1' + '0107801234567895' + '10AB-12' + GS + '21S99' + GS + '3712')
+    assert scan.is_gs1
+    assert scan.gtin == '07801234567895'
+    assert scan.lot == 'AB-12'
+    assert scan.serial == 'S99'
+    assert scan.quantity == 12
+    assert scan.raw.startswith('01')
+
+
+def test_both_forms_agree():
+    paren = parse_scan('(01)07801234567895(10)LOTE7(17)261015')
+    fnc1 = parse_scan('0107801234567895' + '10LOTE7' + GS + '17261015')
+    assert (paren.gtin, paren.lot, paren.expiry) == (fnc1.gtin, fnc1.lot, fnc1.expiry)
+
+
+@pytest.mark.parametrize('yymmdd, expected', [
+    ('260200', '2026-02-28'),
+    ('280200', '2028-02-29'),   # bisiesto
+    ('261200', '2026-12-31'),
+    ('260400', '2026-04-30'),
+])
+def test_day_00_is_last_day_of_month(yymmdd, expected):
+    assert parse_scan(f'(01)07801234567895(17){yymmdd}').expiry == expected
+
+
+def test_invalid_date_is_ignored():
+    scan = parse_scan('(01)07801234567895(17)261340')
+    assert scan.is_gs1 and scan.expiry is None
+
+
+@pytest.mark.parametrize('raw', ['PL-0042', '7801234567895', '(99)ABC'])
+def test_plain_codes_are_not_gs1(raw):
+    scan = parse_scan(raw + '\r\n')
+    assert not scan.is_gs1
+    assert scan.code == raw
+
+
+def test_scan_resolves_to_inventory_rows():
+    import pandas as pd
+    from inventory_index import InventoryIndex
+
+    df = pd.DataFrame({
+        'Codigo': ['7801234567895', '7801234567895', 'PL-0042'],
+        'Lote': ['L123', 'L124', 'X1'],
+        'Vencimiento': ['2026-01-31', '2026-05-31', ''],
+    })
+    index = InventoryIndex.build(df)
+    scan = parse_scan('(01)07801234567895(10)l124')
+    # El GTIN-14 con cero inicial encuentra el codigo guardado sin el
+    assert index.scan_lookup(scan.gtin).tolist() == [0, 1]
+    assert index.scan_lookup(scan.gtin, scan.lot).tolist() == [1]
+    assert index.scan_lookup(parse_scan('pl-0042').code).tolist() == [2]
+    assert index.scan_lookup(lote='nada').tolist() == []
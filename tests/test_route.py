@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from inventory_index import route_order
+from vale_manager import sort_by_route
+
+
+def _walk(locations):
+    return [locations[i] for i in route_order(locations)]
+
+
+def test_serpentine_through_aisles_and_levels():
+    locations = [
+        'A-02-1-1', 'A-01-2-1', 'A-01-1-2', 'A-02-2-1',
+        'A-01-1-1', 'A-01-2-2', 'A-10-1-1', 'B-01-1-1',
+    ]
+    assert _walk(locations) == [
+        # Pasillo 01 de ida; el rack 2 recorre sus niveles al reves
+        'A-01-1-1', 'A-01-1-2', 'A-01-2-2', 'A-01-2-1',
+        # Pasillo 02 de vuelta
+        'A-02-2-1', 'A-02-1-1',
+        # Orden natural: 10 va despues de 02
+        'A-10-1-1',
+        'B-01-1-1',
+    ]
+
+
+def test_blanks_last_and_ties_stable():
+    locations = ['', 'A-01-1-1', None, 'a-01-1-1', 'A-01-1-1']
+    order = list(route_order(locations))
+    assert order == [1, 3, 4, 0, 2]
+
+
+def test_sort_by_route_on_vale_lines():
+    lines = [
+        {'Producto': 'x', 'Ubicacion': 'B-01-1'},
+        {'Producto': 'y', 'Ubicacion': 'A-01-1'},
+        {'Producto': 'z'},
+    ]
+    assert [it['Producto'] for it in sort_by_route(lines)] == ['y', 'x', 'z']
+    assert route_order([]).tolist() == []
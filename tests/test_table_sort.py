@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from table_sort import DATE, INT, SortSpec, fold_text, sort_order, sort_ranks
+
+
+def test_fold_text():
+    assert fold_text('  Ñandú ') == 'nandu'
+    assert fold_text('ÁGAR') == fold_text('agar')
+
+
+def test_accent_folded_text_sort():
+    values = ['Zanahoria', 'ágar', 'Agar', 'caldo', 'Éter']
+    order = sort_order({'p': values}, SortSpec([('p', False)]), {})
+    # ágar y Agar empatan y conservan su orden de entrada
+    assert [values[i] for i in order] == ['ágar', 'Agar', 'caldo', 'Éter', 'Zanahoria']
+
+
+@pytest.mark.parametrize('reverse, expected', [
+    (False, [1, 2, 2, 0, 2]),
+    (True, [0, 2, 2, 1, 2]),
+])
+def test_blanks_last_in_both_directions(reverse, expected):
+    assert sort_ranks(['b', '', None, 'a', '  '], reverse=reverse).tolist() == expected
+
+
+def test_dates_and_ints_sort_by_value():
+    assert sort_ranks(['2026-02-01', '2025-12-31', 'sin fecha'], DATE).tolist() == [1, 0, 2]
+    assert sort_ranks(['10', '9', '', '100'], INT).tolist() == [1, 0, 3, 2]
+
+
+def test_stable_multi_column_sort():
+    columns = {
+        'Producto': ['Caldo', 'agar', 'Ágar', 'caldo', ''],
+        'Vencimiento': ['2026-05-01', '2026-03-01', '2026-03-01', '', '2026-01-01'],
+    }
+    spec = SortSpec()
+    spec.click('Producto')
+    spec.click('Vencimiento', extend=True)
+    spec.click('Vencimiento', extend=True)   # segundo Shift+clic: descendente
+    assert spec.keys == [('Producto', False), ('Vencimiento', True)]
+    order = sort_order(columns, spec, {'Vencimiento': DATE}).tolist()
+    # agar/Ágar empatan en ambas claves: quedan en su orden; sin fecha y sin
+    # producto al final de su grupo
+    assert order == [1, 2, 0, 3, 4]
+
+
+def test_sortspec_click_cycle_and_heading():
+    spec = SortSpec()
+    spec.click('A')
+    spec.click('A')
+    assert spec.keys == [('A', True)]
+    spec.click('B')
+    assert spec.keys == [('B', False)]
+    spec.click('C', extend=True)
+    assert spec.heading('C', 'Col') == 'Col ▲2'
+    assert spec.heading('X', 'Col') == 'Col'
+    assert sort_order({'A': [3, 1]}, SortSpec(), {}).tolist() == [0, 1]
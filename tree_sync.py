@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Actualizacion minima de un ``ttk.Treeview`` a partir de la lista nueva de filas.
+
+Los refrescos de historial, gestor y solicitud borraban todos los items y los
+volvian a insertar. :class:`TreeSync` compara la lista ordenada de iids que
+hay en el arbol con la nueva y aplica solo lo necesario:
+
+* borra (en un solo ``delete``) los iids que ya no estan;
+* conserva en su lugar la subsecuencia creciente mas larga de los que siguen
+  (LIS), de modo que insertar o quitar una fila no desplaza a las demas;
+* desprende (``detach``) y reubica solo los que cambiaron de orden;
+* inserta los nuevos en su indice final;
+* llama a ``item()`` solo si cambian los valores o los tags.
+
+Con ``stripes`` el zebra se asigna junto con la fila (tag par/impar segun su
+indice final), asi que solo se retocan las filas cuya paridad cambio; no hay
+una pasada aparte que lea y reescriba los tags de todo el arbol.
+
+El orden real se lee del arbol en cada pasada, por lo que tolera que otro
+codigo (p. ej. ordenar por columna) haya movido items entre refrescos.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (iid, valores, tags)
+Row = Tuple[str, Sequence, Sequence]
+
+
+@dataclass
+class SyncStats:
+    """Operaciones aplicadas al Treeview en una sincronizacion."""
+
+    deleted: int = 0
+    inserted: int = 0
+    updated: int = 0
+    moved: int = 0
+
+    @property
+    def ops(self) -> int:
+        return self.deleted + self.inserted + self.updated + self.moved
+
+
+def stable_positions(seq: Sequence[int]) -> List[int]:
+    """Indices de una subsecuencia estrictamente creciente mas larga de ``seq``.
+
+    O(n log n) con el metodo de paciencia; los elementos fuera de ella son los
+    unicos que hay que mover para que el orden coincida.
+    """
+    tails: List[int] = []       # valor final de cada largo
+    tails_at: List[int] = []    # indice en seq de ese valor
+    prev = [-1] * len(seq)
+    for i, v in enumerate(seq):
+        k = bisect_left(tails, v)
+        if k == len(tails):
+            tails.append(v)
+            tails_at.append(i)
+        else:
+            tails[k] = v
+            tails_at[k] = i
+        prev[i] = tails_at[k - 1] if k else -1
+    out: List[int] = []
+    i = tails_at[-1] if tails_at else -1
+    while i >= 0:
+        out.append(i)
+        i = prev[i]
+    out.reverse()
+    return out
+
+
+class TreeSync:
+    """Sincroniza los hijos de ``parent`` en ``tree`` con listas de filas sucesivas."""
+
+    def __init__(
+        self,
+        tree,
+        parent: str = '',
+        stripes: Optional[Tuple[str, str]] = None,
+        keep: Sequence[str] = (),
+    ) -> None:
+        """``stripes`` = (tag_par, tag_impar); las filas con algun tag de ``keep``
+        (p. ej. de vencimiento) no reciben zebra."""
+        self.tree = tree
+        self.parent = parent
+        self.stripes = stripes
+        self.keep = frozenset(keep)
+        # iid -> (valores, tags propios, tags aplicados con zebra)
+        self._state: Dict[str, Tuple[tuple, tuple, tuple]] = {}
+        self.last = SyncStats()
+
+    def reset(self) -> None:
+        """Olvida lo conocido; la proxima pasada reescribe valores y tags."""
+        self._state.clear()
+
+    def _tags(self, tags: tuple, k: int) -> tuple:
+        if self.stripes is None or (self.keep and not self.keep.isdisjoint(tags)):
+            return tags
+        return tags + (self.stripes[k % 2],)
+
+    def reorder(self, iids: Sequence[str]) -> SyncStats:
+        """Reordena las filas ya sincronizadas sin volver a leer su contenido."""
+        return self.apply([(iid, self._state[iid][0], self._state[iid][1]) for iid in iids if iid in self._state])
+
+    def apply(self, rows: Iterable[Row]) -> SyncStats:
+        tree, parent = self.tree, self.parent
+        stats = SyncStats()
+        new_rows = [(str(iid), tuple(values), tuple(tags or ())) for iid, values, tags in rows]
+        new_index = {iid: k for k, (iid, _v, _t) in enumerate(new_rows)}
+
+        current = list(tree.get_children(parent))
+        stale = [iid for iid in current if iid not in new_index]
+        if stale:
+            tree.delete(*stale)
+            stats.deleted = len(stale)
+            for iid in stale:
+                self._state.pop(iid, None)
+        kept = [iid for iid in current if iid in new_index]
+
+        # Los que forman la subsecuencia creciente mas larga quedan donde estan
+        order = [new_index[iid] for iid in kept]
+        anchored = {kept[i] for i in stable_positions(order)}
+        loose = [iid for iid in kept if iid not in anchored]
+        if loose:
+            tree.detach(*loose)
+        present = set(kept)
+        if len(self._state) > len(present):
+            self._state = {iid: st for iid, st in self._state.items() if iid in present}
+
+        for k, (iid, values, tags) in enumerate(new_rows):
+            shown = self._tags(tags, k)
+            if iid not in present:
+                tree.insert(parent, k, iid=iid, values=values, tags=shown)
+                self._state[iid] = (values, tags, shown)
+                stats.inserted += 1
+                continue
+            if iid not in anchored:
+                tree.move(iid, parent, k)
+                stats.moved += 1
+            old = self._state.get(iid)
+            if old is None or old[0] != values:
+                tree.item(iid, values=values, tags=shown)
+                stats.updated += 1
+            elif old[2] != shown:
+                tree.item(iid, tags=shown)
+                stats.updated += 1
+            self._state[iid] = (values, tags, shown)
+        self.last = stats
+        return stats
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Refresco central de vistas: se marcan sucias y se redibujan una vez por cuadro.
+
+Cada vista (filtro de productos, historial, gestor) tenia su propio
+``after()`` de espera, y acciones como cambiar el estado de un vale llamaban a
+``refresh_manager()`` y ``refresh_history()`` seguidas en el mismo evento.
+:class:`RefreshScheduler` junta todo en un solo temporizador:
+
+* ``invalidate(vista, delay_ms)`` marca la vista como sucia; varias marcas
+  antes del proximo cuadro cuentan como una. Con ``delay_ms`` (tipear en un
+  buscador) cada marca nueva corre la espera, igual que el antiguo debounce;
+* cada cuadro (``frame_ms``) redibuja las vistas vencidas por prioridad hasta
+  agotar ``budget_ms``; las que no alcanzan quedan para el cuadro siguiente;
+* una vista cuyo render es un generador avanza de a un ``yield`` por vez y
+  puede repartir su trabajo en varios cuadros. Si se vuelve a marcar sucia
+  mientras tanto, su render empieza de nuevo. Las vistas de la app ceden entre
+  calcular y dibujar (filtro, historial, gestor) y el selector de productos
+  cede cada bloque de claves revisadas;
+* ``render_now(vista)`` corre el render completo de inmediato, para las
+  llamadas directas (``refresh_history()``...) que necesitan el resultado ya.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _View:
+    name: str
+    render: Callable[[], Optional[Iterator]]
+    priority: int = 0
+    due: Optional[float] = None          # momento (perf_counter) en que vence; None = limpia
+    job: Optional[Iterator] = None       # render repartido en cuadros, en curso
+    renders: int = 0
+    invalidations: int = 0
+
+
+class RefreshScheduler:
+    """Temporizador unico que redibuja vistas sucias dentro de un presupuesto por cuadro."""
+
+    def __init__(self, master, frame_ms: int = 16, budget_ms: float = 12.0) -> None:
+        self.master = master
+        self.frame_ms = int(frame_ms)
+        self.budget_ms = float(budget_ms)
+        self._views: Dict[str, _View] = {}
+        self._after_id = None
+        self._after_due: Optional[float] = None
+        self._running = False
+
+    def register(self, name: str, render: Callable[[], Optional[Iterator]], priority: int = 0) -> None:
+        """``render`` redibuja la vista; si devuelve un generador se reparte en cuadros.
+
+        Menor ``priority`` se atiende primero dentro de un cuadro.
+        """
+        self._views[name] = _View(name, render, priority)
+
+    def unregister(self, name: str) -> None:
+        """Olvida la vista (p. ej. al cerrar su dialogo) y suelta su render."""
+        self._views.pop(name, None)
+
+    def invalidate(self, name: str, delay_ms: int = 0) -> None:
+        view = self._views.get(name)
+        if view is None:
+            return
+        now = time.perf_counter()
+        due = now + max(0, delay_ms) / 1000.0
+        view.invalidations += 1
+        if view.due is not None and (delay_ms <= 0 or view.due <= now):
+            # Ya estaba sucia: se respeta la marca mas urgente
+            due = min(view.due, due)
+        view.due = due
+        view.job = None
+        self._arm()
+
+    def pending(self, name: str) -> bool:
+        view = self._views.get(name)
+        return view is not None and (view.due is not None or view.job is not None)
+
+    def cancel(self, name: str) -> None:
+        view = self._views.get(name)
+        if view is not None:
+            view.due = None
+            view.job = None
+
+    def render_now(self, name: str) -> None:
+        """Redibuja la vista ya y completa, aunque no estuviera marcada."""
+        view = self._views.get(name)
+        if view is None:
+            return
+        view.due = None
+        view.job = None
+        self._finish(view)
+
+    def flush(self, name: Optional[str] = None) -> None:
+        """Redibuja ya (sin presupuesto) la vista indicada, o todas las sucias."""
+        for view in self._ordered():
+            if name is None or view.name == name:
+                if view.due is not None or view.job is not None:
+                    view.due = None
+                    self._finish(view)
+
+    def stats(self) -> Dict[str, tuple]:
+        """Por vista: (marcas recibidas, renders hechos)."""
+        return {v.name: (v.invalidations, v.renders) for v in self._views.values()}
+
+    # ---------------- Temporizador ----------------
+    def _ordered(self):
+        return sorted(self._views.values(), key=lambda v: v.priority)
+
+    def _arm(self) -> None:
+        """Programa el proximo cuadro para la vista que vence primero."""
+        if self._running:
+            return   # _tick reprograma al terminar
+        dues = [v.due for v in self._views.values() if v.due is not None]
+        if any(v.job is not None for v in self._views.values()):
+            dues.append(time.perf_counter() + self.frame_ms / 1000.0)
+        if not dues:
+            return
+        due = min(dues)
+        if self._after_id is not None and self._after_due is not None and self._after_due <= due:
+            return
+        if self._after_id is not None:
+            try:
+                self.master.after_cancel(self._after_id)
+            except Exception:
+                pass
+        delay = max(1, int(round((due - time.perf_counter()) * 1000.0)))
+        try:
+            self._after_id = self.master.after(delay, self._tick)
+            self._after_due = due
+        except Exception:
+            self._after_id = None   # ventana destruida
+            self._after_due = None
+
+    def _tick(self) -> None:
+        self._after_id = None
+        self._after_due = None
+        self._running = True
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000.0
+        try:
+            for view in self._ordered():
+                if time.perf_counter() >= deadline:
+                    break
+                if view.job is None:
+                    if view.due is None or view.due > start:
+                        continue
+                    # Las marcas que lleguen durante el render valen para el proximo cuadro
+                    view.due = None
+                    if not self._start(view):
+                        continue
+                self._step(view, deadline)
+        finally:
+            self._running = False
+        self._arm()
+
+    def _start(self, view: _View) -> bool:
+        """Corre el render; True si devolvio un generador a continuar."""
+        try:
+            result = view.render()
+        except Exception:
+            logger.exception('Fallo al refrescar la vista %s', view.name)
+            view.renders += 1
+            return False
+        if result is None or not hasattr(result, '__next__'):
+            view.renders += 1
+            return False
+        view.job = result
+        return True
+
+    def _step(self, view: _View, deadline: Optional[float]) -> None:
+        job = view.job
+        while job is not None and view.job is job:
+            try:
+                next(job)
+            except StopIteration:
+                view.job = None
+                view.renders += 1
+                return
+            except Exception:
+                logger.exception('Fallo al refrescar la vista %s', view.name)
+                view.job = None
+                view.renders += 1
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+
+    def _finish(self, view: _View) -> None:
+        if view.job is None and not self._start(view):
+            return
+        self._step(view, None)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Medicion continua de la latencia del loop de Tk y captura de congelamientos.
+
+Un latido con ``after(intervalo)`` anota cuanto se atraso respecto de lo
+programado: ese atraso es lo que espera un clic o una tecla para ser atendido.
+Un hilo vigia revisa cada ``sample_ms`` cuando fue el ultimo latido; si el
+hilo principal lleva mas de ``stall_ms`` sin volver al loop, toma su pila con
+``sys._current_frames()`` y la acumula por sitio (la linea mas interna del
+codigo de la aplicacion). Es un muestreo: cada muestra suma ``sample_ms`` al
+sitio (la primera, todo lo congelado hasta ese momento), asi que los sitios
+que mas congelan quedan arriba sin instrumentar ninguna funcion.
+
+Al cerrar la sesion se registra el resumen: p50/p95/p99 de latencia y los
+sitios con mas tiempo congelado.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class StallSite:
+    """Tiempo congelado acumulado en una linea de la aplicacion."""
+
+    site: str
+    ms: float = 0.0
+    samples: int = 0
+    stalls: int = 0
+    stack: List[str] = field(default_factory=list)
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _app_frame(stack: traceback.StackSummary) -> Optional[traceback.FrameSummary]:
+    """Marco mas interno que pertenece a la aplicacion (no a tkinter/pandas/stdlib)."""
+    for fs in reversed(stack):
+        path = os.path.abspath(fs.filename)
+        if os.path.dirname(path) == _APP_DIR and path != os.path.abspath(__file__):
+            return fs
+    return stack[-1] if stack else None
+
+
+class LatencyMonitor:
+    """Latido en el loop de Tk + hilo vigia que muestrea la pila en los congelamientos."""
+
+    def __init__(
+        self,
+        master,
+        interval_ms: int = 100,
+        stall_ms: int = 250,
+        sample_ms: int = 50,
+        max_samples: int = 100_000,
+    ) -> None:
+        self.master = master
+        self.interval_ms = int(interval_ms)
+        self.stall_ms = int(stall_ms)
+        self.sample_ms = int(sample_ms)
+        self.lags: deque = deque(maxlen=int(max_samples))
+        self.sites: Dict[str, StallSite] = {}
+        self.stalls = 0
+        self.started_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._main_ident = threading.main_thread().ident
+        self._due = 0.0
+        self._last_beat = 0.0
+        self._beat_count = 0
+        self._stall_beat = -1          # latido en el que empezo el congelamiento en curso
+        self._stall_sites: Dict[str, int] = {}
+        self._after_id = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- Ciclo de vida ----------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.started_at = datetime.now()
+        self._main_ident = threading.get_ident()
+        now = time.perf_counter()
+        self._last_beat = now
+        self._due = now + self.interval_ms / 1000.0
+        self._after_id = self.master.after(self.interval_ms, self._beat)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='ui-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._after_id is not None:
+            try:
+                self.master.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    # ---------------- Hilo principal ----------------
+    def _beat(self) -> None:
+        now = time.perf_counter()
+        lag_ms = max(0.0, (now - self._due) * 1000.0)
+        with self._lock:
+            self.lags.append(lag_ms)
+            self._last_beat = now
+            self._beat_count += 1
+            finished = self._stall_sites if self._stall_beat >= 0 else None
+            self._stall_beat = -1
+            self._stall_sites = {}
+        if finished:
+            top = max(finished, key=finished.get)
+            logger.warning('Interfaz congelada %.0f ms; sitio principal: %s', lag_ms, top)
+        self._due = now + self.interval_ms / 1000.0
+        if self._stop.is_set():
+            return
+        try:
+            self._after_id = self.master.after(self.interval_ms, self._beat)
+        except Exception:
+            self._after_id = None   # ventana destruida
+
+    # ---------------- Hilo vigia ----------------
+    def _watch(self) -> None:
+        period = self.sample_ms / 1000.0
+        threshold = (self.interval_ms + self.stall_ms) / 1000.0
+        while not self._stop.wait(period):
+            with self._lock:
+                since = time.perf_counter() - self._last_beat
+                beat = self._beat_count
+            if since < threshold:
+                continue
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            self._record(stack, beat, since * 1000.0 - self.interval_ms)
+
+    def _record(self, stack: traceback.StackSummary, beat: int, frozen_ms: float) -> None:
+        fs = _app_frame(stack)
+        if fs is None:
+            return
+        site = f'{os.path.basename(fs.filename)}:{fs.lineno} en {fs.name}'
+        with self._lock:
+            if beat != self._beat_count:
+                return   # el latido llego mientras se tomaba la pila
+            new_stall = self._stall_beat != beat
+            if new_stall:
+                self._stall_beat = beat
+                self.stalls += 1
+            entry = self.sites.get(site)
+            if entry is None:
+                entry = self.sites[site] = StallSite(site, stack=traceback.format_list(stack[-8:]))
+            # La primera muestra cubre todo lo congelado hasta ahora
+            entry.ms += frozen_ms if new_stall else self.sample_ms
+            entry.samples += 1
+            if site not in self._stall_sites:
+                entry.stalls += 1
+            self._stall_sites[site] = self._stall_sites.get(site, 0) + 1
+
+    # ---------------- Resumen ----------------
+    def summary(self, top: int = 5) -> dict:
+        with self._lock:
+            ordered = sorted(self.lags)
+            sites = sorted(self.sites.values(), key=lambda s: s.ms, reverse=True)[:top]
+            stalls = self.stalls
+        return {
+            'samples': len(ordered),
+            'p50': _percentile(ordered, 50),
+            'p95': _percentile(ordered, 95),
+            'p99': _percentile(ordered, 99),
+            'max': ordered[-1] if ordered else 0.0,
+            'stalls': stalls,
+            'sites': sites,
+        }
+
+    def report(self, top: int = 5, stacks: bool = False) -> str:
+        info = self.summary(top)
+        since = self.started_at.isoformat(timespec='seconds') if self.started_at else '-'
+        lines = [
+            f"Sesion desde {since}: {info['samples']} latidos cada {self.interval_ms} ms",
+            f"Latencia de la interfaz: p50={info['p50']:.1f} ms  p95={info['p95']:.1f} ms  "
+            f"p99={info['p99']:.1f} ms  max={info['max']:.0f} ms",
+            f"Congelamientos (> {self.stall_ms} ms): {info['stalls']}",
+        ]
+        if info['sites']:
+            lines.append('Sitios con mas tiempo congelado:')
+        for n, st in enumerate(info['sites'], start=1):
+            lines.append(f'  {n}. {st.site}  ~{st.ms:.0f} ms en {st.stalls} congelamiento(s)')
+            if stacks:
+                lines.extend('       ' + ln for chunk in st.stack for ln in chunk.rstrip().splitlines())
+        return '\n'.join(lines)
+
+    def write_report(self, path: str) -> None:
+        """Agrega el resumen de la sesion (con pilas) al archivo ``path``."""
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(self.report(top=10, stacks=True) + '\n\n')
+        except Exception:
+            logger.warning('No se pudo escribir el resumen de latencia en %s', path, exc_info=True)
@@ -13,6 +13,7 @@ evitar texto corrupto en Windows. Incluye:
 
 from __future__ import annotations
 
+import copy
 import logging
 import queue
 import threading
@@ -21,22 +22,35 @@ import subprocess
 import sys
 import tempfile
 import time
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Optional, Callable
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 
-import numpy as np
-import pandas as pd
-
-from config import AREA_FILTER, HISTORY_DIR, INVENTORY_FILE, WINDOWS_OS
-from vale_manager import ValeManager
-from filters import FilterOptions
+from config import AREA_FILTER, HISTORY_DIR, INVENTORY_FILE, UI_LATENCY_INTERVAL_MS, UI_STALL_MS, WINDOWS_OS
+from vale_manager import ValeManager, sort_by_route
+from filters import FilterCache, FilterCancelled, FilterOptions, FilterPreset, QueryError, exclusion_signature, parse_query
+from filter_worker import FilterWorker
+from shm_filter import SharedFilterService
+from virtual_table import VirtualTable
+from tree_sync import TreeSync
+from location_checklist import LocationChecklist
+from table_sort import DATE, INT, SortSpec, sort_order
+from inventory_index import RowSearch, prepare_search_columns
+from gs1 import ScanCode, parse_scan
 from printing_utils import print_pdf_windows
+from vale_pipeline import STAGE_LABELS, ValeJob, ValePipeline
+from ui_watchdog import LatencyMonitor
+from ui_scheduler import RefreshScheduler
 import settings_store as settings
-from vale_registry import ValeRegistry
+from vale_registry import DEFAULT_SORT, ValeRegistry
 from user_manager import UserManager
+from startup import STARTUP, lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
 
 MSG_SELECT_HISTORY = "Seleccione una solicitud del listado."
 MSG_SELECT_PRODUCT = "Seleccione un producto de la tabla."
@@ -87,22 +101,54 @@ class ValeConsumoApp:
         self._load_progress_bar = None
         self._load_progress_label = None
         self._loading_inventory = False
-        self._filter_after_id = None
         self._filter_queue = queue.Queue()
+        self._preset_queue = queue.Queue()
+        self._preset_poll_after_id = None
+        self._vale_events = queue.Queue()
+        self._vale_pipeline = ValePipeline(self._vale_events)
+        self._vale_poll_after_id = None
+        self.latency: Optional[LatencyMonitor] = None
+        self.vale_pipeline_var: Optional[tk.StringVar] = None
+        self._tree_syncs: dict[str, TreeSync] = {}
+        self._sort_specs: dict[str, SortSpec] = {}
+        self._sort_heading_texts: dict[str, dict] = {}
+        self._history_entries: list[dict] = []
+        self._mgr_entries: list[dict] = []
+        self._registry_index: dict[str, dict] = {}
+        # Claves de busqueda del selector de productos: (revision de inventario, RowSearch)
+        self._picker_search: Optional[tuple] = None
+        # iid de la vista de solicitud -> indice en manager.current_vale
+        self._vale_iids: dict[str, int] = {}
+        self.history_table: Optional[VirtualTable] = None
+        self.mgr_table: Optional[VirtualTable] = None
+        self._preset_thread: Optional[threading.Thread] = None
         self._filter_poll_after_id = None
+        self._filter_worker = FilterWorker()
+        self._shm_filter: Optional[SharedFilterService] = None
+        self._shm_request = None
+        self._scan_queue: deque = deque()
+        self._scan_after_id = None
+        self._scan_dialog = None
+        self._scan_qty_var = None
+        self._scan_log_list = None
+        self._expiry_summary_tree = None
         self._filter_worker_token = 0
         self._filter_worker_running = False
         self._filter_async_threshold = 4000
-        self._render_after_id = None
-        self._render_token = 0
-        self._render_batch_size = 400
-        self._hist_after_id = None
-        self._mgr_after_id = None
-        self._ubic_after_id = None
+        self._product_tags: Optional[np.ndarray] = None
+        # Filtro, historial y gestor se redibujan por marcas (ver _register_views)
+        self.ui_refresh = RefreshScheduler(self.master)
+        self._register_views()
         self._inventory_rev = 0
+        # Cargas de inventario (no cambia con el stock) y cambios de stock desde la carga
+        self._inventory_load = 0
+        self._stock_change_log: list = []
         self._last_filter_signature = None
-        self._max_sort_rows = 5000
+        self._last_valid_query = FilterOptions()
+        self._subfamilies: list[str] = []
+        self._filter_cache = FilterCache()
         self.manager = ValeManager()
+        self.manager.sort_by_route_enabled = settings.get_route_order_enabled()
         # Carpeta de historial desde ajustes (fallback a config)
         try:
             self.history_dir = settings.get_history_dir() or HISTORY_DIR
@@ -110,16 +156,12 @@ class ValeConsumoApp:
             self.history_dir = HISTORY_DIR
         self.registry = ValeRegistry(self.history_dir)
         self.user_manager = UserManager(self.history_dir)
-        self.filtered_df: pd.DataFrame = pd.DataFrame()
+        self.filtered_positions = np.empty(0, dtype=np.int64)
         self.current_file: Optional[str] = None
         self.show_ubicacion = tk.BooleanVar(value=True)  # Control para mostrar/ocultar ubicaciones
-        self.ubicacion_exclude_vars = {}
         self.ubicacion_exclude_search_var = None
         self.ubicacion_checklist_frame = None
-        self.ubicacion_checklist_canvas = None
-        self.ubicacion_checklist_scroll = None
-        self.ubicacion_checklist_inner = None
-        self.ubicacion_checklist_window = None
+        self.ubicacion_checklist: Optional[LocationChecklist] = None
         self.ubicacion_checklist_visible = tk.BooleanVar(value=False)
         self.ubicacion_toggle_btn = None
         self.ubicacion_search_entry = None
@@ -154,10 +196,6 @@ class ValeConsumoApp:
         except Exception:
             pass
         
-        # Configurar umbrales de vencimiento (dias)
-        self.days_vencimiento_rojo_min = 60
-        self.days_vencimiento_rojo_max = 90
-
         self._build_menu()
 
         container = ttk.Frame(self.master)
@@ -215,9 +253,25 @@ class ValeConsumoApp:
         except Exception:
             pass
 
+        self._configure_shm_filter()
+        self.master.after(60000, self._check_day_rollover)
+        if UI_STALL_MS > 0:
+            self.latency = LatencyMonitor(self.master, interval_ms=UI_LATENCY_INTERVAL_MS, stall_ms=UI_STALL_MS)
+            self.latency.start()
         self._restore_last_inventory()
         self.master.after(200, self._activate_search_entry)
 
+    def _register_views(self) -> None:
+        """Vistas que se refrescan via ``self.ui_refresh`` (menor prioridad = antes)."""
+        self.ui_refresh.register('filter', self._filter_view, priority=0)
+        self.ui_refresh.register('history', self._history_view, priority=1)
+        self.ui_refresh.register('manager', self._manager_view, priority=2)
+
+    def _invalidate_registry_views(self) -> None:
+        """Historial y gestor muestran el registro: un cambio los marca a ambos."""
+        self.ui_refresh.invalidate('history')
+        self.ui_refresh.invalidate('manager')
+
     def _build_menu(self) -> None:
         menubar = tk.Menu(self.master)
         self.master.config(menu=menubar)
@@ -241,12 +295,16 @@ class ValeConsumoApp:
         # Menu Herramientas
         m_tools = tk.Menu(menubar, tearoff=0)
         m_tools.add_command(label="Limpiar base de datos...", command=self._clean_database)
+        m_tools.add_command(label="Explicar filtro actual...", command=self._explain_current_filter)
+        m_tools.add_command(label="Asignar por vencimiento (FEFO)...", command=self._allocate_fefo_dialog)
+        m_tools.add_command(label="Resumen de vencimientos...", command=self._open_expiry_summary)
         menubar.add_cascade(label="Herramientas", menu=m_tools)
 
         # Menu Ayuda
         m_help = tk.Menu(menubar, tearoff=0)
         m_help.add_command(label="Instrucciones de uso...", command=self._open_instructions)
         m_help.add_command(label="Atajos de teclado...", command=self._open_shortcuts)
+        m_help.add_command(label="Latencia de la interfaz...", command=self._show_ui_latency)
         menubar.add_cascade(label="Ayuda", menu=m_help)
 
     def _apply_auto_scaling(self) -> None:
@@ -289,10 +347,152 @@ class ValeConsumoApp:
         self._open_settings_dialog()
 
     def _menu_label_tools(self) -> None:
-        messagebox.showinfo(
-            "Lector de Label",
-            "Proximamente: utilidades para probar y configurar el lector de etiquetas."
-        )
+        """Modo lector: cada lectura (Enter) salta a la fila y la agrega al vale."""
+        if self._scan_dialog is not None and self._scan_dialog.winfo_exists():
+            self._scan_dialog.lift()
+            return
+        dlg = tk.Toplevel(self.master)
+        dlg.title('Lector de Label')
+        dlg.transient(self.master)
+        self._scan_dialog = dlg
+        frm = ttk.Frame(dlg, padding=12)
+        frm.pack(fill='both', expand=True)
+
+        self._scan_qty_var = tk.IntVar(value=settings.get_scanner_qty())
+        ttk.Label(frm, text='Cantidad por lectura:').grid(row=0, column=0, sticky='w')
+        ttk.Spinbox(frm, from_=1, to=9999, textvariable=self._scan_qty_var, width=8).grid(row=0, column=1, sticky='w', padx=(8, 0))
+
+        ttk.Label(frm, text='Lectura (GS1 o codigo/lote):').grid(row=1, column=0, sticky='w', pady=(8, 0))
+        entry = ttk.Entry(frm, width=50)
+        entry.grid(row=1, column=1, sticky='ew', padx=(8, 0), pady=(8, 0))
+
+        self._scan_log_list = tk.Listbox(frm, height=10, width=70)
+        self._scan_log_list.grid(row=2, column=0, columnspan=2, sticky='nsew', pady=(8, 0))
+        ttk.Label(
+            frm,
+            text='Con el cursor en "Lectura", cada escaneo agrega la cantidad indicada al vale.',
+            foreground='#666666',
+        ).grid(row=3, column=0, columnspan=2, sticky='w', pady=(6, 0))
+        frm.columnconfigure(1, weight=1)
+        frm.rowconfigure(2, weight=1)
+
+        def _on_scan(_event=None):
+            text = entry.get()
+            entry.delete(0, 'end')
+            self._enqueue_scan(text)
+            return 'break'
+
+        def _on_close():
+            try:
+                settings.set_scanner_qty(int(self._scan_qty_var.get()))
+            except Exception:
+                pass
+            self._scan_dialog = None
+            self._scan_log_list = None
+            dlg.destroy()
+
+        entry.bind('<Return>', _on_scan)
+        entry.bind('<KP_Enter>', _on_scan)
+        dlg.protocol('WM_DELETE_WINDOW', _on_close)
+        entry.focus_set()
+
+    def _enqueue_scan(self, text: str) -> None:
+        """Encola una lectura; las rafagas se procesan juntas en un solo refresco."""
+        if not (text or '').strip():
+            return
+        self._scan_queue.append(text)
+        if self._scan_after_id is None:
+            self._scan_after_id = self.master.after(15, self._process_scans)
+
+    def _scan_log(self, text: str) -> None:
+        lst = self._scan_log_list
+        if lst is None:
+            self.log.info("Lector: %s", text)
+            return
+        try:
+            lst.insert(0, text)
+            if lst.size() > 200:
+                lst.delete(200, 'end')
+        except Exception:
+            pass
+
+    def _process_scans(self) -> None:
+        self._scan_after_id = None
+        try:
+            qty = max(1, int(self._scan_qty_var.get())) if self._scan_qty_var is not None else settings.get_scanner_qty()
+        except Exception:
+            qty = 1
+        last_label = None
+        added = 0
+        while self._scan_queue:
+            scan = parse_scan(self._scan_queue.popleft())
+            label, reason = self._resolve_scan(scan, qty)
+            if label is None:
+                self._scan_log(f'X {scan.raw}: {reason}')
+                self.master.bell()
+                continue
+            try:
+                self.manager.add_to_vale(label, qty)
+                added += 1
+                last_label = label
+                self._scan_log(f'OK {scan.raw} -> +{qty} (fila {label})')
+            except Exception as e:
+                self._scan_log(f'X {scan.raw}: {e}')
+                self.master.bell()
+        if added:
+            changes = self._on_stock_changed()
+            self.update_vale_treeview()
+            self._patch_product_rows(changes)
+            self.log.info("Lector: %d lecturas agregadas al vale", added)
+        if last_label is not None and not self.product_table.select(str(last_label)):
+            # No se limpian los filtros en medio de una rafaga: solo se avisa
+            self._scan_log(f'  (fila {last_label} agregada, pero oculta por los filtros/exclusiones)')
+
+    def _resolve_scan(self, scan: ScanCode, qty: int) -> tuple:
+        """Fila (etiqueta del inventario) para una lectura, via los hash del indice.
+
+        Prioriza codigo+lote, luego codigo y luego lote; entre candidatos usa la
+        fecha leida (AI 17) si coincide y, si no, el vencimiento mas proximo
+        con stock suficiente.
+        """
+        df = self.manager.bioplates_inventory
+        index = self.manager.index
+        if df is None or df.empty or not index.matches(df):
+            return None, 'sin inventario cargado'
+        if not scan.raw:
+            return None, 'lectura vacia'
+        cands = np.empty(0, dtype=np.int64)
+        if scan.code and scan.lot:
+            cands = index.scan_lookup(scan.code, scan.lot)
+        if not len(cands) and scan.code:
+            cands = index.scan_lookup(codigo=scan.code)
+            if len(cands) and scan.lot:
+                return None, f'lote {scan.lot} no existe para el codigo {scan.code}'
+        if not len(cands) and scan.lot:
+            cands = index.scan_lookup(lote=scan.lot)
+        if not len(cands) and not scan.is_gs1:
+            cands = index.scan_lookup(lote=scan.raw)
+        if not len(cands):
+            return None, 'codigo/lote no encontrado'
+        stock = df['Stock'].to_numpy()[cands]
+        if '_venc_dt' in df.columns:
+            venc_dt = df['_venc_dt']
+        elif 'Vencimiento' in df.columns:
+            venc_dt = pd.to_datetime(df['Vencimiento'], errors='coerce')
+        else:
+            venc_dt = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+        venc = venc_dt.to_numpy(dtype='datetime64[ns]')[cands]
+        if scan.expiry:
+            same = venc == np.datetime64(scan.expiry, 'ns')
+            if same.any():
+                cands, stock, venc = cands[same], stock[same], venc[same]
+        ok = stock >= qty
+        if not ok.any():
+            return None, f'stock insuficiente (max {int(stock.max())})'
+        cands, venc = cands[ok], venc[ok]
+        # NaT al final: se ordena por vencimiento con los vacios como "infinito"
+        keys = np.where(np.isnat(venc), np.iinfo(np.int64).max, venc.view('i8'))
+        return df.index[int(cands[int(np.argmin(keys))])], ''
 
     def _clean_database(self) -> None:
         """Limpia la base de datos de solicitudes y elimina todos los archivos del historial."""
@@ -343,9 +543,7 @@ class ValeConsumoApp:
             self.registry._save()
             
             # Refrescar vistas
-            self.refresh_history()
-            if hasattr(self, 'refresh_manager'):
-                self.refresh_manager()
+            self._invalidate_registry_views()
             
             msg = f"Base de datos limpiada exitosamente.\n\n"
             msg += f"• Archivos eliminados: {deleted_files}\n"
@@ -386,6 +584,8 @@ class ValeConsumoApp:
         rem_en_var = tk.BooleanVar(value=settings.get_reminder_enabled())
         rem_text_var = tk.StringVar(value=settings.get_reminder_text())
         hist_var = tk.StringVar(value=(settings.get_history_dir()))
+        shm_var = tk.BooleanVar(value=settings.get_shm_filter_enabled())
+        route_var = tk.BooleanVar(value=settings.get_route_order_enabled())
 
         r = 0
         ttk.Checkbutton(frm, text='Impresion automatica al generar', variable=ap_var).grid(row=r, column=0, columnspan=3, sticky='w')
@@ -433,6 +633,11 @@ class ValeConsumoApp:
         ttk.Button(frm, text='Seleccionar...', command=lambda: hist_var.set(filedialog.askdirectory(title='Seleccionar carpeta de historial') or hist_var.get())).grid(row=r, column=2, sticky='w', pady=(8,0))
         r += 1
 
+        ttk.Checkbutton(frm, text='Filtrar en proceso separado (inventarios grandes)', variable=shm_var).grid(row=r, column=0, columnspan=3, sticky='w', pady=(8,0))
+        r += 1
+        ttk.Checkbutton(frm, text='Ordenar solicitud por recorrido de bodega (zona, pasillo, rack, nivel)', variable=route_var).grid(row=r, column=0, columnspan=3, sticky='w', pady=(8,0))
+        r += 1
+
         for c in range(0,3):
             frm.columnconfigure(c, weight=(1 if c==1 else 0))
 
@@ -450,6 +655,13 @@ class ValeConsumoApp:
                 new_hist = hist_var.get().strip()
                 if new_hist:
                     settings.set_history_dir(new_hist)
+                settings.set_shm_filter_enabled(bool(shm_var.get()))
+                self._configure_shm_filter()
+                settings.set_route_order_enabled(bool(route_var.get()))
+                self.manager.sort_by_route_enabled = bool(route_var.get())
+                if self.manager.sort_by_route_enabled:
+                    self.manager.sort_vale_by_route()
+                    self.update_vale_treeview()
                 # Aplicar en runtime
                 try:
                     import config as _cfg
@@ -477,11 +689,7 @@ class ValeConsumoApp:
                         self.history_dir = new_dir
                         os.makedirs(self.history_dir, exist_ok=True)
                         self.registry = ValeRegistry(self.history_dir)
-                    self.refresh_history()
-                    try:
-                        self.refresh_manager()
-                    except Exception:
-                        pass
+                    self._invalidate_registry_views()
                 except Exception:
                     pass
             finally:
@@ -665,7 +873,7 @@ class ValeConsumoApp:
                 "5) Pulse 'Generar e Imprimir Solicitud' para crear el PDF e imprimir.\n\n"
                 "Historial y Manager:\n"
                 "- En Historial: abrir (doble clic), reimprimir y unificar varias solicitudes.\n"
-                "- Ordene columnas haciendo clic en los encabezados.\n"
+                "- Ordene columnas haciendo clic en los encabezados (Shift+clic agrega un criterio).\n"
                 "- En Manager: cambiar estados (Pendiente/Descontado/Anulado) y exportar listados.\n\n"
                 "Ajustes:\n"
                 "- Gestione solicitantes y usuarios de bodega desde el menu Configuracion.\n"
@@ -697,11 +905,7 @@ class ValeConsumoApp:
             self._refresh_ubicaciones_checklist()
         except Exception:
             pass
-        try:
-            self.refresh_history()
-            self.refresh_manager()
-        except Exception:
-            pass
+        self._invalidate_registry_views()
         self.filter_products(immediate=True)
         self.update_vale_treeview()
 
@@ -712,7 +916,13 @@ class ValeConsumoApp:
             "Ctrl+H : Ir a pestaña Historial\n"
             "Ctrl+M : Ir a pestaña Manager Solicitudes\n"
             "Ctrl+G : Generar e Imprimir Solicitud\n"
-            "Supr   : Eliminar item seleccionado de la solicitud\n"
+            "Supr   : Eliminar item seleccionado de la solicitud\n\n"
+            "Consultas en el buscador:\n\n"
+            "lote:AB12  ubic:B-03  sub:Placas\n"
+            "en:B-03 (todo el pasillo)  en:B-03-2 (rack)\n"
+            "venc<2026-06  venc>=2026-01-15  venc:2026-03\n"
+            "stock>0  stock>=5\n"
+            "-muestra (excluye)  -lote:AB1  -ubic:CUARENTENA\n"
         )
         messagebox.showinfo('Atajos de teclado', info)
 
@@ -748,23 +958,21 @@ class ValeConsumoApp:
             ('Stock', 'Stock', 80, 'center'),
         )
         for col, text, width, anchor in headers:
-            self.product_tree.heading(
-                col,
-                text=text,
-                command=lambda c=col: self._sort_treeview(self.product_tree, c),
-            )
+            self.product_tree.heading(col, text=text)
             self.product_tree.column(col, width=width, minwidth=max(60, width - 40), anchor=anchor, stretch=True)
 
+        self._bind_table_sort(self.product_tree, self._sort_product_table)
         self.product_tree.grid(row=0, column=0, sticky='nsew')
         table_frame.rowconfigure(0, weight=1)
         table_frame.columnconfigure(0, weight=1)
 
-        vsb = ttk.Scrollbar(table_frame, orient='vertical', command=self.product_tree.yview)
+        vsb = ttk.Scrollbar(table_frame, orient='vertical')
         vsb.grid(row=0, column=1, sticky='ns')
         hsb = ttk.Scrollbar(table_frame, orient='horizontal', command=self.product_tree.xview)
         hsb.grid(row=1, column=0, sticky='ew')
-        self.product_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.product_tree.configure(xscrollcommand=hsb.set)
         self.product_tree.bind('<Configure>', self._autosize_product_columns)
+        self.product_table = VirtualTable(self.product_tree, vsb, self._product_rows, self._product_position)
         
         # Configurar tags de color para vencimiento
         self.product_tree.tag_configure('vencido', background='#ffb3b3', foreground='#b00000')  # Rojo: vencido
@@ -830,8 +1038,16 @@ class ValeConsumoApp:
         # Buscar
         ttk.Label(self.control_frame, text="Buscar producto o codigo:", font=('Segoe UI', 10)).grid(row=0, column=0, sticky='w', pady=(0, 4))
         self.search_var = tk.StringVar()
-        self.search_entry = ttk.Entry(self.control_frame, textvariable=self.search_var, width=26, font=('Segoe UI', 10))  # Agregada fuente
-        self.search_entry.grid(row=1, column=0, sticky='ew', pady=(0, 8))
+        search_box = ttk.Frame(self.control_frame)
+        search_box.grid(row=1, column=0, sticky='ew', pady=(0, 8))
+        self.search_entry = ttk.Entry(search_box, textvariable=self.search_var, width=26, font=('Segoe UI', 10))  # Agregada fuente
+        self.search_entry.pack(fill='x')
+        # Error de la consulta (fecha, cantidad u operador invalido); oculto si no hay
+        self.query_error_var = tk.StringVar(value='')
+        self.query_error_label = ttk.Label(
+            search_box, textvariable=self.query_error_var, foreground='#b00000',
+            font=('Segoe UI', 9), wraplength=220, justify='left',
+        )
         self.search_entry.bind('<Enter>', lambda _e: self._activate_search_entry())
         self.search_entry.bind('<Button-1>', lambda _e: self._activate_search_entry())
         self.search_var.trace_add('write', lambda *_: self.filter_products())
@@ -882,11 +1098,12 @@ class ValeConsumoApp:
         self.ubicacion_toggle_btn.grid(row=0, column=1, sticky='e')
 
         self.ubicacion_exclude_search_var = tk.StringVar()
-        self.ubicacion_exclude_search_var.trace_add('write', lambda *_: self._schedule_render_ubicaciones_checklist())
+        self.ubicacion_exclude_search_var.trace_add('write', lambda *_: self._search_ubicaciones())
         self.ubicacion_search_entry = ttk.Entry(self.control_frame, textvariable=self.ubicacion_exclude_search_var, width=26, font=('Segoe UI', 10))
         self.ubicacion_search_entry.grid(row=19, column=0, sticky='ew', pady=(0, 6))
         self.ubicacion_checklist_frame = ttk.Frame(self.control_frame)
         self.ubicacion_checklist_frame.grid(row=20, column=0, sticky='ew', pady=(0, 12))
+        self.ubicacion_checklist = LocationChecklist(self.ubicacion_checklist_frame, self.filter_products)
         if not self.ubicacion_checklist_visible.get():
             self.ubicacion_search_entry.grid_remove()
             self.ubicacion_checklist_frame.grid_remove()
@@ -932,7 +1149,21 @@ class ValeConsumoApp:
         # Limpiar filtros
         ttk.Button(self.control_frame, text="Limpiar filtros", command=self._clear_filters, width=26).grid(row=31, column=0, sticky='ew', pady=(4, 4))
 
-        for i in range(0, 32):
+        # Filtros guardados
+        ttk.Label(self.control_frame, text="Filtros guardados:", style='SmallBold.TLabel').grid(row=32, column=0, sticky='w', pady=(8, 0))
+        self.preset_var = tk.StringVar()
+        self.preset_combo = ttk.Combobox(self.control_frame, textvariable=self.preset_var, state='readonly', width=24, font=('Segoe UI', 10))
+        self.preset_combo.grid(row=33, column=0, sticky='ew', pady=(0, 4))
+        self.preset_combo.bind('<<ComboboxSelected>>', lambda *_: self._apply_filter_preset())
+        preset_btns = ttk.Frame(self.control_frame)
+        preset_btns.grid(row=34, column=0, sticky='ew', pady=(0, 8))
+        preset_btns.columnconfigure(0, weight=1)
+        preset_btns.columnconfigure(1, weight=1)
+        ttk.Button(preset_btns, text="Guardar actual...", command=self._save_filter_preset).grid(row=0, column=0, sticky='ew', padx=(0, 2))
+        ttk.Button(preset_btns, text="Eliminar", command=self._delete_filter_preset).grid(row=0, column=1, sticky='ew', padx=(2, 0))
+        self._refresh_presets_combo()
+
+        for i in range(0, 35):
             self.control_frame.rowconfigure(i, weight=0)
         self.control_frame.columnconfigure(0, weight=1)
 
@@ -1016,75 +1247,20 @@ class ValeConsumoApp:
                     )
         except Exception:
             ubicaciones = []
-        existing = self.ubicacion_exclude_vars or {}
-        new_vars = {}
-        for ubi in ubicaciones:
-            var = existing.get(ubi)
-            if var is None:
-                var = tk.BooleanVar(value=False)
-            new_vars[ubi] = var
-        self.ubicacion_exclude_vars = new_vars
-        self._render_ubicaciones_checklist()
-
-    def _schedule_render_ubicaciones_checklist(self) -> None:
-        if self._ubic_after_id:
-            try:
-                self.master.after_cancel(self._ubic_after_id)
-            except Exception:
-                pass
-        self._ubic_after_id = self.master.after(250, self._render_ubicaciones_checklist)
-
-    def _render_ubicaciones_checklist(self) -> None:
-        self._ubic_after_id = None
-        frame = getattr(self, 'ubicacion_checklist_frame', None)
-        if not frame:
-            return
-        if not self.ubicacion_checklist_canvas:
-            frame.columnconfigure(0, weight=1)
-            self.ubicacion_checklist_canvas = tk.Canvas(frame, height=96, highlightthickness=0)
-            self.ubicacion_checklist_scroll = ttk.Scrollbar(
-                frame, orient='vertical', command=self.ubicacion_checklist_canvas.yview
-            )
-            self.ubicacion_checklist_canvas.configure(yscrollcommand=self.ubicacion_checklist_scroll.set)
-            self.ubicacion_checklist_inner = ttk.Frame(self.ubicacion_checklist_canvas)
-            self.ubicacion_checklist_window = self.ubicacion_checklist_canvas.create_window(
-                (0, 0), window=self.ubicacion_checklist_inner, anchor='nw'
-            )
-
-            def _on_inner_configure(_event):
-                self.ubicacion_checklist_canvas.configure(
-                    scrollregion=self.ubicacion_checklist_canvas.bbox("all")
-                )
-
-            def _on_canvas_configure(event):
-                self.ubicacion_checklist_canvas.itemconfigure(
-                    self.ubicacion_checklist_window, width=event.width
-                )
-
-            self.ubicacion_checklist_inner.bind("<Configure>", _on_inner_configure)
-            self.ubicacion_checklist_canvas.bind("<Configure>", _on_canvas_configure)
-
-            self.ubicacion_checklist_canvas.grid(row=0, column=0, sticky='ew')
-            self.ubicacion_checklist_scroll.grid(row=0, column=1, sticky='ns')
+        if self.ubicacion_checklist is None:
+            return
+        try:
+            self.ubicacion_checklist.set_locations(ubicaciones, getattr(self.manager.index, 'loc_tree', None))
+        except Exception as exc:
+            self.log.warning("No se pudo armar el checklist de ubicaciones: %s", exc)
 
-        for child in self.ubicacion_checklist_inner.winfo_children():
-            child.destroy()
-        ubicaciones = sorted(self.ubicacion_exclude_vars.keys())
-        term = ''
+    def _search_ubicaciones(self) -> None:
+        if self.ubicacion_checklist is None:
+            return
         try:
-            term = (self.ubicacion_exclude_search_var.get() if self.ubicacion_exclude_search_var else '').strip().lower()
+            self.ubicacion_checklist.search(self.ubicacion_exclude_search_var.get())
         except Exception:
-            term = ''
-        shown = 0
-        for ubi in ubicaciones:
-            if term and term not in ubi.lower():
-                continue
-            var = self.ubicacion_exclude_vars.get(ubi)
-            cb = ttk.Checkbutton(self.ubicacion_checklist_inner, text=ubi, variable=var, command=self.filter_products)
-            cb.pack(anchor='w')
-            shown += 1
-        if shown == 0:
-            ttk.Label(self.ubicacion_checklist_inner, text="(sin ubicaciones)").pack(anchor='w')
+            pass
 
     def _toggle_ubicaciones_checklist(self) -> None:
         try:
@@ -1109,20 +1285,20 @@ class ValeConsumoApp:
 
     def _get_excluded_ubicaciones(self):
         try:
-            return [ubi for ubi, var in self.ubicacion_exclude_vars.items() if var.get()]
+            return self.ubicacion_checklist.excluded() if self.ubicacion_checklist else []
         except Exception:
             return []
 
     def _clear_ubicaciones_excluidas(self) -> None:
         try:
-            for var in self.ubicacion_exclude_vars.values():
-                var.set(False)
+            if self.ubicacion_checklist is not None:
+                self.ubicacion_checklist.clear()
         except Exception:
             pass
-        self._render_ubicaciones_checklist()
 
     def _clear_filters(self) -> None:
         self.search_var.set("")
+        self.preset_var.set("")
         self.subfam_var.set('(Todas)')
         self.lote_var.set("")
         self.ubi_var.set("")
@@ -1171,14 +1347,11 @@ class ValeConsumoApp:
             ('Vencimiento', 'Vencimiento', 130),
             ('Cantidad', 'Cantidad', 100),
         ):
-            self.vale_tree.heading(
-                col,
-                text=text,
-                command=lambda c=col: self._sort_treeview(self.vale_tree, c),
-            )
+            self.vale_tree.heading(col, text=text)
             anchor = 'center' if col != 'Producto' else 'w'
             self.vale_tree.column(col, width=w, anchor=anchor, stretch=True)
 
+        self._bind_table_sort(self.vale_tree, self.update_vale_treeview)
         self.vale_tree.grid(row=0, column=0, sticky='nsew')
         v_vsb = ttk.Scrollbar(vale_table_frame, orient='vertical', command=self.vale_tree.yview)
         v_vsb.grid(row=0, column=1, sticky='ns')
@@ -1191,6 +1364,9 @@ class ValeConsumoApp:
         ttk.Button(self.vale_actions_frame, text="Previsualizacion", command=self.preview_vale, width=26, style='Action.TButton').pack(pady=8, fill='x')
         ttk.Button(self.vale_actions_frame, text="Generar e Imprimir Solicitud", command=self.generate_and_print_vale, width=26, style='Action.TButton').pack(pady=8, fill='x')
         ttk.Button(self.vale_actions_frame, text="Limpiar Solicitud", command=self.clear_vale, width=26, style='Action.TButton').pack(pady=8, fill='x')
+        # Avance de las solicitudes que se generan en segundo plano
+        self.vale_pipeline_var = tk.StringVar(value='')
+        ttk.Label(self.vale_actions_frame, textvariable=self.vale_pipeline_var, wraplength=200, justify='left').pack(pady=(8, 0), fill='x')
 
         self._init_history_tab()
 
@@ -1226,21 +1402,17 @@ class ValeConsumoApp:
         self.hist_search_var = tk.StringVar(value='')
         hist_entry = ttk.Entry(top, textvariable=self.hist_search_var, width=32, font=('Segoe UI', 10))
         hist_entry.pack(side='left', padx=(6, 0))
-        self.hist_search_var.trace_add('write', lambda *_: self._schedule_refresh_history())
+        self.hist_search_var.trace_add('write', lambda *_: self.ui_refresh.invalidate('history', 200))
 
         # Historial basado en el registro: Numero, Estado, Fecha, Archivo, Items
         cols = ("Numero", "Estado", "Fecha", "Archivo", "Items")
         self.history_tree = ttk.Treeview(self.history_frame, columns=cols, show='headings', selectmode='extended')
         
         # Hacer headers clicables para ordenar
-        self._tree_sort_state = {}
         
         for col in cols:
-            self.history_tree.heading(
-                col,
-                text=col,
-                command=lambda c=col: self._sort_treeview(self.history_tree, c),
-            )
+            self.history_tree.heading(col, text=col)
+        self._bind_table_sort(self.history_tree, self._render_history)
         
         self.history_tree.column('Numero', width=80, anchor='center', stretch=False)
         self.history_tree.column('Estado', width=110, anchor='center', stretch=False)
@@ -1249,9 +1421,16 @@ class ValeConsumoApp:
         self.history_tree.column('Items', width=80, anchor='center', stretch=False)
 
         self.history_tree.grid(row=1, column=0, sticky='nsew')
-        h_vsb = ttk.Scrollbar(self.history_frame, orient='vertical', command=self.history_tree.yview)
+        h_vsb = ttk.Scrollbar(self.history_frame, orient='vertical')
         h_vsb.grid(row=1, column=1, sticky='ns')
-        self.history_tree.configure(yscrollcommand=h_vsb.set)
+        self.history_tree.tag_configure('evenrow', background='#ffffff')
+        self.history_tree.tag_configure('oddrow', background='#f7f7f7')
+        # Lista virtual: solo las filas visibles existen en el Treeview
+        self.history_table = VirtualTable(
+            self.history_tree, h_vsb,
+            lambda pos, start: self._registry_rows(self._history_entries, pos, start),
+            lambda iid: self._registry_locate('_history_entries', iid),
+        )
         
         # Doble clic para abrir PDF
         self.history_tree.bind('<Double-Button-1>', lambda e: self.open_selected_history())
@@ -1288,87 +1467,149 @@ class ValeConsumoApp:
             os.makedirs(HISTORY_DIR, exist_ok=True)
             self.log.debug("Creada carpeta de historial en %s", HISTORY_DIR)
 
-    def _schedule_refresh_history(self) -> None:
-        if self._hist_after_id:
-            try:
-                self.master.after_cancel(self._hist_after_id)
-            except Exception:
-                pass
-        self._hist_after_id = self.master.after(200, self.refresh_history)
-
     def refresh_history(self) -> None:
-        self._hist_after_id = None
-        # Cargar desde el registro; si esta vacio y existen PDFs, reindexar primero
-        for i in self.history_tree.get_children():
-            self.history_tree.delete(i)
+        self.ui_refresh.render_now('history')
+
+    def _history_view(self):
+        """Render de la vista 'history': consulta y dibujo en cuadros distintos."""
+        # Busqueda y orden los resuelve el registro; la tabla dibuja solo la ventana
+        self._ensure_registry_indexed()
         try:
-            rows = self.registry.list()
-            if not rows:
-                try:
-                    if os.path.isdir(self.history_dir) and any(fn.lower().endswith('.pdf') for fn in os.listdir(self.history_dir)):
-                        self.registry.reindex()
-                        rows = self.registry.list()
-                except Exception:
-                    pass
-            # Filtrar por término de búsqueda si se ingresó
-            try:
-                term = (self.hist_search_var.get() if hasattr(self, 'hist_search_var') else '').strip().lower()
-            except Exception:
-                term = ''
-            if term:
-                def _hit(e):
-                    return (
-                        term in str(e.get('number', '')).lower() or
-                        term in str(e.get('status', '')).lower() or
-                        term in str(e.get('created_at', '')).lower() or
-                        term in str(e.get('pdf', '')).lower()
-                    )
-                rows = [e for e in rows if _hit(e)]
-            
-            # Ordenar por fecha (más reciente primero) por defecto
-            try:
-                rows = sorted(rows, key=lambda x: x.get('created_at', ''), reverse=True)
-            except Exception:
-                pass
-            
-            for e in rows:
-                iid = str(e.get('number'))
-                vals = (e.get('number'), e.get('status'), e.get('created_at'), e.get('pdf'), e.get('items_count'))
-                self.history_tree.insert('', 'end', iid=iid, values=vals)
-            self._apply_stripes(self.history_tree)
+            term = self.hist_search_var.get() if hasattr(self, 'hist_search_var') else ''
+        except Exception:
+            term = ''
+        yield
+        entries = self.registry.query(term=term, sort=self._registry_sort(self.history_tree))
+        yield
+        self._history_entries = entries
+        self._show_registry_entries('_history_entries', self.history_table)
+
+    def _render_history(self, col: Optional[str] = None, extend: bool = False) -> None:
+        """Clic en encabezado: el registro vuelve a ordenar y la lista vuelve al inicio."""
+        self._sort_spec(self.history_tree, col, extend)
+        if self.history_table is not None:
+            self.history_table.offset = 0
+        self.ui_refresh.invalidate('history')
+
+    def _ensure_registry_indexed(self) -> None:
+        """Si el registro esta vacio y existen PDFs en el historial, reindexar primero."""
+        if self.registry.has_entries():
+            return
+        try:
+            if os.path.isdir(self.history_dir) and any(fn.lower().endswith('.pdf') for fn in os.listdir(self.history_dir)):
+                self.registry.reindex()
         except Exception:
             pass
 
-    def _sort_treeview(self, tree: ttk.Treeview, col: str) -> None:
-        """Ordena dinamicamente por columna (A-Z / Z-A y mayor-menor)."""
-        try:
-            items = [(tree.set(k, col), k) for k in tree.get_children('')]
+    # Columnas de historial/gestor -> campo del registro
+    _REGISTRY_COLUMNS = {
+        'Numero': 'number',
+        'Estado': 'status',
+        'Fecha': 'created_at',
+        'Archivo': 'pdf',
+        'Items': 'items_count',
+    }
+
+    def _registry_sort(self, tree: ttk.Treeview) -> list:
+        """Orden activo de ``tree`` como ``[(campo, descendente)]`` para el registro."""
+        spec = self._sort_spec(tree)
+        return [(self._REGISTRY_COLUMNS[c], rev) for c, rev in spec.keys if c in self._REGISTRY_COLUMNS] or list(DEFAULT_SORT)
+
+    @staticmethod
+    def _registry_rows(entries: list, positions: np.ndarray, start: int) -> list:
+        rows = []
+        for k, p in enumerate(positions):
+            e = entries[int(p)]
+            rows.append((
+                str(e.get('number')),
+                (e.get('number'), e.get('status'), e.get('created_at'), e.get('pdf'), e.get('items_count')),
+                ('evenrow' if (start + k) % 2 == 0 else 'oddrow',),
+            ))
+        return rows
+
+    def _registry_locate(self, attr: str, iid: str) -> Optional[int]:
+        index = self._registry_index.get(attr)
+        if index is None:
+            index = self._registry_index[attr] = {str(e.get('number')): i for i, e in enumerate(getattr(self, attr))}
+        return index.get(iid)
+
+    def _show_registry_entries(self, attr: str, table: Optional[VirtualTable]) -> None:
+        self._registry_index.pop(attr, None)
+        if table is not None:
+            table.set_positions(np.arange(len(getattr(self, attr)), dtype=np.int64), keep_offset=True)
+
+    def _registry_entry_added(self, entry: dict) -> None:
+        """Inserta un vale recien registrado en historial y gestor sin reconsultar."""
+        views = (
+            ('_history_entries', self.history_table, self.history_tree, None,
+             self.hist_search_var.get() if hasattr(self, 'hist_search_var') else ''),
+        )
+        if hasattr(self, 'mgr_tree'):
+            estado = self.mgr_estado.get() if hasattr(self, 'mgr_estado') else '(Todos)'
+            views += (
+                ('_mgr_entries', self.mgr_table, self.mgr_tree,
+                 None if estado in (None, '', '(Todos)') else estado,
+                 self.mgr_search_var.get() if hasattr(self, 'mgr_search_var') else ''),
+            )
+        for attr, table, tree, status, term in views:
+            if not self.registry.matches(entry, status, term):
+                continue
+            entries = getattr(self, attr)
+            sort = self._registry_sort(tree)
+            k = next((i for i, e in enumerate(entries) if self.registry.precedes(entry, e, sort)), len(entries))
+            entries.insert(k, entry)
+            self._show_registry_entries(attr, table)
+
+    def _bind_table_sort(self, tree: ttk.Treeview, on_sort: Callable[[str, bool], None]) -> None:
+        """Encabezados ordenables: clic ordena por la columna (A-Z / Z-A) y
+        Shift+clic agrega o invierte un criterio secundario."""
+        self._sort_heading_texts[str(tree)] = {c: tree.heading(c, 'text') for c in tree['columns']}
+        for col in tree['columns']:
+            tree.heading(col, command=lambda c=col: on_sort(c, False))
+
+        def _on_shift_click(event):
+            if tree.identify_region(event.x, event.y) != 'heading':
+                return None
+            try:
+                col = tree['columns'][int(tree.identify_column(event.x)[1:]) - 1]
+            except Exception:
+                return None
+            on_sort(col, True)
+            return 'break'
 
-            state_key = (id(tree), col)
-            reverse = bool(self._tree_sort_state.get(state_key, False))
-            self._tree_sort_state[state_key] = not reverse
+        tree.bind('<Shift-Button-1>', _on_shift_click, add='+')
 
-            def sort_key(item):
-                val = item[0]
-                try:
-                    return int(val)
-                except Exception:
-                    try:
-                        return float(val)
-                    except Exception:
-                        return str(val).lower()
-
-            items.sort(key=sort_key, reverse=reverse)
+    def _sort_spec(self, tree: ttk.Treeview, col: Optional[str] = None, extend: bool = False) -> SortSpec:
+        """Orden activo de ``tree``; con ``col`` aplica el clic y actualiza las flechas."""
+        spec = self._sort_specs.setdefault(str(tree), SortSpec())
+        if col is not None:
+            spec.click(col, extend)
+            try:
+                for c, text in self._sort_heading_texts.get(str(tree), {}).items():
+                    tree.heading(c, text=spec.heading(c, text))
+            except Exception:
+                pass
+        return spec
 
-            for index, (_val, k) in enumerate(items):
-                tree.move(k, '', index)
+    def _sort_rows(self, tree: ttk.Treeview, items: list, col: Optional[str], extend: bool,
+                   column: Callable[[str], list], kinds: dict) -> list:
+        """Ordena ``items`` (datos de respaldo de ``tree``) segun su orden activo.
 
-            self._apply_stripes(tree)
-        except Exception:
-            pass
+        ``column(c)`` devuelve los valores de la columna ``c`` para todos los
+        items; el orden es estable y con tipos reales (ver ``table_sort``).
+        """
+        spec = self._sort_spec(tree, col, extend)
+        if not spec or len(items) < 2:
+            return list(items)
+        try:
+            order = sort_order({c: column(c) for c, _rev in spec.keys}, spec, kinds)
+        except Exception as exc:
+            self.log.warning("No se pudo ordenar la tabla: %s", exc)
+            return list(items)
+        return [items[i] for i in order]
 
     def _with_history_selection(self, action: Callable[[str, str], None]) -> None:
-        cur = self.history_tree.focus()
+        cur = self.history_table.focus()
         if not cur:
             messagebox.showwarning("Historial", MSG_SELECT_HISTORY)
             return
@@ -1393,7 +1634,7 @@ class ValeConsumoApp:
         self._with_history_selection(_open)
 
     def print_selected_history(self) -> None:
-        cur = self.history_tree.focus()
+        cur = self.history_table.focus()
         if not cur:
             messagebox.showwarning("Historial", "Seleccione una solicitud del listado.")
             return
@@ -1414,7 +1655,7 @@ class ValeConsumoApp:
             messagebox.showerror("Reimprimir", f"Error al imprimir: {e}")
 
     def merge_selected_history(self) -> None:
-        sels = list(self.history_tree.selection())
+        sels = self.history_table.selection()
         if not sels or len(sels) < 2:
             messagebox.showwarning("Historial", "Seleccione al menos dos vales para unificar.")
             return
@@ -1491,6 +1732,8 @@ class ValeConsumoApp:
                     'Vencimiento': venc,
                     'Cantidad': info.get('Cantidad', 0),
                 })
+            if self.manager.sort_by_route_enabled:
+                unified_rows = sort_by_route(unified_rows)
 
         ts = datetime.now().strftime('%Y%m%d_%H%M%S')
         # Nombre con origenes destacados (limitado a 5 tokens)
@@ -1519,7 +1762,7 @@ class ValeConsumoApp:
                 from pdf_utils import build_unified_vale_pdf
 
                 build_unified_vale_pdf(out_file, unified_rows, datetime.now())
-                self.refresh_history()
+                self.ui_refresh.invalidate('history')
                 try:
                     self._open_path(out_file, title="Unificar")
                 except Exception:
@@ -1538,7 +1781,7 @@ class ValeConsumoApp:
             self.log.error("No se pudo unificar PDFs: %s", err)
             return
         try:
-            self.refresh_history()
+            self.ui_refresh.invalidate('history')
             self._open_path(out_file, title="Unificar")
         except Exception:
             pass
@@ -1680,6 +1923,12 @@ class ValeConsumoApp:
                     subfamilies = sorted([x for x in pd.Series(df.get('Subfamilia', [])).dropna().astype(str).unique() if x])
                 except Exception:
                     subfamilies = []
+                shm_snapshot = None
+                if self._shm_filter is not None:
+                    try:
+                        shm_snapshot = SharedFilterService.prepare(df)
+                    except Exception as exc:
+                        self.log.warning("No se pudo preparar memoria compartida: %s", exc)
                 try:
                     if 'Ubicacion' in df.columns:
                         ubicaciones = sorted(
@@ -1689,7 +1938,7 @@ class ValeConsumoApp:
                         ubicaciones = []
                 except Exception:
                     ubicaciones = []
-                self._load_queue.put(("done", df, subfamilies, ubicaciones))
+                self._load_queue.put(("done", df, subfamilies, ubicaciones, shm_snapshot))
             except Exception as e:
                 self._load_queue.put(("error", e))
 
@@ -1765,12 +2014,21 @@ class ValeConsumoApp:
                     df = payload[0]
                     subfamilies = payload[1] if len(payload) > 1 else None
                     ubicaciones = payload[2] if len(payload) > 2 else None
+                    self._activate_shm_snapshot(payload[3] if len(payload) > 3 else None, df)
                     self._loading_inventory = False
                     self._close_load_progress()
                     self.file_label.configure(text=os.path.basename(path))
                     self._inventory_rev += 1
+                    self._inventory_load += 1
+                    self._stock_change_log = []
                     self._last_filter_signature = None
+                    self._filter_cache.clear()
                     self._populate_subfamilies(df, subfamilies=subfamilies, ubicaciones=ubicaciones)
+                    self._refresh_expiry_summary()
+                    self._warm_filter_presets()
+                    if not STARTUP.has('inventario'):
+                        STARTUP.mark('inventario')
+                        self.log.info(STARTUP.report())
                 elif kind == "error":
                     err = payload[0]
                     self._loading_inventory = False
@@ -1784,18 +2042,7 @@ class ValeConsumoApp:
 
     def _prepare_inventory_cache(self, df: pd.DataFrame) -> None:
         try:
-            if '_lc_producto' not in df.columns and 'Nombre_del_Producto' in df.columns:
-                df['_lc_producto'] = df['Nombre_del_Producto'].fillna('').astype(str).str.lower()
-            if '_lc_codigo' not in df.columns and 'Codigo' in df.columns:
-                df['_lc_codigo'] = df['Codigo'].fillna('').astype(str).str.lower()
-            if '_lc_lote' not in df.columns and 'Lote' in df.columns:
-                df['_lc_lote'] = df['Lote'].fillna('').astype(str).str.lower()
-            if '_lc_ubicacion' not in df.columns and 'Ubicacion' in df.columns:
-                df['_lc_ubicacion'] = df['Ubicacion'].fillna('').astype(str).str.lower()
-            if '_subfam' not in df.columns and 'Subfamilia' in df.columns:
-                df['_subfam'] = df['Subfamilia'].astype(str)
-            if '_venc_dt' not in df.columns and 'Vencimiento' in df.columns:
-                df['_venc_dt'] = pd.to_datetime(df['Vencimiento'], errors='coerce')
+            prepare_search_columns(df)
         except Exception:
             pass
 
@@ -1809,91 +2056,339 @@ class ValeConsumoApp:
         try:
             if subfamilies is None:
                 subfamilies = sorted([x for x in pd.Series(df.get('Subfamilia', [])).dropna().astype(str).unique() if x])
+            self._subfamilies = list(subfamilies)
             self.subfam_combo['values'] = ['(Todas)'] + list(subfamilies)
         except Exception:
+            self._subfamilies = []
             self.subfam_combo['values'] = ['(Todas)']
         self.subfam_combo.set('(Todas)')
 
         self._refresh_ubicaciones_checklist(ubicaciones)
         self.master.after(0, lambda: self.filter_products(immediate=True))
 
+    # -------- Filtros guardados --------
+    def _filter_presets(self) -> dict:
+        try:
+            return {
+                name: FilterPreset.from_dict(name, data)
+                for name, data in settings.get_filter_presets().items()
+            }
+        except Exception as exc:
+            self.log.warning("No se pudieron leer los filtros guardados: %s", exc)
+            return {}
+
+    def _refresh_presets_combo(self) -> None:
+        try:
+            self.preset_combo['values'] = sorted(self._filter_presets(), key=str.lower)
+        except Exception:
+            pass
+
+    def _save_filter_preset(self) -> None:
+        """Guarda los filtros del panel (y las ubicaciones excluidas) con un nombre."""
+        try:
+            parse_query(self.search_var.get(), self._subfamilies)
+        except QueryError as exc:
+            messagebox.showwarning('Guardar filtro', f'Corrija la busqueda antes de guardar:\n{exc}')
+            return
+        name = simpledialog.askstring(
+            'Guardar filtro', 'Nombre del filtro:', initialvalue=self.preset_var.get().strip(), parent=self.master,
+        )
+        name = (name or '').strip()
+        if not name:
+            return
+        preset = FilterPreset(
+            name=name,
+            busqueda=self.search_var.get().strip(),
+            lote=self.lote_var.get().strip(),
+            ubicacion=self.ubi_var.get().strip(),
+            venc_desde=self.vdesde_var.get().strip(),
+            venc_hasta=self.vhasta_var.get().strip(),
+            subfamilia=self.subfam_var.get().strip() or '(Todas)',
+            solo_con_stock=bool(self.stock_only_var.get()),
+            excluidas=tuple(self._get_excluded_ubicaciones()),
+        )
+        settings.set_filter_preset(name, preset.to_dict())
+        self.preset_var.set(name)
+        self._refresh_presets_combo()
+        self._warm_filter_presets()
+        self.log.info("Filtro guardado: %s", name)
+
+    def _delete_filter_preset(self) -> None:
+        name = self.preset_var.get().strip()
+        if not name or name not in self._filter_presets():
+            return
+        if not messagebox.askyesno('Filtros guardados', f'Eliminar el filtro "{name}"?'):
+            return
+        settings.delete_filter_preset(name)
+        self.preset_var.set('')
+        self._refresh_presets_combo()
+
+    def _apply_filter_preset(self, name: Optional[str] = None) -> None:
+        """Carga un filtro guardado en el panel; su resultado suele estar ya en cache."""
+        name = (name or self.preset_var.get()).strip()
+        preset = self._filter_presets().get(name)
+        if preset is None:
+            return
+        self.search_var.set(preset.busqueda)
+        self.lote_var.set(preset.lote)
+        self.ubi_var.set(preset.ubicacion)
+        self.vdesde_var.set(preset.venc_desde)
+        self.vhasta_var.set(preset.venc_hasta)
+        self.subfam_var.set(preset.subfamilia or '(Todas)')
+        self.stock_only_var.set(bool(preset.solo_con_stock))
+        if self.ubicacion_checklist is not None:
+            self.ubicacion_checklist.set_excluded(preset.excluidas)
+        self.filter_products(immediate=True)
+
+    def _warm_filter_presets(self) -> None:
+        """Pre-calcula en segundo plano los filtros guardados que no esten en cache.
+
+        Se llama tras cargar el inventario o guardar un filtro, no por cada
+        cambio de stock. El hilo trabaja sobre una copia de la columna Stock
+        (el hilo de Tk la sigue modificando); una carga nueva cancela el
+        calculo y un resultado al que le afecten los cambios de stock
+        ocurridos mientras tanto se descarta. Los demas quedan fijados en el
+        cache de filtros.
+        """
+        df = self.manager.bioplates_inventory
+        if df is None or df.empty:
+            return
+        load = self._inventory_load
+        mark = len(self._stock_change_log)
+        jobs = []
+        for preset in self._filter_presets().values():
+            try:
+                opts = preset.options(self._subfamilies)
+                cache_key = (opts.signature(), exclusion_signature(preset.excluidas))
+            except Exception as exc:
+                self.log.warning("Filtro guardado '%s' invalido: %s", preset.name, exc)
+                continue
+            if cache_key not in self._filter_cache:
+                jobs.append((preset.name, opts, list(preset.excluidas), cache_key))
+        if not jobs:
+            return
+
+        snapshot = df.copy(deep=False)
+        if 'Stock' in snapshot.columns:
+            snapshot['Stock'] = df['Stock'].to_numpy(copy=True)
+
+        def _cancelled() -> bool:
+            return load != self._inventory_load
+
+        def _worker() -> None:
+            for name, opts, excluded, cache_key in jobs:
+                try:
+                    pos = self._filter_positions(snapshot, opts, excluded, opts.producto, _cancelled)
+                except FilterCancelled:
+                    return
+                except Exception as exc:
+                    self.log.warning("No se pudo pre-calcular el filtro '%s': %s", name, exc)
+                    continue
+                self._preset_queue.put((load, mark, cache_key, pos, opts.stock_cuts()))
+
+        self._preset_thread = threading.Thread(target=_worker, name='preset-warm', daemon=True)
+        self._preset_thread.start()
+        if self._preset_poll_after_id is None:
+            self._preset_poll_after_id = self.master.after(100, self._poll_preset_queue)
+
+    def _poll_preset_queue(self) -> None:
+        self._preset_poll_after_id = None
+        warmed = 0
+        try:
+            while True:
+                load, mark, cache_key, pos, stock_cuts = self._preset_queue.get_nowait()
+                if load != self._inventory_load:
+                    continue
+                if FilterCache.affected_by(stock_cuts, self._stock_change_log[mark:]):
+                    continue
+                self._filter_cache.put(cache_key, pos, stock_cuts, pinned=True)
+                warmed += 1
+        except queue.Empty:
+            pass
+        if warmed:
+            self.log.debug("Filtros guardados pre-calculados: %d", warmed)
+        if self._preset_thread is not None and self._preset_thread.is_alive():
+            self._preset_poll_after_id = self.master.after(100, self._poll_preset_queue)
+
     def filter_products(self, immediate: bool = False) -> None:
         if immediate:
-            if self._filter_after_id:
-                try:
-                    self.master.after_cancel(self._filter_after_id)
-                except Exception:
-                    pass
-                self._filter_after_id = None
             self._apply_filters_now()
             return
-        if self._filter_after_id:
-            try:
-                self.master.after_cancel(self._filter_after_id)
-            except Exception:
-                pass
-        self._filter_after_id = self.master.after(250, self._apply_filters_now)
+        # Mientras se escribe, cada cambio corre la espera (250 ms)
+        self.ui_refresh.invalidate('filter', 250)
+
+    def _current_filter_options(self) -> FilterOptions:
+        """Filtros de los widgets combinados con la consulta del buscador.
+
+        El buscador acepta el mini-lenguaje de ``filters.parse_query``; sus claves
+        tienen prioridad sobre los campos equivalentes del panel. Si la consulta
+        tiene un error se muestra bajo el buscador y se sigue usando la ultima
+        consulta valida (la lista no cambia hasta corregirla).
+        """
+        try:
+            query = parse_query(self.search_var.get(), self._subfamilies)
+        except QueryError as exc:
+            self._show_query_error(str(exc))
+            query = self._last_valid_query
+        else:
+            self._show_query_error('')
+            self._last_valid_query = query
+        widgets = FilterOptions(
+            lote=self.lote_var.get().strip(),
+            ubicacion=self.ubi_var.get().strip(),
+            venc_desde=self.vdesde_var.get().strip(),
+            venc_hasta=self.vhasta_var.get().strip(),
+            subfamilia=self.subfam_var.get().strip() or '(Todas)',
+            solo_con_stock=bool(self.stock_only_var.get()),
+        )
+        return widgets.combine(query)
+
+    def _show_query_error(self, message: str) -> None:
+        label = getattr(self, 'query_error_label', None)
+        if label is None or self.query_error_var.get() == message:
+            return
+        self.query_error_var.set(message)
+        try:
+            if message:
+                label.pack(fill='x', pady=(2, 0))
+            else:
+                label.pack_forget()
+        except Exception:
+            pass
+
+    def _show_ui_latency(self) -> None:
+        """Resumen de la latencia del loop de Tk en esta sesion."""
+        if self.latency is None:
+            messagebox.showinfo('Latencia de la interfaz', 'La medicion esta desactivada (VALE_UI_STALL_MS=0).')
+            return
+        messagebox.showinfo('Latencia de la interfaz', self.latency.report())
+
+    def _finish_ui_latency(self) -> None:
+        """Cierra la medicion y deja el resumen en el log y en ``ui_latency.log``."""
+        if self.latency is None:
+            return
+        self.latency.stop()
+        self.log.info("Resumen de latencia de la interfaz\n%s", self.latency.report())
+        self.latency.write_report(os.path.join(self.history_dir, 'ui_latency.log'))
+
+    def _explain_current_filter(self) -> None:
+        """Muestra el plan elegido para los filtros actuales (orden, metodo, filas y tiempos)."""
+        df = self.manager.bioplates_inventory
+        if df is None or df.empty:
+            messagebox.showinfo('Plan de filtro', 'No hay inventario cargado.')
+            return
+        try:
+            info = self._current_filter_options().explain(df, self.manager.index)
+        except Exception as e:
+            messagebox.showerror('Plan de filtro', f'No se pudo evaluar el filtro: {e}')
+            return
+        lines = [f"Filas: {info['rows_total']} -> {info['rows_out']} ({info['ms']:.1f} ms)", ""]
+        if not info['steps']:
+            lines.append("(sin filtros activos)")
+        for n, st in enumerate(info['steps'], start=1):
+            lines.append(
+                f"{n}. {st['name']} [{st['method']}] est={st['estimate']} "
+                f"{st['rows_in']} -> {st['rows_out']} ({st['ms']:.2f} ms)"
+            )
+        messagebox.showinfo('Plan de filtro', "\n".join(lines))
 
     def _apply_filters_now(self) -> None:
-        self._filter_after_id = None
+        self.ui_refresh.render_now('filter')
+
+    def _filter_view(self):
+        """Render de la vista 'filter': calcular y dibujar van en cuadros distintos."""
         df = self.manager.bioplates_inventory
         if df is None or df.empty:
-            self._populate_products(pd.DataFrame())
+            self._populate_products()
             self.log.info("Filtros aplicados sin inventario cargado")
             return
         if '_lc_producto' not in df.columns:
             self._prepare_inventory_cache(df)
-        search_term = self.search_var.get().strip()
-        lote_term = self.lote_var.get().strip()
-        ubi_term = self.ubi_var.get().strip()
-        vdesde = self.vdesde_var.get().strip()
-        vhasta = self.vhasta_var.get().strip()
-        subfam = self.subfam_var.get().strip() or '(Todas)'
-        stock_only = bool(self.stock_only_var.get())
+        opts = self._current_filter_options()
+        search_term = opts.producto
         excluded = self._get_excluded_ubicaciones()
-        excluded_sig = tuple(sorted(str(x).strip().lower() for x in excluded if str(x).strip()))
-        signature = (
-            self._inventory_rev,
-            search_term.lower(),
-            lote_term.lower(),
-            ubi_term.lower(),
-            vdesde,
-            vhasta,
-            subfam,
-            stock_only,
-            excluded_sig,
-        )
+        excluded_sig = exclusion_signature(excluded)
+        signature = (self._inventory_rev, opts.signature(), excluded_sig)
         if signature == self._last_filter_signature:
             return
         self._last_filter_signature = signature
-        opts = FilterOptions(
-            producto=search_term,
-            lote=lote_term,
-            ubicacion=ubi_term,
-            venc_desde=vdesde,
-            venc_hasta=vhasta,
-            subfamilia=subfam,
-            solo_con_stock=stock_only,
-        )
-        if len(df) >= self._filter_async_threshold:
-            self._start_filter_worker(df, opts, excluded, search_term, signature)
+        cache_key = (opts.signature(), excluded_sig)
+        cached = self._filter_cache.get(cache_key)
+        if len(df) >= self._filter_async_threshold and cached is None:
+            shm = self._shm_filter
+            if shm is not None and shm.ready and shm.matches(df):
+                self._start_shm_filter(df, opts, excluded, search_term, signature, cache_key)
+            else:
+                self._start_filter_worker(df, opts, excluded, search_term, signature, cache_key)
             return
+        self._cancel_filter_worker()
+        if cached is not None:
+            self._show_filter_result(df, cached)
+            return
+        # Si el render se reinicia antes de dibujar, la firma no debe darlo por hecho
+        self._last_filter_signature = None
+        yield
         try:
-            out = opts.apply(df)
+            pos = self._filter_positions(df, opts, excluded, search_term)
+            self._filter_cache.put(cache_key, pos, opts.stock_cuts())
         except Exception as exc:
             self.log.error("Filtro fallo, se muestra inventario completo: %s", exc)
-            out = df
-        if excluded and 'Ubicacion' in out.columns:
+            pos = np.arange(len(df))
+        yield
+        self._last_filter_signature = signature
+        self._show_filter_result(df, pos)
+
+    def _filter_positions(
+        self,
+        df: pd.DataFrame,
+        opts: FilterOptions,
+        excluded: list,
+        search_term: str,
+        cancelled=None,
+    ) -> np.ndarray:
+        """Posiciones visibles en orden de despliegue (filtros + exclusiones + orden).
+
+        ``cancelled`` (opcional) se consulta entre etapas; ver :class:`FilterWorker`.
+        """
+        pos = opts.positions(df, self.manager.index, cancelled)
+        if cancelled is not None and cancelled():
+            raise FilterCancelled()
+        if excluded and 'Ubicacion' in df.columns and len(pos):
             excluded_set = {str(x).strip().lower() for x in excluded}
-            if '_lc_ubicacion' in out.columns:
-                out = out[~out['_lc_ubicacion'].isin(excluded_set)]
+            if '_lc_ubicacion' in df.columns:
+                col = df['_lc_ubicacion'].iloc[pos]
             else:
-                out = out[~out['Ubicacion'].fillna('').astype(str).str.strip().str.lower().isin(excluded_set)]
-        if search_term and len(out) <= self._max_sort_rows:
-            out = self._sort_by_proximidad(out)
-        self.filtered_df = out
-        self._populate_products(out)
-        self.log.info("Filtro aplicado -> %d filas visibles", len(out))
+                col = df['Ubicacion'].iloc[pos].fillna('').astype(str).str.strip().str.lower()
+            pos = pos[~col.isin(excluded_set).to_numpy(dtype=bool)]
+            if cancelled is not None and cancelled():
+                raise FilterCancelled()
+        if search_term and len(pos):
+            pos = self._fefo_order(df, pos)
+        return pos
+
+    def _fefo_order(self, df: pd.DataFrame, pos: np.ndarray) -> np.ndarray:
+        """Ordena posiciones con el rango FEFO precomputado en la carga."""
+        index = self.manager.index
+        if index.matches(df):
+            return index.fefo_sort(pos)
+        return pos[self._proximidad_order(df.iloc[pos])]
+
+    def _check_day_rollover(self) -> None:
+        """Al cambiar la fecha recalcula los dias a vencimiento y redibuja los tags."""
+        try:
+            if self.manager.refresh_expiry():
+                self.log.info("Cambio de dia: dias a vencimiento recalculados")
+                self._refresh_expiry_summary()
+                self._last_filter_signature = None
+                self.filter_products()
+        except Exception as exc:
+            self.log.debug("No se pudo verificar cambio de dia: %s", exc)
+        self.master.after(60000, self._check_day_rollover)
+
+    def _show_filter_result(self, df: pd.DataFrame, pos: np.ndarray) -> None:
+        self.filtered_positions = pos
+        self._populate_products(pos)
+        self.log.info("Filtro aplicado -> %d filas visibles", len(pos))
 
     def _start_filter_worker(
         self,
@@ -1902,29 +2397,32 @@ class ValeConsumoApp:
         excluded: list,
         search_term: str,
         signature: tuple,
+        cache_key: tuple,
     ) -> None:
-        self._filter_worker_token += 1
-        token = self._filter_worker_token
-        self._filter_worker_running = True
-
-        def _worker() -> None:
+        """Envia el filtro al hilo unico; una solicitud nueva reemplaza a la pendiente."""
+        def _job(token: int, cancelled) -> None:
             try:
-                out = opts.apply(df)
-                if excluded and 'Ubicacion' in out.columns:
-                    excluded_set = {str(x).strip().lower() for x in excluded}
-                    if '_lc_ubicacion' in out.columns:
-                        out = out[~out['_lc_ubicacion'].isin(excluded_set)]
-                    else:
-                        out = out[~out['Ubicacion'].fillna('').astype(str).str.strip().str.lower().isin(excluded_set)]
-                if search_term and len(out) <= self._max_sort_rows:
-                    out = self._sort_by_proximidad(out)
-                self._filter_queue.put(("done", token, signature, out))
+                pos = self._filter_positions(df, opts, excluded, search_term, cancelled)
+            except FilterCancelled:
+                raise
             except Exception as exc:
                 self._filter_queue.put(("error", token, signature, exc))
+                return
+            self._filter_queue.put(("done", token, signature, (df, pos, cache_key, opts.stock_cuts())))
 
-        threading.Thread(target=_worker, daemon=True).start()
+        self._shm_request = None
+        token = self._filter_worker.submit(_job)
+        self._filter_worker_token = token
+        self._filter_worker_running = True
         self._schedule_filter_poll()
 
+    def _cancel_filter_worker(self) -> None:
+        """Abandona el filtro asincrono en curso (si lo hay)."""
+        if self._filter_worker_running:
+            self._filter_worker.cancel()
+            self._shm_request = None
+            self._filter_worker_running = False
+
     def _schedule_filter_poll(self) -> None:
         if self._filter_poll_after_id:
             return
@@ -1936,14 +2434,14 @@ class ValeConsumoApp:
             while True:
                 kind, *payload = self._filter_queue.get_nowait()
                 if kind == "done":
-                    token, signature, out = payload
+                    token, signature, (df, pos, cache_key, stock_cuts) = payload
                     if token == self._filter_worker_token:
                         self._filter_worker_running = False
+                    if signature[0] == self._inventory_rev:
+                        self._filter_cache.put(cache_key, pos, stock_cuts)
                     if signature != self._last_filter_signature or token != self._filter_worker_token:
                         continue
-                    self.filtered_df = out
-                    self._populate_products(out)
-                    self.log.info("Filtro aplicado -> %d filas visibles", len(out))
+                    self._show_filter_result(df, pos)
                 elif kind == "error":
                     token, signature, exc = payload
                     if token == self._filter_worker_token:
@@ -1953,9 +2451,99 @@ class ValeConsumoApp:
                     self.log.error("Filtro async fallo: %s", exc)
         except queue.Empty:
             pass
+        self._drain_shm_results()
         if self._filter_worker_running:
             self._filter_poll_after_id = self.master.after(60, self._poll_filter_queue)
 
+    # ---------------- Filtrado en subproceso (memoria compartida) ----------------
+    def _configure_shm_filter(self) -> None:
+        """Activa o desactiva el filtrado en subproceso segun el ajuste guardado."""
+        try:
+            enabled = settings.get_shm_filter_enabled()
+        except Exception:
+            enabled = False
+        if enabled and self._shm_filter is None:
+            try:
+                self._shm_filter = SharedFilterService()
+                self._shm_filter.start()
+                df = self.manager.bioplates_inventory
+                if df is not None and not df.empty:
+                    self._shm_filter.publish(df)
+                self.log.info("Filtrado en subproceso activado")
+            except Exception as exc:
+                self.log.warning("No se pudo iniciar el filtrado en subproceso: %s", exc)
+                if self._shm_filter is not None:
+                    self._shm_filter.close()
+                self._shm_filter = None
+        elif not enabled and self._shm_filter is not None:
+            self._shm_filter.close()
+            self._shm_filter = None
+            self._shm_request = None
+            self.log.info("Filtrado en subproceso desactivado")
+
+    def _activate_shm_snapshot(self, snapshot, df: pd.DataFrame) -> None:
+        """Entrega al subproceso las columnas publicadas en el hilo de carga."""
+        if self._shm_filter is None:
+            if snapshot is not None:
+                snapshot.discard()
+            return
+        try:
+            if snapshot is not None:
+                self._shm_filter.activate(snapshot)
+            else:
+                self._shm_filter.publish(df)
+        except Exception as exc:
+            self.log.warning("No se pudo publicar el inventario en memoria compartida: %s", exc)
+
+    def _start_shm_filter(
+        self,
+        df: pd.DataFrame,
+        opts: FilterOptions,
+        excluded: list,
+        search_term: str,
+        signature: tuple,
+        cache_key: tuple,
+    ) -> None:
+        """Envia el filtro al subproceso; el hilo de Tk solo consulta el Pipe."""
+        self._filter_worker.cancel()
+        excluded_sig = cache_key[1]
+        try:
+            req_id = self._shm_filter.submit(opts, excluded_sig)
+        except Exception as exc:
+            self.log.warning("Subproceso de filtro no disponible (%s); se usa hilo local", exc)
+            self._shm_filter.close()
+            self._shm_filter = None
+            self._start_filter_worker(df, opts, excluded, search_term, signature, cache_key)
+            return
+        self._shm_request = (req_id, df, opts, excluded, search_term, signature, cache_key)
+        self._filter_worker_running = True
+        self._schedule_filter_poll()
+
+    def _drain_shm_results(self) -> None:
+        if self._shm_filter is None:
+            return
+        for kind, req_id, payload in self._shm_filter.poll():
+            req = self._shm_request
+            if req is None or req[0] != req_id:
+                if kind == 'error':
+                    self.log.warning("Subproceso de filtro: %s", payload)
+                continue
+            self._shm_request = None
+            self._filter_worker_running = False
+            _req_id, df, opts, excluded, search_term, signature, cache_key = req
+            if kind == 'error':
+                self.log.error("Filtro en subproceso fallo (%s); se reintenta en hilo local", payload)
+                if signature == self._last_filter_signature:
+                    self._start_filter_worker(df, opts, excluded, search_term, signature, cache_key)
+                continue
+            pos = payload
+            if search_term and len(pos):
+                pos = self._fefo_order(df, pos)
+            if signature[0] == self._inventory_rev:
+                self._filter_cache.put(cache_key, pos, opts.stock_cuts())
+            if signature == self._last_filter_signature:
+                self._show_filter_result(df, pos)
+
     def _parse_vencimiento_value(self, value):
         if value is None:
             return None
@@ -1984,11 +2572,17 @@ class ValeConsumoApp:
     def _sort_by_proximidad(self, df: pd.DataFrame) -> pd.DataFrame:
         if df is None or df.empty or 'Vencimiento' not in df.columns:
             return df
+        return df.iloc[self._proximidad_order(df)]
+
+    def _proximidad_order(self, df: pd.DataFrame) -> np.ndarray:
+        """Permutacion que pone primero el lote mas proximo a vencer de cada producto."""
+        if 'Vencimiento' not in df.columns:
+            return np.arange(len(df))
         venc_dt = df['_venc_dt'] if '_venc_dt' in df.columns else pd.to_datetime(df['Vencimiento'], errors='coerce')
         productos = df['_lc_producto'] if '_lc_producto' in df.columns else df['Nombre_del_Producto'].fillna('').astype(str).str.lower()
         valid = productos.ne('') & venc_dt.notna()
         if not valid.any():
-            return df
+            return np.arange(len(df))
         earliest = venc_dt.where(valid).groupby(productos).transform('min')
         is_earliest = valid & (venc_dt == earliest)
         today = pd.Timestamp(datetime.now().date())
@@ -1997,127 +2591,375 @@ class ValeConsumoApp:
         is_earliest_vals = is_earliest.astype(int).to_numpy()
         days_vals = days.to_numpy()
         orig = np.arange(len(df))
-        order = np.lexsort((orig, days_vals, -is_earliest_vals))
-        return df.iloc[order]
-
-    def _populate_products(self, df: pd.DataFrame) -> None:
-        if self._render_after_id:
-            try:
-                self.master.after_cancel(self._render_after_id)
-            except Exception:
-                pass
-            self._render_after_id = None
-        self._render_token += 1
-        render_token = self._render_token
+        return np.lexsort((orig, days_vals, -is_earliest_vals))
 
-        children = self.product_tree.get_children()
-        if children:
-            self.product_tree.delete(*children)
-        if df is None or df.empty:
-            return
+    def _expiry_tags_for(self, df: pd.DataFrame) -> np.ndarray:
+        """Tags de vencimiento calculados sobre ``df`` (sin indice disponible).
 
-        if '_lc_producto' not in df.columns or '_venc_dt' not in df.columns:
+        Misma regla que ``InventoryIndex.expiry_tags``: vencido, o dentro del
+        primer tramo de vencimiento.
+        """
+        if '_venc_dt' not in df.columns:
             self._prepare_inventory_cache(df)
-        venc_dt = df['_venc_dt'] if '_venc_dt' in df.columns else pd.to_datetime(df['Vencimiento'], errors='coerce')
-        productos = df['_lc_producto'] if '_lc_producto' in df.columns else df['Nombre_del_Producto'].fillna('').astype(str).str.lower()
-        valid = productos.ne('') & venc_dt.notna()
-        if valid.any():
-            earliest = venc_dt.where(valid).groupby(productos).transform('min')
-            is_earliest = valid & (venc_dt == earliest)
-            today = pd.Timestamp(datetime.now().date())
-            days = (venc_dt - today).dt.days
+        tags = np.full(len(df), '', dtype=object)
+        if '_venc_dt' in df.columns:
+            venc_dt = df['_venc_dt']
+        elif 'Vencimiento' in df.columns:
+            venc_dt = pd.to_datetime(df['Vencimiento'], errors='coerce')
         else:
-            is_earliest = pd.Series([False] * len(df), index=df.index)
-            days = pd.Series([999999] * len(df), index=df.index)
+            return tags
+        today = pd.Timestamp(datetime.now().date())
+        days = (venc_dt - today).dt.days.to_numpy()
+        valid = venc_dt.notna().to_numpy()
+        first_edge = self.manager.index.bucket_edges[0]
+        tags[valid & (days >= 0) & (days <= first_edge)] = 'vencimiento_proximo'
+        tags[valid & (days < 0)] = 'vencido'
+        return tags
+
+    def _populate_products(self, positions: Optional[np.ndarray] = None) -> None:
+        """Muestra en la tabla virtual las filas ``positions`` (iloc en el inventario).
+
+        Solo las filas visibles existen como items del Treeview; valores, tags
+        de vencimiento y franjas se leen del inventario al dibujar cada ventana.
+        """
+        if positions is None:
+            positions = np.empty(0, dtype=np.int64)
+        df = self.manager.bioplates_inventory
+        self._product_tags = None
+        if len(positions) and not self.manager.index.matches(df):
+            self._product_tags = self._expiry_tags_for(df)
+        else:
+            self.manager.refresh_expiry()
+        self.product_table.set_positions(self._sorted_positions(positions))
 
+    def _product_rows(self, pos: np.ndarray, start: int) -> list:
+        """Filas ``(iid, valores, tags)`` para la ventana visible de la tabla."""
+        df = self.manager.bioplates_inventory
         cols = ['Nombre_del_Producto', 'Codigo', 'Lote', 'Bodega', 'Ubicacion', 'Vencimiento', 'Stock']
-        values_df = df[cols]
-        values_arr = values_df.to_numpy(copy=False)
-        idx_arr = values_df.index.to_numpy()
-        is_earliest_vals = is_earliest.to_numpy()
-        days_vals = days.to_numpy()
-        total = len(values_arr)
-        batch = max(50, int(self._render_batch_size))
-
-        def _insert_batch(start: int = 0) -> None:
-            if render_token != self._render_token:
-                return
-            end = min(start + batch, total)
-            for pos in range(start, end):
-                idx = idx_arr[pos]
-                values = tuple(values_arr[pos].tolist())
-                tag = None
-                if pos < len(is_earliest_vals) and is_earliest_vals[pos]:
-                    try:
-                        tag = 'vencido' if days_vals[pos] < 0 else 'vencimiento_proximo'
-                    except Exception:
-                        tag = None
-                try:
-                    iid = str(int(idx))
-                except Exception:
-                    iid = str(idx)
-                if tag:
-                    tags = (tag,)
-                else:
-                    tags = ('evenrow' if pos % 2 == 0 else 'oddrow',)
-                self.product_tree.insert('', 'end', iid=iid, values=values, tags=tags)
-            if end < total:
-                self._render_after_id = self.master.after(1, lambda: _insert_batch(end))
+        values_arr = df.iloc[pos][cols].to_numpy()
+        labels = df.index[pos]
+        if self._product_tags is not None:
+            tag_vals = self._product_tags[pos]
+        else:
+            tag_vals = self.manager.index.expiry_tags(pos)
+        rows = []
+        for k, label in enumerate(labels):
+            try:
+                iid = str(int(label))
+            except Exception:
+                iid = str(label)
+            tag = tag_vals[k]
+            if tag:
+                tags = (tag,)
             else:
-                self._render_after_id = None
+                tags = ('evenrow' if (start + k) % 2 == 0 else 'oddrow',)
+            rows.append((iid, tuple(values_arr[k].tolist()), tags))
+        return rows
 
-        _insert_batch(0)
+    def _product_position(self, iid: str) -> Optional[int]:
+        """Posicion (iloc) en el inventario de la fila con ``iid``."""
+        df = self.manager.bioplates_inventory
+        try:
+            label = int(iid)
+        except Exception:
+            label = iid
+        try:
+            pos = df.index.get_loc(label)
+        except Exception:
+            return None
+        return int(pos) if isinstance(pos, (int, np.integer)) else None
+
+    def _sort_product_table(self, col: str, extend: bool = False) -> None:
+        """Clic en un encabezado de la tabla virtual: reordena las posiciones."""
+        table = self.product_table
+        self._sort_spec(self.product_tree, col, extend)
+        table.set_positions(self._sorted_positions(table.positions))
+
+    def _sorted_positions(self, positions: np.ndarray) -> np.ndarray:
+        """``positions`` en el orden activo de la tabla de productos.
 
-    def add_to_vale(self) -> None:
-        sel = self.product_tree.focus()
+        Se ordena sobre el inventario (fecha real, stock entero, texto sin
+        acentos); la tabla solo vuelve a dibujar la ventana visible.
+        """
+        spec = self._sort_spec(self.product_tree)
+        df = self.manager.bioplates_inventory
+        if not spec or len(positions) < 2 or df is None:
+            return positions
+        sources = {'Producto': 'Nombre_del_Producto', 'Vencimiento': '_venc_dt'}
+        columns = {}
+        for col, _rev in spec.keys:
+            src = sources.get(col, col)
+            if src not in df.columns:
+                src = col
+            if src in df.columns:
+                columns[col] = df[src].iloc[positions]
+        if not columns:
+            return positions
+        try:
+            order = sort_order(columns, spec, {'Vencimiento': DATE, 'Stock': INT})
+        except Exception as exc:
+            self.log.warning("No se pudo ordenar la tabla de productos: %s", exc)
+            return positions
+        return positions[order]
+
+    def add_to_vale(self) -> list[str]:
+        """Agrega la fila seleccionada al vale; devuelve los iids de filas afectadas."""
+        sel = self.product_table.focus()
         if not sel:
             messagebox.showwarning('Seleccion', MSG_SELECT_PRODUCT)
-            return
+            return []
         try:
             qty = int(self.quantity_entry.get().strip())
             if qty <= 0:
                 raise ValueError
         except Exception:
             messagebox.showerror('Cantidad', 'Ingrese una cantidad valida (> 0).')
-            return
+            return []
         try:
             item_index = int(sel)
             self.manager.add_to_vale(item_index, qty)
-            self._inventory_rev += 1
+            changes = self._on_stock_changed()
             self.log.info("Agregado item al vale (idx=%s qty=%s)", item_index, qty)
         except Exception as e:
             messagebox.showerror('Agregar a Solicitud', str(e))
-            return
+            return []
         # Refrescar vistas manteniendo filtros
         self.update_vale_treeview()
-        self.filter_products()
+        return self._patch_product_rows(changes)
 
-    def update_vale_treeview(self) -> None:
-        for i in self.vale_tree.get_children():
-            self.vale_tree.delete(i)
-        for i, it in enumerate(self.manager.current_vale):
-            self.vale_tree.insert(
-                '', 'end', iid=f'val-{i}',
-                values=[it.get('Producto',''), it.get('Lote',''), it.get('Ubicacion',''), it.get('Vencimiento',''), it.get('Cantidad','')]
+    def _allocate_fefo_dialog(self) -> list[str]:
+        """Pide codigo/producto y cantidad y la reparte entre lotes por vencimiento."""
+        df = self.manager.bioplates_inventory
+        if df is None or df.empty:
+            messagebox.showwarning('Asignar FEFO', 'Cargue un inventario primero.')
+            return []
+        key = simpledialog.askstring('Asignar FEFO', 'Codigo o nombre exacto del producto:', parent=self.master)
+        if not key or not key.strip():
+            return []
+        qty = simpledialog.askinteger('Asignar FEFO', 'Cantidad total:', minvalue=1, parent=self.master)
+        if not qty:
+            return []
+        try:
+            result = self.manager.allocate(key.strip(), int(qty))
+            changes = self._on_stock_changed()
+        except Exception as e:
+            messagebox.showerror('Asignar FEFO', str(e))
+            return []
+        self.update_vale_treeview()
+        affected = self._patch_product_rows(changes)
+        self.log.info("Asignacion FEFO %s x%s -> %d lineas", key, qty, len(result.lines))
+        if not result.complete:
+            missing = sum(q for _k, q in result.shortfall)
+            messagebox.showwarning(
+                'Asignar FEFO',
+                f'Stock insuficiente: faltan {missing} unidades de "{key.strip()}".'
+                if result.lines else f'No hay stock vigente para "{key.strip()}".',
             )
-        self._apply_stripes(self.vale_tree)
+        return affected
+
+    def _open_expiry_summary(self) -> None:
+        """Panel con lotes/unidades por tramo de vencimiento, subfamilia y bodega.
+
+        Lee los agregados que el indice mantiene por carga; abrirlo o refrescarlo
+        no recorre el inventario.
+        """
+        tree = self._expiry_summary_tree
+        if tree is not None and tree.winfo_exists():
+            tree.winfo_toplevel().lift()
+            self._refresh_expiry_summary()
+            return
+        dlg = tk.Toplevel(self.master)
+        dlg.title('Resumen de vencimientos')
+        dlg.transient(self.master)
+        dlg.geometry('560x420')
+        frm = ttk.Frame(dlg, padding=10)
+        frm.pack(fill='both', expand=True)
+        tree = ttk.Treeview(frm, columns=('Lotes', 'Unidades'), show='tree headings')
+        tree.heading('#0', text='Tramo / Subfamilia - Bodega')
+        tree.heading('Lotes', text='Lotes')
+        tree.heading('Unidades', text='Unidades')
+        tree.column('#0', width=320, anchor='w')
+        tree.column('Lotes', width=90, anchor='center')
+        tree.column('Unidades', width=100, anchor='center')
+        vsb = ttk.Scrollbar(frm, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.grid(row=0, column=0, sticky='nsew')
+        vsb.grid(row=0, column=1, sticky='ns')
+        frm.rowconfigure(0, weight=1)
+        frm.columnconfigure(0, weight=1)
+        ttk.Label(
+            frm,
+            text='Doble clic en un tramo filtra la tabla por ese rango de vencimiento.',
+            foreground='#666666',
+        ).grid(row=1, column=0, columnspan=2, sticky='w', pady=(6, 0))
+        tree.tag_configure('vencido', background='#ffb3b3', foreground='#b00000')
+        tree.bind('<Double-1>', lambda _e: self._apply_expiry_bucket_filter())
+
+        def _on_close():
+            self._expiry_summary_tree = None
+            dlg.destroy()
+
+        dlg.protocol('WM_DELETE_WINDOW', _on_close)
+        self._expiry_summary_tree = tree
+        self._refresh_expiry_summary()
+
+    def _refresh_expiry_summary(self) -> None:
+        tree = self._expiry_summary_tree
+        if tree is None:
+            return
+        try:
+            if not tree.winfo_exists():
+                self._expiry_summary_tree = None
+                return
+            open_items = {iid for iid in tree.get_children() if tree.item(iid, 'open')}
+            tree.delete(*tree.get_children())
+            index = self.manager.index
+            for code, (label, lots, units) in enumerate(index.bucket_totals()):
+                iid = f'bucket-{code}'
+                tags = ('vencido',) if code == 0 and lots else ()
+                tree.insert('', 'end', iid=iid, text=label, values=(lots, units), open=iid in open_items, tags=tags)
+                for subfam, bodega, s_lots, s_units in index.bucket_breakdown(code):
+                    tree.insert(
+                        iid, 'end',
+                        text=f'{subfam or "(sin subfamilia)"} - {bodega or "(sin bodega)"}',
+                        values=(s_lots, s_units),
+                    )
+        except Exception as exc:
+            self.log.debug("No se pudo refrescar resumen de vencimientos: %s", exc)
 
-    def _apply_stripes(self, tree: ttk.Treeview) -> None:
-        """Aplica zebra stripes al Treeview para mejorar legibilidad, respetando tags de vencimiento."""
+    def _apply_expiry_bucket_filter(self) -> None:
+        """Aplica al panel de filtros el rango de fechas del tramo seleccionado."""
+        tree = self._expiry_summary_tree
+        if tree is None:
+            return
+        sel = tree.focus()
+        if not sel:
+            return
+        bucket_iid = sel if sel.startswith('bucket-') else tree.parent(sel)
         try:
+            code = int(bucket_iid.split('-')[1])
+        except Exception:
+            return
+        edges = self.manager.index.bucket_edges
+        today = datetime.now().date()
+        if code == 0:
+            desde, hasta = '', (today - timedelta(days=1)).isoformat()
+        elif code <= len(edges):
+            first = 0 if code == 1 else edges[code - 2] + 1
+            desde = (today + timedelta(days=first)).isoformat()
+            hasta = (today + timedelta(days=edges[code - 1])).isoformat()
+        elif code == len(edges) + 1:
+            desde, hasta = (today + timedelta(days=edges[-1] + 1)).isoformat(), ''
+        else:
+            return
+        self.vdesde_var.set(desde)
+        self.vhasta_var.set(hasta)
+        self.filter_products(immediate=True)
+
+    def _on_stock_changed(self) -> list:
+        """Consume los cambios de stock del manager e invalida solo el cache afectado."""
+        changes = self.manager.pop_stock_changes()
+        dropped = self._filter_cache.invalidate_rows(changes)
+        if self._shm_filter is not None:
+            self._shm_filter.update_stock(changes)
+        if self._expiry_summary_tree is not None:
+            self._refresh_expiry_summary()
+        self._inventory_rev += 1
+        self._stock_change_log.extend(changes)
+        self.log.debug("Cambios de stock: %d filas, %d filtros en cache descartados", len(changes), dropped)
+        return changes
+
+    def _patch_product_rows(self, changes: list) -> list[str]:
+        """Actualiza en la grilla solo las filas cuyo stock cambio.
+
+        Cada fila visible recibe su nuevo Stock y tag de vencimiento; se elimina
+        si deja de cumplir los filtros de stock actuales. Si una fila
+        oculta pasa a cumplir todos los filtros (p. ej. al devolver stock) o aun
+        hay un render/filtro en curso, se recurre al refiltrado completo.
+        """
+        affected = [str(label) for label in dict.fromkeys(c[0] for c in changes)]
+        df = self.manager.bioplates_inventory
+        if not affected or df is None or df.empty:
+            return affected
+        if self._filter_worker_running:
+            self.filter_products()
+            return affected
+        try:
+            opts = self._current_filter_options()
+            excluded = self._get_excluded_ubicaciones()
+            index = self.manager.index
+            indexed = index.matches(df)
+            if indexed:
+                self.manager.refresh_expiry()
+            table = self.product_table
+            refilter = False
+            dropped = []
+            for label in dict.fromkeys(c[0] for c in changes):
+                iid = str(label)
+                new = int(df.at[label, 'Stock'])
+                if table.exists(iid):
+                    if not opts.stock_accepts(new):
+                        dropped.append(iid)
+                elif opts.stock_accepts(new):
+                    pos = df.index.get_loc(label)
+                    if len(self._filter_positions(df.iloc[[pos]], opts, excluded, '')):
+                        refilter = True
+            if refilter:
+                self.filter_products()
+            else:
+                # Stock y tags de las filas visibles se releen del inventario
+                # (quitar filas ya vuelve a dibujar la ventana: un solo render)
+                if not table.remove_many(dropped):
+                    table.refresh()
+                self.filtered_positions = table.positions
+                excluded_sig = exclusion_signature(excluded)
+                self._last_filter_signature = (self._inventory_rev, opts.signature(), excluded_sig)
+        except Exception as exc:
+            self.log.warning("No se pudieron actualizar filas en sitio (%s); se refiltra", exc)
+            self.filter_products()
+        return affected
+
+    def update_vale_treeview(self, col: Optional[str] = None, extend: bool = False) -> None:
+        # iid por linea (_line_id): al reordenar por recorrido las lineas se
+        # mueven en vez de reescribirse todas. El orden por columna es solo de
+        # la vista; la solicitud conserva el suyo.
+        items = self._sort_rows(
+            self.vale_tree, self.manager.current_vale, col, extend,
+            lambda c: [it.get(c, '') for it in self.manager.current_vale],
+            {'Vencimiento': DATE, 'Cantidad': INT},
+        )
+        self._sync_tree(self.vale_tree, [
+            (f"val-{it.get('_line_id')}", (it.get('Producto',''), it.get('Lote',''), it.get('Ubicacion',''), it.get('Vencimiento',''), it.get('Cantidad','')), ())
+            for it in items
+        ])
+
+    def _vale_index(self, iid: str) -> int:
+        """Indice en ``manager.current_vale`` del item mostrado como ``iid``."""
+        vale = self.manager.current_vale
+        i = self._vale_iids.get(iid)
+        if i is None or i >= len(vale) or f"val-{vale[i].get('_line_id')}" != iid:
+            # La solicitud cambio desde el ultimo indice: se rearma
+            self._vale_iids = {f"val-{it.get('_line_id')}": k for k, it in enumerate(vale)}
+            i = self._vale_iids.get(iid)
+        if i is None:
+            raise KeyError(iid)
+        return i
+
+    def _tree_sync(self, tree: ttk.Treeview) -> TreeSync:
+        """Sincronizador de ``tree``; las zebra stripes se asignan al insertar,
+        respetando los tags de vencimiento."""
+        sync = self._tree_syncs.get(str(tree))
+        if sync is None:
             tree.tag_configure('evenrow', background='#ffffff')
             tree.tag_configure('oddrow', background='#f7f7f7')
-            for n, iid in enumerate(tree.get_children()):
-                # Verificar si tiene tag de vencimiento
-                current_tags = tree.item(iid, 'tags')
-                if current_tags and ('vencimiento_proximo' in current_tags or 'vencido' in current_tags):
-                    # Mantener el tag de vencimiento
-                    continue
-                else:
-                    # Aplicar zebra stripe
-                    tree.item(iid, tags=('evenrow' if n % 2 == 0 else 'oddrow',))
-        except Exception:
-            pass
+            sync = self._tree_syncs[str(tree)] = TreeSync(
+                tree, stripes=('evenrow', 'oddrow'), keep=('vencimiento_proximo', 'vencido'),
+            )
+        return sync
+
+    def _sync_tree(self, tree: ttk.Treeview, rows: list) -> None:
+        """Lleva ``tree`` a ``rows`` ``[(iid, valores, tags)]`` con cambios minimos."""
+        self._tree_sync(tree).apply(rows)
 
     def _activate_search_entry(self) -> None:
         try:
@@ -2182,7 +3024,7 @@ class ValeConsumoApp:
         self.mgr_search_var = tk.StringVar(value='')
         e_msrch = ttk.Entry(top, textvariable=self.mgr_search_var, width=28, font=('Segoe UI', 10))
         e_msrch.grid(row=0, column=6, sticky='e')
-        self.mgr_search_var.trace_add('write', lambda *_: self._schedule_refresh_manager())
+        self.mgr_search_var.trace_add('write', lambda *_: self.ui_refresh.invalidate('manager', 200))
 
 
         cols = ("Numero","Estado","Fecha","Archivo","Items")
@@ -2194,16 +3036,19 @@ class ValeConsumoApp:
             ('Archivo', 520, 'w', True),
             ('Items', 80, 'center', False),
         ):
-            self.mgr_tree.heading(
-                c,
-                text=c,
-                command=lambda col=c: self._sort_treeview(self.mgr_tree, col),
-            )
+            self.mgr_tree.heading(c, text=c)
             self.mgr_tree.column(c, width=w, anchor=anc, stretch=st)
+        self._bind_table_sort(self.mgr_tree, self._render_manager)
         self.mgr_tree.grid(row=1, column=0, sticky='nsew')
-        vbar = ttk.Scrollbar(frame, orient='vertical', command=self.mgr_tree.yview)
+        vbar = ttk.Scrollbar(frame, orient='vertical')
         vbar.grid(row=1, column=1, sticky='ns')
-        self.mgr_tree.configure(yscrollcommand=vbar.set)
+        self.mgr_tree.tag_configure('evenrow', background='#ffffff')
+        self.mgr_tree.tag_configure('oddrow', background='#f7f7f7')
+        self.mgr_table = VirtualTable(
+            self.mgr_tree, vbar,
+            lambda pos, start: self._registry_rows(self._mgr_entries, pos, start),
+            lambda iid: self._registry_locate('_mgr_entries', iid),
+        )
 
         # Acciones
         act = ttk.Frame(frame)
@@ -2267,49 +3112,35 @@ class ValeConsumoApp:
         self.mgr_btn_reload_edit.pack(side='left', padx=(0, 8))
 
         self._mgr_clear_editor()
-        self.mgr_tree.bind('<<TreeviewSelect>>', lambda _e: self._mgr_load_selected_vale())
-
-    def _schedule_refresh_manager(self) -> None:
-        if self._mgr_after_id:
-            try:
-                self.master.after_cancel(self._mgr_after_id)
-            except Exception:
-                pass
-        self._mgr_after_id = self.master.after(200, self.refresh_manager)
+        self.mgr_tree.bind('<<TreeviewSelect>>', lambda _e: self._mgr_load_selected_vale(force=False), add='+')
 
     def refresh_manager(self) -> None:
-        self._mgr_after_id = None
+        self.ui_refresh.render_now('manager')
+
+    def _manager_view(self):
+        """Render de la vista 'manager': consulta y dibujo en cuadros distintos."""
+        self._ensure_registry_indexed()
+        estado = self.mgr_estado.get() if hasattr(self, 'mgr_estado') else '(Todos)'
         try:
-            for i in self.mgr_tree.get_children():
-                self.mgr_tree.delete(i)
-            estado = self.mgr_estado.get() if hasattr(self, 'mgr_estado') else '(Todos)'
-            entries = self.registry.list(None if estado in (None,'', '(Todos)') else estado)
-            if not entries:
-                try:
-                    if os.path.isdir(self.history_dir) and any(fn.lower().endswith('.pdf') for fn in os.listdir(self.history_dir)):
-                        self.registry.reindex()
-                        entries = self.registry.list(None if estado in (None,'', '(Todos)') else estado)
-                except Exception:
-                    pass
-            # Filtrar por búsqueda
-            try:
-                term = (self.mgr_search_var.get() if hasattr(self, 'mgr_search_var') else '').strip().lower()
-            except Exception:
-                term = ''
-            if term:
-                def _hit(e):
-                    return (
-                        term in str(e.get('number', '')).lower() or
-                        term in str(e.get('status', '')).lower() or
-                        term in str(e.get('created_at', '')).lower() or
-                        term in str(e.get('pdf', '')).lower()
-                    )
-                entries = [e for e in entries if _hit(e)]
-            for e in entries:
-                self.mgr_tree.insert('', 'end', iid=str(e.get('number')), values=(e.get('number'), e.get('status'), e.get('created_at'), e.get('pdf'), e.get('items_count')))
-            self._apply_stripes(self.mgr_tree)
+            term = self.mgr_search_var.get() if hasattr(self, 'mgr_search_var') else ''
         except Exception:
-            pass
+            term = ''
+        yield
+        entries = self.registry.query(
+            None if estado in (None, '', '(Todos)') else estado,
+            term=term,
+            sort=self._registry_sort(self.mgr_tree),
+        )
+        yield
+        self._mgr_entries = entries
+        self._show_registry_entries('_mgr_entries', self.mgr_table)
+
+    def _render_manager(self, col: Optional[str] = None, extend: bool = False) -> None:
+        """Clic en encabezado: el registro vuelve a ordenar y la lista vuelve al inicio."""
+        self._sort_spec(self.mgr_tree, col, extend)
+        if self.mgr_table is not None:
+            self.mgr_table.offset = 0
+        self.ui_refresh.invalidate('manager')
 
     def _mgr_clear_editor(self) -> None:
         self._mgr_edit_number = None
@@ -2358,12 +3189,15 @@ class ValeConsumoApp:
             )
             self.mgr_items_tree.insert('', 'end', iid=f'it-{i}', values=values)
 
-    def _mgr_load_selected_vale(self) -> None:
+    def _mgr_load_selected_vale(self, force: bool = True) -> None:
         nums = self._mgr_selected_numbers()
         if not nums:
             self._mgr_clear_editor()
             return
         number = nums[0]
+        if not force and self._mgr_edit_number is not None and int(self._mgr_edit_number) == number:
+            # Ya cargado (p. ej. la seleccion volvio a la ventana visible al desplazar)
+            return
         entry = self.registry.find_by_number(number)
         if not entry:
             self._mgr_clear_editor()
@@ -2452,6 +3286,19 @@ class ValeConsumoApp:
             return
         self._mgr_render_items()
 
+    def _product_picker_search(self, df: pd.DataFrame) -> RowSearch:
+        """Claves de busqueda del selector de productos; se arman una vez por carga.
+
+        Las claves no incluyen el stock, asi que los cambios de stock no las invalidan.
+        """
+        cached = self._picker_search
+        if cached is not None and cached[0] == self._inventory_load and len(cached[1]) == len(df):
+            cached[1].search('')
+            return cached[1]
+        search = RowSearch.from_frame(df)
+        self._picker_search = (self._inventory_load, search)
+        return search
+
     def _mgr_change_item_product(self) -> None:
         sel = self.mgr_items_tree.focus()
         if not sel or not sel.startswith('it-'):
@@ -2489,7 +3336,7 @@ class ValeConsumoApp:
         search_entry = ttk.Entry(top, textvariable=search_var, width=40, font=('Segoe UI', 10))
         search_entry.pack(side='left', padx=(8, 0))
 
-        info_var = tk.StringVar(value='Mostrando hasta 500 resultados.')
+        info_var = tk.StringVar(value='')
         ttk.Label(top, textvariable=info_var, font=('Segoe UI', 9)).pack(side='right')
 
         cols = ("Producto", "Codigo", "Lote", "Bodega", "Ubicacion", "Vencimiento", "Stock")
@@ -2510,50 +3357,25 @@ class ValeConsumoApp:
             tree.heading(c, text=c)
             tree.column(c, width=w, anchor=anc, stretch=(c == "Producto"))
         tree.grid(row=0, column=0, sticky='nsew')
-        vbar = ttk.Scrollbar(tree_frame, orient='vertical', command=tree.yview)
+        vbar = ttk.Scrollbar(tree_frame, orient='vertical')
         vbar.grid(row=0, column=1, sticky='ns')
-        tree.configure(yscrollcommand=vbar.set)
-
-        def _filter_rows(term: str) -> pd.DataFrame:
-            if not term:
-                return df
-            term_l = term.lower()
-            mask = (
-                df["Nombre_del_Producto"].astype(str).str.lower().str.contains(term_l, na=False, regex=False)
-                | df["Codigo"].astype(str).str.lower().str.contains(term_l, na=False, regex=False)
-                | df["Lote"].astype(str).str.lower().str.contains(term_l, na=False, regex=False)
-                | df["Bodega"].astype(str).str.lower().str.contains(term_l, na=False, regex=False)
-                | df["Ubicacion"].astype(str).str.lower().str.contains(term_l, na=False, regex=False)
-            )
-            return df[mask]
-
-        def _render(term: str = "") -> None:
-            try:
-                for iid in tree.get_children():
-                    tree.delete(iid)
-            except Exception:
-                pass
-            result = _filter_rows(term)
-            limited = result.head(500)
-            info_var.set(f"Mostrando {len(limited)} de {len(result)} resultados.")
-            for idx, row in limited.iterrows():
-                tree.insert(
-                    '',
-                    'end',
-                    iid=str(idx),
-                    values=(
-                        _clean(row.get("Nombre_del_Producto", "")),
-                        _clean(row.get("Codigo", "")),
-                        _clean(row.get("Lote", "")),
-                        _clean(row.get("Bodega", "")),
-                        _clean(row.get("Ubicacion", "")),
-                        _clean(row.get("Vencimiento", "")),
-                        _clean(row.get("Stock", "")),
-                    ),
-                )
+        tree.tag_configure('vencido', background='#ffb3b3', foreground='#b00000')
+        tree.tag_configure('vencimiento_proximo', background='#cfe5ff', foreground='#004a99')
+        tree.tag_configure('evenrow', background='#ffffff')
+        tree.tag_configure('oddrow', background='#f7f7f7')
+        # Mismas columnas que la tabla de productos: se reutilizan sus filas; todos
+        # los resultados quedan navegables y solo se dibuja la ventana visible
+        table = VirtualTable(tree, vbar, self._product_rows, self._product_position)
+        search = self._product_picker_search(df)
+
+        def _render():
+            # Revisa las claves por bloques; cada bloque cede el cuadro
+            positions = yield from search.scan(search_var.get())
+            table.set_positions(positions)
+            info_var.set(f"{len(positions)} de {len(df)} productos.")
 
         def _apply_selection() -> None:
-            sel_iid = tree.focus()
+            sel_iid = table.focus()
             if not sel_iid:
                 messagebox.showwarning('Cambiar Producto', 'Seleccione un producto.')
                 return
@@ -2593,10 +3415,10 @@ class ValeConsumoApp:
             self._mgr_render_items()
             dlg.destroy()
 
-        def _on_search(*_args) -> None:
-            _render(search_var.get().strip())
-
-        search_var.trace_add('write', _on_search)
+        # Cada tecla solo marca la lista; se filtra 120 ms despues de la ultima
+        self.ui_refresh.register('product_picker', _render, priority=0)
+        search_var.trace_add('write', lambda *_: self.ui_refresh.invalidate('product_picker', 120))
+        dlg.bind('<Destroy>', lambda e: self.ui_refresh.unregister('product_picker') if e.widget is dlg else None)
         tree.bind('<Double-1>', lambda _e: _apply_selection())
 
         btns = ttk.Frame(dlg, padding=10)
@@ -2604,7 +3426,7 @@ class ValeConsumoApp:
         ttk.Button(btns, text='Seleccionar', command=_apply_selection).pack(side='left')
         ttk.Button(btns, text='Cancelar', command=dlg.destroy).pack(side='right')
 
-        _render("")
+        self.ui_refresh.render_now('product_picker')
         search_entry.focus_set()
 
     def _mgr_save_edit(self) -> None:
@@ -2659,8 +3481,7 @@ class ValeConsumoApp:
             self.registry.update_entry(int(self._mgr_edit_number), items_count=len(self._mgr_edit_items))
         except Exception:
             pass
-        self.refresh_manager()
-        self.refresh_history()
+        self._invalidate_registry_views()
         messagebox.showinfo('Guardar', 'Vale actualizado correctamente.')
 
 
@@ -2683,8 +3504,7 @@ class ValeConsumoApp:
     def _mgr_reindex(self) -> None:
         try:
             res = self.registry.reindex()
-            self.refresh_manager()
-            self.refresh_history()
+            self._invalidate_registry_views()
             try:
                 messagebox.showinfo('Reindexar', f"Agregados: {res.get('added',0)}\nOmitidos: {res.get('skipped',0)}")
             except Exception:
@@ -2693,7 +3513,7 @@ class ValeConsumoApp:
             messagebox.showerror('Reindexar', f'No se pudo reindexar: {e}')
     def _mgr_selected_numbers(self) -> list[int]:
         try:
-            return [int(i) for i in self.mgr_tree.selection()]
+            return [int(i) for i in self.mgr_table.selection()]
         except Exception:
             return []
 
@@ -2705,8 +3525,7 @@ class ValeConsumoApp:
         try:
             changed = self.registry.update_status(nums, new_status)
             if changed:
-                self.refresh_manager()
-                self.refresh_history()
+                self._invalidate_registry_views()
         except Exception as e:
             messagebox.showerror('Manager Solicitudes', f'No se pudo actualizar el estado: {e}')
 
@@ -2748,35 +3567,35 @@ class ValeConsumoApp:
         except Exception as e:
             messagebox.showerror('Listado', f'Error al generar PDF: {e}')
 
-    def remove_from_vale(self) -> None:
+    def remove_from_vale(self) -> list[str]:
         sel = self.vale_tree.focus()
         if not sel or not sel.startswith('val-'):
             messagebox.showwarning('Solicitud', 'Seleccione un item de la solicitud.')
-            return
+            return []
         try:
-            idx = int(sel.split('-')[1])
+            idx = self._vale_index(sel)
             self.manager.remove_from_vale(idx)
-            self._inventory_rev += 1
+            changes = self._on_stock_changed()
             self.log.info("Item removido del vale idx=%s", idx)
         except Exception as e:
             self.log.warning("No se pudo remover item: %s", e)
             messagebox.showerror('Eliminar', str(e))
-            return
+            return []
         self.update_vale_treeview()
-        self.filter_products()
+        return self._patch_product_rows(changes)
 
-    def edit_vale_item(self) -> None:
+    def edit_vale_item(self) -> list[str]:
         sel = self.vale_tree.focus()
         if not sel or not sel.startswith('val-'):
             messagebox.showwarning('Solicitud', 'Seleccione un item de la solicitud.')
-            return
+            return []
         try:
-            idx = int(sel.split('-')[1])
+            idx = self._vale_index(sel)
             item = self.manager.current_vale[idx]
             current_qty = int(item.get('Cantidad', 0))
         except Exception:
             messagebox.showerror('Editar', 'No se pudo leer el item seleccionado.')
-            return
+            return []
         new_qty = simpledialog.askinteger(
             "Editar Cantidad",
             "Nueva cantidad:",
@@ -2784,22 +3603,22 @@ class ValeConsumoApp:
             minvalue=1,
         )
         if new_qty is None:
-            return
+            return []
         try:
             self.manager.update_vale_quantity(idx, int(new_qty))
-            self._inventory_rev += 1
+            changes = self._on_stock_changed()
         except Exception as e:
             messagebox.showerror('Editar', str(e))
-            return
+            return []
         self.update_vale_treeview()
-        self.filter_products()
+        return self._patch_product_rows(changes)
 
-    def clear_vale(self) -> None:
+    def clear_vale(self) -> list[str]:
         self.manager.clear_vale()
-        self._inventory_rev += 1
+        changes = self._on_stock_changed()
         self.log.info("Vale en curso limpiado (se restauro stock)")
         self.update_vale_treeview()
-        self.filter_products()
+        return self._patch_product_rows(changes)
 
     def _schedule_preview_cleanup(self, path: str, delay_sec: int = 900) -> None:
         def _worker() -> None:
@@ -2843,6 +3662,7 @@ class ValeConsumoApp:
             messagebox.showerror('Previsualizacion', f'No se pudo generar la previsualizacion: {e}')
 
     def generate_and_print_vale(self) -> None:
+        """Valida y encola la solicitud; PDF, JSON, registro e impresion corren en segundo plano."""
         if not self.manager.current_vale:
             messagebox.showwarning('Solicitud', 'No hay productos en la solicitud.')
             return
@@ -2856,83 +3676,97 @@ class ValeConsumoApp:
         if not usuario_bodega:
             messagebox.showwarning('Solicitud', 'Debe seleccionar un usuario de bodega.')
             return
-        
-        if not os.path.exists(self.history_dir):
-            os.makedirs(self.history_dir, exist_ok=True)
-        ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-        # Reservar numero para nombrar el archivo
+
         try:
-            number = self.registry.next_number()
+            copias = max(1, int(self.copias_var.get()))
         except Exception:
-            number = None
-        if number is not None:
-            padded = f"{int(number):03d}"
-            base_pdf = f"solicitud_{padded}_{ts}.pdf"
-            base_json = f"solicitud_{padded}_{ts}.json"
-        else:
-            base_pdf = f"solicitud_{ts}.pdf"
-            base_json = f"solicitud_{ts}.json"
-        filename = os.path.join(self.history_dir, base_pdf)
+            copias = 1
+        job = ValeJob(
+            solicitante=solicitante,
+            usuario_bodega=usuario_bodega,
+            items=copy.deepcopy(self.manager.current_vale),
+            history_dir=self.history_dir,
+            registry=self.registry,
+            copies=copias,
+            print_pdf=bool(WINDOWS_OS),
+            inventory_load=self._inventory_load,
+        )
+        self._vale_pipeline.submit(job)
+        # La solicitud queda libre para la siguiente; si el PDF falla se devuelven los items
+        self.manager.current_vale = []
+        self.update_vale_treeview()
+        self._set_vale_pipeline_status('Solicitud en cola...')
+        if self._vale_poll_after_id is None:
+            self._vale_poll_after_id = self.master.after(100, self._poll_vale_pipeline)
+
+    def _set_vale_pipeline_status(self, text: str) -> None:
+        pending = self._vale_pipeline.pending
+        if pending > 1:
+            text = f'{text}\n({pending} solicitudes en proceso)'
         try:
-            # Agregar información de solicitante y usuario al vale
-            vale_data_with_users = {
-                'solicitante': solicitante,
-                'usuario_bodega': usuario_bodega,
-                'numero_correlativo': padded if number is not None else '',
-                'items': self.manager.current_vale
-            }
-            
-            # Generar PDF (via ValeManager -> pdf_utils)
-            from pdf_utils import build_vale_pdf
-            build_vale_pdf(filename, vale_data_with_users, datetime.now())
-            
-            # Guardar datos estructurados del vale (sidecar JSON)
-            try:
-                import json
-                sidecar = os.path.join(self.history_dir, base_json)
-                payload = {
-                    'filename': os.path.basename(filename),
-                    'emission_time': datetime.now().isoformat(timespec='seconds'),
-                    'solicitante': solicitante,
-                    'usuario_bodega': usuario_bodega,
-                    'numero_correlativo': padded if number is not None else '',
-                    'items': self.manager.current_vale,
-                }
-                with open(sidecar, 'w', encoding='utf-8') as f:
-                    json.dump(payload, f, ensure_ascii=False, indent=2)
-            except Exception:
-                sidecar = ''
-            
-            # Obtener cantidad de copias
-            copias = max(1, int(self.copias_var.get()))
-            
-            # Impresion directa (sin abrir PDF viewer)
-            if WINDOWS_OS:
-                print_pdf_windows(filename, copies=copias, preview=True)
-            
-            messagebox.showinfo('Solicitud Generada', f'Solicitud N° {padded if number is not None else "N/A"} generada correctamente.\n{copias} copia(s) enviada(s) a la impresora.')
-            
-            # Registrar en el indice con el numero reservado y refrescar vistas
-            try:
-                if number is not None:
-                    self.registry.register_with_number(
-                        int(number),
-                        os.path.basename(filename),
-                        os.path.basename(sidecar) if sidecar else '',
-                        len(self.manager.current_vale),
-                    )
-            except Exception:
-                pass
-            # Limpiar vale e historial
-            self.manager.current_vale = []
+            if self.vale_pipeline_var is not None:
+                self.vale_pipeline_var.set(text)
+        except Exception:
+            pass
+
+    def _poll_vale_pipeline(self) -> None:
+        self._vale_poll_after_id = None
+        try:
+            while True:
+                kind, job, stage, message = self._vale_events.get_nowait()
+                if kind == 'stage':
+                    self._set_vale_pipeline_status(f'Solicitud N° {job.label}: {STAGE_LABELS.get(stage, stage)}...')
+                elif kind == 'registered':
+                    try:
+                        self._registry_entry_added(job.entry)
+                    except Exception:
+                        self._invalidate_registry_views()
+                elif kind == 'warning':
+                    self.log.warning('Solicitud %s, etapa %s: %s', job.label, stage, message)
+                    if stage == 'print':
+                        messagebox.showerror('Error de Impresion', f'Solicitud N° {job.label}:\n{message}')
+                elif kind == 'error':
+                    # El PDF no se genero: los productos vuelven a la solicitud actual
+                    self._restore_failed_job(job, message)
+                elif kind == 'done' and not job.failed:
+                    text = f'Solicitud N° {job.label} generada.'
+                    if job.print_message:
+                        text += f'\n{job.copies} copia(s) enviada(s) a la impresora.'
+                    if job.warnings:
+                        text += '\n' + '\n'.join(job.warnings)
+                    self._set_vale_pipeline_status(text)
+        except queue.Empty:
+            pass
+        if self._vale_pipeline.pending or not self._vale_events.empty():
+            self._vale_poll_after_id = self.master.after(120, self._poll_vale_pipeline)
+
+    def _restore_failed_job(self, job: ValeJob, message: str) -> None:
+        if job.inventory_load == self._inventory_load:
+            # Mismas filas: su stock sigue descontado
+            self.manager.restore_items(job.items)
             self.update_vale_treeview()
-            self.refresh_history()
-            try:
-                self.refresh_manager()
-            except Exception:
-                pass
+            messagebox.showerror(
+                'Generar Solicitud',
+                f'Ocurrio un error: {message}\nLos productos volvieron a la solicitud.',
+            )
+            return
+        # El inventario se recargo mientras se generaba: se vuelven a ubicar las filas
+        try:
+            missing = self.manager.readd_items(job.items)
         except Exception as e:
-            messagebox.showerror('Generar Solicitud', f'Ocurrio un error: {e}')
+            self.log.warning('No se pudieron reubicar los productos de la solicitud %s: %s', job.label, e)
+            missing = list(job.items)
+        changes = self._on_stock_changed()
+        self.update_vale_treeview()
+        self._patch_product_rows(changes)
+        text = f'Ocurrio un error: {message}\nEl inventario se recargo mientras se generaba la solicitud.'
+        if len(missing) < len(job.items):
+            text += '\nLos productos encontrados en el inventario actual volvieron a la solicitud.'
+        if missing:
+            lines = '\n'.join(f"- {it['Producto']} (lote {it['Lote']}): {it['Cantidad']}" for it in missing[:10])
+            more = f'\n... y {len(missing) - 10} mas' if len(missing) > 10 else ''
+            text += f'\nNo se encontraron o no tienen stock suficiente:\n{lines}{more}'
+        messagebox.showerror('Generar Solicitud', text)
 
     def _write_vale_sidecar(self, timestamp: str, payload: dict) -> None:
         try:
@@ -2961,11 +3795,40 @@ class ValeConsumoApp:
             messagebox.showerror(title, f"No se pudo abrir el archivo: {e}")
 
 
-def run_app() -> None:
+def open_main_window() -> tk.Tk:
+    """Crea la ventana principal y la muestra de inmediato con un aviso de carga.
+
+    La interfaz completa (y con ella numpy/pandas) se arma despues, con la
+    ventana ya visible.
+    """
     root = tk.Tk()
-    _ = ValeConsumoApp(root)
+    STARTUP.mark('tk')
+    root.title("Solicitu Prod")
+    try:
+        root.state('zoomed')
+    except Exception:
+        root.geometry('1280x800')
+    splash = ttk.Label(root, text='Cargando...', padding=24)
+    splash.grid(row=0, column=0)
+    root.update()
+    STARTUP.mark('ventana')
+    splash.destroy()
+    return root
+
+
+def run_app() -> None:
+    STARTUP.mark('imports')
+    root = open_main_window()
+    app = ValeConsumoApp(root)
+    STARTUP.mark('interfaz')
+    app.log.info(STARTUP.report())
     root.mainloop()
+    app._finish_ui_latency()
+    # Las solicitudes ya encoladas terminan de generarse y registrarse
+    app._vale_pipeline.shutdown(timeout=120)
 
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
     run_app()
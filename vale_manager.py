@@ -5,13 +5,17 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
+import itertools
 import logging
-from typing import List, Optional, TypedDict, Callable
-
-import pandas as pd
+from typing import List, Optional, Sequence, Tuple, TypedDict, Callable, Union
 
+from config import EXPIRY_BUCKET_DAYS
 from data_loader import load_inventory
-from pdf_utils import build_vale_pdf
+from inventory_index import InventoryIndex, prepare_search_columns, route_order
+from startup import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +30,52 @@ class ValeItem(TypedDict):
     Cantidad: int
     Stock: int
     Stock_Original_Index: int
+    # Identificador estable de la linea en la sesion (iid en la vista); no se persiste
+    _line_id: int
+
+
+# Los ids no se reutilizan aunque la linea se libere (a diferencia de id())
+_LINE_IDS = itertools.count(1)
+
+
+def public_item(item: dict) -> dict:
+    """Linea sin las claves internas (``_line_id``...) para JSON y exportaciones."""
+    return {k: v for k, v in item.items() if not str(k).startswith('_')}
+
+
+@dataclass
+class Allocation:
+    """Resultado de :meth:`ValeManager.allocate`."""
+
+    lines: List[ValeItem] = field(default_factory=list)
+    # (codigo_o_producto pedido, cantidad no cubierta)
+    shortfall: List[Tuple[str, int]] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.shortfall
+
+
+def sort_by_route(items: Sequence[dict]) -> list:
+    """Lineas (con clave ``Ubicacion``) en orden de recorrido de bodega.
+
+    Sirve tanto para la solicitud actual como para listas de picking
+    consolidadas de varios vales.
+    """
+    items = list(items)
+    order = route_order([it.get('Ubicacion', '') for it in items])
+    return [items[i] for i in order]
 
 
 @dataclass
 class ValeManager:
-    bioplates_inventory: pd.DataFrame = field(default_factory=pd.DataFrame)
+    bioplates_inventory: pd.DataFrame = field(default_factory=lambda: pd.DataFrame())
     current_vale: List[ValeItem] = field(default_factory=list)
+    index: InventoryIndex = field(default_factory=InventoryIndex)
+    # Cambios de stock pendientes de consumir por la UI: (indice, stock_anterior, stock_nuevo)
+    stock_changes: List[Tuple[int, int, int]] = field(default_factory=list)
+    # Mantener current_vale en orden de recorrido (ver sort_by_route)
+    sort_by_route_enabled: bool = True
 
     def load(
         self,
@@ -44,8 +88,20 @@ class ValeManager:
         self.bioplates_inventory = load_inventory(
             file_path, area_filter, progress_cb=progress_cb, chunk_size=chunk_size
         )
+        prepare_search_columns(self.bioplates_inventory)
+        self.index = InventoryIndex.build(self.bioplates_inventory, EXPIRY_BUCKET_DAYS)
+        self.bioplates_inventory['_venc_bucket'] = self.index.bucket_series()
+        self.stock_changes = []
         return self.bioplates_inventory
 
+    def refresh_expiry(self) -> bool:
+        """Recalcula dias y tramos de vencimiento si cambio el dia (True si hubo cambio)."""
+        changed = self.index.refresh_days()
+        df = self.bioplates_inventory
+        if changed and self.index.matches(df):
+            df['_venc_bucket'] = self.index.bucket_series()
+        return changed
+
     def is_vale_empty(self) -> bool:
         return not self.current_vale
 
@@ -56,7 +112,7 @@ class ValeManager:
         if quantity > current_stock:
             raise ValueError(f"No hay suficiente stock. Stock disponible: {current_stock}")
 
-        self.bioplates_inventory.loc[item_index, 'Stock'] = current_stock - quantity
+        self._set_stock(item_index, current_stock, current_stock - quantity)
 
         new_item: ValeItem = {
             'Producto': str(product_data['Nombre_del_Producto']),
@@ -68,26 +124,169 @@ class ValeManager:
             'Cantidad': int(quantity),
             'Stock': int(current_stock),
             'Stock_Original_Index': int(item_index),
+            '_line_id': next(_LINE_IDS),
         }
 
+        it = self._same_line(new_item)
+        if it is not None:
+            it['Cantidad'] += int(quantity)
+            logger.debug(
+                "Consolidado item %s (lote %s) nueva cantidad=%s",
+                it['Producto'],
+                it['Lote'],
+                it['Cantidad'],
+            )
+            return it
+
+        logger.debug("Agregado item %s (lote %s) cantidad=%s", new_item['Producto'], new_item['Lote'], new_item['Cantidad'])
+        self.current_vale.append(new_item)
+        if self.sort_by_route_enabled:
+            self.sort_vale_by_route()
+        return new_item
+
+    def _same_line(self, item: ValeItem) -> Optional[ValeItem]:
+        """Linea de la solicitud con el mismo Producto, Lote y Ubicacion (o None)."""
         for it in self.current_vale:
             if (
-                it['Producto'] == new_item['Producto']
-                and it['Lote'] == new_item['Lote']
-                and it.get('Ubicacion', '') == new_item.get('Ubicacion', '')
+                it['Producto'] == item['Producto']
+                and it['Lote'] == item['Lote']
+                and it.get('Ubicacion', '') == item.get('Ubicacion', '')
             ):
-                it['Cantidad'] += int(quantity)
-                logger.debug(
-                    "Consolidado item %s (lote %s) nueva cantidad=%s",
-                    it['Producto'],
-                    it['Lote'],
-                    it['Cantidad'],
-                )
                 return it
+        return None
 
-        logger.debug("Agregado item %s (lote %s) cantidad=%s", new_item['Producto'], new_item['Lote'], new_item['Cantidad'])
-        self.current_vale.append(new_item)
-        return new_item
+    def restore_items(self, items: Sequence[ValeItem]) -> None:
+        """Devuelve a la solicitud lineas cuyo stock sigue descontado (p. ej. un
+        vale que no se pudo generar), consolidando con las lineas actuales."""
+        for item in items:
+            it = self._same_line(item)
+            if it is not None:
+                it['Cantidad'] += int(item['Cantidad'])
+            else:
+                item.setdefault('_line_id', next(_LINE_IDS))
+                self.current_vale.append(item)
+        if self.sort_by_route_enabled:
+            self.sort_vale_by_route()
+
+    def readd_items(self, items: Sequence[ValeItem]) -> List[ValeItem]:
+        """Vuelve a agregar lineas tomadas de un inventario que ya se recargo.
+
+        El descuento de stock de esas lineas se perdio con la recarga, asi que
+        cada una se ubica de nuevo por Producto, Lote y Ubicacion y se descuenta
+        con :meth:`add_to_vale`. Devuelve las lineas que no se pudieron agregar
+        (la fila ya no existe o no tiene stock suficiente).
+        """
+        df = self.bioplates_inventory
+        if df is None or df.empty:
+            return list(items)
+        productos = df['Nombre_del_Producto'].astype(str)
+        lotes = df['Lote'].astype(str)
+        ubicaciones = df['Ubicacion'].astype(str) if 'Ubicacion' in df.columns else None
+        missing: List[ValeItem] = []
+        for item in items:
+            qty = int(item['Cantidad'])
+            mask = (productos == item['Producto']) & (lotes == item['Lote'])
+            if ubicaciones is not None:
+                mask &= ubicaciones == item.get('Ubicacion', '')
+            rows = df.index[mask.to_numpy() & (df['Stock'].to_numpy() >= qty)]
+            if not len(rows):
+                missing.append(item)
+                continue
+            self.add_to_vale(rows[0], qty)
+        return missing
+
+    def sort_vale_by_route(self) -> None:
+        """Reordena la solicitud actual segun el recorrido de bodega."""
+        if len(self.current_vale) > 1:
+            self.current_vale[:] = sort_by_route(self.current_vale)
+
+    def allocate(
+        self,
+        request: Union[str, Sequence[Tuple[str, int]]],
+        quantity: Optional[int] = None,
+        include_expired: bool = False,
+    ) -> Allocation:
+        """Reparte cantidades entre lotes/ubicaciones por vencimiento (FEFO).
+
+        ``request`` es un codigo o nombre de producto (con ``quantity``) o una
+        lista de lineas ``(codigo_o_producto, cantidad)``. Todas las lineas se
+        resuelven en una sola pasada vectorizada sobre las filas pre-ordenadas
+        del indice; los lotes vencidos se omiten salvo ``include_expired``.
+        """
+        if isinstance(request, str):
+            if quantity is None:
+                raise ValueError("Indique la cantidad a asignar.")
+            lines = [(request, quantity)]
+        else:
+            lines = list(request)
+        wanted: dict = {}
+        for key, qty in lines:
+            if int(qty) <= 0:
+                raise ValueError("La cantidad debe ser mayor a 0.")
+            k = str(key).strip()
+            wanted[k] = wanted.get(k, 0) + int(qty)
+
+        result = Allocation()
+        df = self.bioplates_inventory
+        if df is None or df.empty or not self.index.matches(df):
+            result.shortfall = list(wanted.items())
+            return result
+
+        keys = list(wanted)
+        groups = [self.index.fefo_rows(k) for k in keys]
+        if not include_expired:
+            self.refresh_expiry()
+            groups = [g[self.index.venc_days[g] >= 0] for g in groups]
+        sizes = np.array([len(g) for g in groups], dtype=np.int64)
+        want = np.array([wanted[k] for k in keys], dtype=np.int64)
+        take = np.empty(0, dtype=np.int64)
+        pos = np.empty(0, dtype=np.int64)
+        if sizes.sum():
+            pos = np.concatenate(groups)
+            gid = np.repeat(np.arange(len(keys)), sizes)
+            stock_all = np.clip(df['Stock'].to_numpy(dtype=np.int64), 0, None)
+            if len(np.unique(pos)) == len(pos):
+                stock = stock_all[pos]
+                # Stock acumulado previo a cada fila dentro de su grupo (orden FEFO)
+                prefix = np.concatenate(([0], np.cumsum(stock)))
+                starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+                before = prefix[:-1] - prefix[starts][gid]
+                take = np.clip(want[gid] - before, 0, stock)
+            else:
+                # Pedidos que comparten filas (p. ej. mismo producto por codigo y
+                # por nombre): se descuentan en orden sobre un stock comun
+                take = np.empty(len(pos), dtype=np.int64)
+                start = 0
+                for g, w in zip(groups, want):
+                    avail = stock_all[g]
+                    t = np.clip(w - (np.cumsum(avail) - avail), 0, avail)
+                    stock_all[g] -= t
+                    take[start:start + len(g)] = t
+                    start += len(g)
+            covered = np.bincount(gid, weights=take, minlength=len(keys)).astype(np.int64)
+        else:
+            covered = np.zeros(len(keys), dtype=np.int64)
+
+        seen = set()
+        labels = df.index
+        # Un solo reordenamiento por recorrido al final, no uno por linea
+        route, self.sort_by_route_enabled = self.sort_by_route_enabled, False
+        try:
+            for p, qty in zip(pos[take > 0], take[take > 0]):
+                item = self.add_to_vale(labels[int(p)], int(qty))
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    result.lines.append(item)
+        finally:
+            self.sort_by_route_enabled = route
+        if route and result.lines:
+            self.sort_vale_by_route()
+        result.shortfall = [(k, int(w - c)) for k, w, c in zip(keys, want, covered) if w > c]
+        logger.debug(
+            "Asignacion FEFO: %d pedidos -> %d lineas, %d con faltante",
+            len(keys), len(result.lines), len(result.shortfall),
+        )
+        return result
 
     def remove_from_vale(self, vale_index: int) -> ValeItem:
         item = self.current_vale.pop(vale_index)
@@ -108,9 +307,9 @@ class ValeManager:
         if delta > 0:
             if delta > current_stock:
                 raise ValueError(f"No hay suficiente stock. Stock disponible: {current_stock}")
-            self.bioplates_inventory.loc[stock_index, 'Stock'] = current_stock - delta
+            self._set_stock(stock_index, current_stock, current_stock - delta)
         else:
-            self.bioplates_inventory.loc[stock_index, 'Stock'] = current_stock + (-delta)
+            self._set_stock(stock_index, current_stock, current_stock + (-delta))
         item['Cantidad'] = int(new_quantity)
         logger.debug("Cantidad actualizada en vale idx=%s de %s a %s", vale_index, old_qty, new_quantity)
         return item
@@ -122,6 +321,7 @@ class ValeManager:
 
     def generate_pdf(self, filename: str, vale_data_with_users: Dict, emission_time: datetime) -> None:
         """Genera el PDF con la información del vale y usuarios."""
+        from pdf_utils import build_vale_pdf  # reportlab se carga al primer PDF
         build_vale_pdf(filename, vale_data_with_users, emission_time)
 
     def serialize_current_vale(self, emission_time: datetime) -> dict:
@@ -130,7 +330,7 @@ class ValeManager:
             'emission_time': emission_time.isoformat(timespec='seconds'),
             'item_count': self.total_items(),
             'total_quantity': self.total_quantity(),
-            'items': self.current_vale,
+            'items': [public_item(it) for it in self.current_vale],
         }
 
     def finalize_vale(self) -> None:
@@ -140,4 +340,14 @@ class ValeManager:
         stock_index = item['Stock_Original_Index']
         qty = int(item['Cantidad'])
         current = int(self.bioplates_inventory.loc[stock_index, 'Stock'])
-        self.bioplates_inventory.loc[stock_index, 'Stock'] = current + qty
+        self._set_stock(stock_index, current, current + qty)
+
+    def _set_stock(self, stock_index: int, old: int, new: int) -> None:
+        self.bioplates_inventory.loc[stock_index, 'Stock'] = new
+        self.stock_changes.append((int(stock_index), int(old), int(new)))
+        self.index.on_stock_change(stock_index, old, new)
+
+    def pop_stock_changes(self) -> List[Tuple[int, int, int]]:
+        """Devuelve y limpia los cambios de stock acumulados desde la ultima llamada."""
+        changes, self.stock_changes = self.stock_changes, []
+        return changes
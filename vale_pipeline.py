@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Generacion de solicitudes en segundo plano: PDF -> JSON -> registro -> impresion.
+
+Antes ``generate_and_print_vale`` reservaba el numero, armaba el PDF, escribia
+el JSON, imprimia y registraba en el hilo de Tk, y el operador esperaba con la
+ventana congelada. Ahora la interfaz solo valida, copia los items a un
+:class:`ValeJob` y lo encola; un unico hilo trabajador procesa los trabajos en
+orden de llegada (asi los correlativos y las impresiones respetan el orden de
+emision) y publica el avance de cada etapa en una ``queue.Queue`` que la
+interfaz lee con ``after()``, igual que la carga de inventario.
+
+Eventos publicados, siempre ``(tipo, job, etapa, mensaje)``:
+
+* ``stage``: empieza una etapa;
+* ``registered``: el vale quedo en el indice (``job.entry``);
+* ``warning``: fallo una etapa que no invalida la solicitud (JSON, registro,
+  impresion); el PDF ya existe;
+* ``error``: fallo el PDF; la solicitud no se genero;
+* ``done``: fin del trabajo (tambien tras ``warning``).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from printing_utils import PrintError, send_pdf_to_printer
+from vale_manager import public_item
+
+RENDER = 'render'
+PERSIST = 'persist'
+REGISTER = 'register'
+PRINT = 'print'
+
+STAGE_LABELS = {
+    RENDER: 'generando PDF',
+    PERSIST: 'guardando datos',
+    REGISTER: 'registrando',
+    PRINT: 'enviando a impresora',
+}
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ValeJob:
+    """Una solicitud por generar; los items son una copia tomada al encolar."""
+
+    solicitante: str
+    usuario_bodega: str
+    items: List[Dict[str, Any]]
+    history_dir: str
+    registry: Any
+    copies: int = 1
+    print_pdf: bool = False
+    job_id: int = 0
+    # Carga de inventario vigente al encolar: si cambio, Stock_Original_Index ya no apunta a las mismas filas
+    inventory_load: int = 0
+    # Completados por el trabajador
+    number: Optional[int] = None
+    filename: str = ''
+    sidecar: str = ''
+    entry: Optional[Dict[str, Any]] = None
+    print_message: str = ''
+    warnings: List[str] = field(default_factory=list)
+    failed: bool = False
+
+    @property
+    def label(self) -> str:
+        return f'{int(self.number):03d}' if self.number is not None else 'N/A'
+
+
+class ValePipeline:
+    """Cola FIFO de :class:`ValeJob` atendida por un hilo trabajador."""
+
+    def __init__(
+        self,
+        events: queue.Queue,
+        builder: Optional[Callable[[str, dict, datetime], None]] = None,
+        printer: Callable[..., str] = send_pdf_to_printer,
+    ) -> None:
+        self.events = events
+        self._builder = builder
+        self._printer = printer
+        self._jobs: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._next_id = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> int:
+        """Trabajos encolados o en proceso."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, job: ValeJob) -> int:
+        with self._lock:
+            self._next_id += 1
+            job.job_id = self._next_id
+            self._pending += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vale-pipeline', daemon=True)
+                self._thread.start()
+        self._jobs.put(job)
+        return job.job_id
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Termina el trabajador despues de los trabajos ya encolados."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._jobs.put(None)
+        thread.join(timeout)
+
+    # ---------------- Trabajador ----------------
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            try:
+                self._process(job)
+            except Exception as e:  # no deberia ocurrir: _process captura sus etapas
+                logger.exception('Fallo inesperado generando solicitud')
+                self._fail(job, RENDER, str(e))
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                self._emit('done', job, '', '')
+
+    def _emit(self, kind: str, job: ValeJob, stage: str, message: str) -> None:
+        self.events.put((kind, job, stage, message))
+
+    def _fail(self, job: ValeJob, stage: str, message: str) -> None:
+        job.failed = True
+        self._emit('error', job, stage, message)
+
+    def _warn(self, job: ValeJob, stage: str, message: str) -> None:
+        job.warnings.append(message)
+        self._emit('warning', job, stage, message)
+
+    def _process(self, job: ValeJob) -> None:
+        self._emit('stage', job, RENDER, STAGE_LABELS[RENDER])
+        try:
+            self._render(job)
+        except Exception as e:
+            # El numero reservado queda sin usar, como ocurria antes al fallar el PDF
+            logger.exception('No se pudo generar el PDF de la solicitud %s', job.label)
+            self._fail(job, RENDER, str(e))
+            return
+
+        self._emit('stage', job, PERSIST, STAGE_LABELS[PERSIST])
+        try:
+            self._persist(job)
+        except Exception as e:
+            logger.exception('No se pudo guardar el JSON de la solicitud %s', job.label)
+            job.sidecar = ''
+            self._warn(job, PERSIST, f'No se pudo guardar el detalle JSON: {e}')
+
+        if job.number is not None:
+            self._emit('stage', job, REGISTER, STAGE_LABELS[REGISTER])
+            try:
+                job.entry = job.registry.register_with_number(
+                    int(job.number),
+                    os.path.basename(job.filename),
+                    os.path.basename(job.sidecar) if job.sidecar else '',
+                    len(job.items),
+                )
+                self._emit('registered', job, REGISTER, '')
+            except Exception as e:
+                logger.exception('No se pudo registrar la solicitud %s', job.label)
+                self._warn(job, REGISTER, f'No se pudo registrar en el historial: {e}')
+
+        if job.print_pdf:
+            self._emit('stage', job, PRINT, STAGE_LABELS[PRINT])
+            try:
+                job.print_message = self._printer(job.filename, copies=job.copies, preview=True)
+            except PrintError as e:
+                self._warn(job, PRINT, str(e))
+            except Exception as e:
+                logger.exception('Fallo inesperado al imprimir la solicitud %s', job.label)
+                self._warn(job, PRINT, f'Fallo al enviar a la impresora: {e}')
+
+    def _render(self, job: ValeJob) -> None:
+        if not os.path.exists(job.history_dir):
+            os.makedirs(job.history_dir, exist_ok=True)
+        ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Reservar numero para nombrar el archivo (en el trabajador: respeta el orden)
+        try:
+            job.number = job.registry.next_number()
+        except Exception:
+            job.number = None
+        if job.number is not None:
+            base = f'solicitud_{job.label}_{ts}'
+        else:
+            base = f'solicitud_{ts}'
+        job.filename = os.path.join(job.history_dir, base + '.pdf')
+        job.sidecar = os.path.join(job.history_dir, base + '.json')
+        vale_data_with_users = {
+            'solicitante': job.solicitante,
+            'usuario_bodega': job.usuario_bodega,
+            'numero_correlativo': job.label if job.number is not None else '',
+            'items': job.items,
+        }
+        builder = self._builder
+        if builder is None:
+            from pdf_utils import build_vale_pdf
+            builder = build_vale_pdf
+        builder(job.filename, vale_data_with_users, datetime.now())
+
+    def _persist(self, job: ValeJob) -> None:
+        payload = {
+            'filename': os.path.basename(job.filename),
+            'emission_time': datetime.now().isoformat(timespec='seconds'),
+            'solicitante': job.solicitante,
+            'usuario_bodega': job.usuario_bodega,
+            'numero_correlativo': job.label if job.number is not None else '',
+            'items': [public_item(it) for it in job.items],
+        }
+        with open(job.sidecar, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
@@ -5,8 +5,16 @@ from __future__ import annotations
 
 import json
 import os
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from table_sort import fold_text
+
+# Orden por defecto de los listados: mas reciente primero
+DEFAULT_SORT: Tuple[Tuple[str, bool], ...] = (('created_at', True),)
+_INT_FIELDS = ('number', 'items_count')
+_SEARCH_FIELDS = ('number', 'status', 'created_at', 'pdf')
 
 
 class ValeRegistry:
@@ -33,6 +41,11 @@ class ValeRegistry:
         self.history_dir = history_dir
         self.index_path = os.path.join(history_dir, 'vales_index.json')
         self.data: Dict[str, Any] = {}
+        # Claves de busqueda en minusculas, paralelas a data['vales'] (None = por armar)
+        self._search_keys: Optional[List[str]] = None
+        self.revision = 0
+        # La generacion de solicitudes registra desde un hilo de fondo
+        self._lock = threading.RLock()
         self._load()
 
     # ---------------- Internals ----------------
@@ -52,89 +65,181 @@ class ValeRegistry:
             self.data = {}
         self.data.setdefault('sequence', 0)
         self.data.setdefault('vales', [])
+        self._touch()
+
+    def _touch(self) -> None:
+        """Invalida las claves de busqueda tras modificar vales existentes."""
+        self._search_keys = None
+        self.revision += 1
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        self.data['vales'].append(entry)
+        if self._search_keys is not None:
+            self._search_keys.append(self._search_key(entry))
+        self.revision += 1
+
+    @staticmethod
+    def _search_key(entry: Dict[str, Any]) -> str:
+        return '\x1f'.join(str(entry.get(k, '')).lower() for k in _SEARCH_FIELDS)
+
+    @staticmethod
+    def _sort_value(entry: Dict[str, Any], field: str):
+        value = entry.get(field)
+        if value is None or value == '':
+            return None
+        if field in _INT_FIELDS:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        if field == 'created_at':
+            return str(value)  # ISO: el orden de texto es el cronologico
+        return fold_text(value)
+
+    @classmethod
+    def sort_entries(cls, entries: List[Dict[str, Any]], sort: Sequence[Tuple[str, bool]] = DEFAULT_SORT) -> None:
+        """Ordena ``entries`` en sitio por ``[(campo, descendente)]`` (estable).
+
+        Numero e items como enteros, fecha ISO y texto sin acentos; los vacios
+        van al final en ambas direcciones.
+        """
+        for field, desc in reversed(list(sort)):
+            keyed = [(cls._sort_value(e, field), e) for e in entries]
+            present = [pair for pair in keyed if pair[0] is not None]
+            present.sort(key=lambda pair: pair[0], reverse=bool(desc))
+            entries[:] = [e for _k, e in present] + [e for k, e in keyed if k is None]
+
+    @classmethod
+    def precedes(cls, a: Dict[str, Any], b: Dict[str, Any], sort: Sequence[Tuple[str, bool]] = DEFAULT_SORT) -> bool:
+        """True si ``a`` va estrictamente antes que ``b`` segun ``sort``."""
+        for field, desc in sort:
+            ka, kb = cls._sort_value(a, field), cls._sort_value(b, field)
+            if ka == kb:
+                continue
+            if ka is None or kb is None:
+                return kb is None
+            return ka > kb if desc else ka < kb
+        return False
 
     def _save(self) -> None:
-        try:
-            with open(self.index_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+        with self._lock:
+            try:
+                with open(self.index_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.data, f, ensure_ascii=False, indent=2)
+            except Exception:
+                pass
 
     # ---------------- API pública ----------------
     def next_number(self) -> int:
-        n = int(self.data.get('sequence', 0)) + 1
-        self.data['sequence'] = n
-        self._save()
-        return n
+        with self._lock:
+            n = int(self.data.get('sequence', 0)) + 1
+            self.data['sequence'] = n
+            self._save()
+            return n
 
     def register_with_number(self, number: int, pdf_filename: str, json_filename: Optional[str], items_count: int) -> Dict[str, Any]:
         """Registra un vale usando un numero ya reservado.
 
         Asegura que la secuencia no quede por debajo del numero asignado.
         """
-        try:
-            cur_seq = int(self.data.get('sequence', 0))
-        except Exception:
-            cur_seq = 0
-        if number > cur_seq:
-            self.data['sequence'] = number
-        entry = {
-            'number': int(number),
-            'status': 'Pendiente',
-            'created_at': datetime.now().isoformat(timespec='seconds'),
-            'pdf': os.path.basename(pdf_filename),
-            'json': os.path.basename(json_filename) if json_filename else '',
-            'items_count': int(items_count),
-        }
-        self.data['vales'].append(entry)
-        self._save()
-        return entry
+        with self._lock:
+            try:
+                cur_seq = int(self.data.get('sequence', 0))
+            except Exception:
+                cur_seq = 0
+            if number > cur_seq:
+                self.data['sequence'] = number
+            entry = {
+                'number': int(number),
+                'status': 'Pendiente',
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'pdf': os.path.basename(pdf_filename),
+                'json': os.path.basename(json_filename) if json_filename else '',
+                'items_count': int(items_count),
+            }
+            self._append(entry)
+            self._save()
+            return entry
 
     def register_voucher(self, pdf_filename: str, json_filename: Optional[str], items_count: int) -> Dict[str, Any]:
-        number = self.next_number()
-        entry = {
-            'number': number,
-            'status': 'Pendiente',
-            'created_at': datetime.now().isoformat(timespec='seconds'),
-            'pdf': os.path.basename(pdf_filename),
-            'json': os.path.basename(json_filename) if json_filename else '',
-            'items_count': int(items_count),
-        }
-        self.data['vales'].append(entry)
-        self._save()
-        return entry
+        with self._lock:
+            number = self.next_number()
+            entry = {
+                'number': number,
+                'status': 'Pendiente',
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'pdf': os.path.basename(pdf_filename),
+                'json': os.path.basename(json_filename) if json_filename else '',
+                'items_count': int(items_count),
+            }
+            self._append(entry)
+            self._save()
+            return entry
+
+    def has_entries(self) -> bool:
+        with self._lock:
+            return bool(self.data.get('vales'))
 
     def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
-        items: List[Dict[str, Any]] = list(self.data.get('vales', []))
+        return self.query(status=status)
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        term: str = '',
+        sort: Sequence[Tuple[str, bool]] = DEFAULT_SORT,
+    ) -> List[Dict[str, Any]]:
+        """Vales filtrados por estado y texto, ya ordenados (una sola pasada).
+
+        ``term`` se busca en numero, estado, fecha y archivo; las claves en
+        minusculas se arman una vez y se reutilizan hasta que el registro cambie.
+        """
+        term = (term or '').strip().lower()
+        with self._lock:
+            vales: List[Dict[str, Any]] = self.data.get('vales', [])
+            if term:
+                if self._search_keys is None or len(self._search_keys) != len(vales):
+                    self._search_keys = [self._search_key(e) for e in vales]
+                items = [e for e, key in zip(vales, self._search_keys) if term in key]
+            else:
+                items = list(vales)
         if status:
             items = [x for x in items if x.get('status') == status]
-        # ordenar por fecha desc
-        def _key(e: Dict[str, Any]):
-            return e.get('created_at', '')
-        items.sort(key=_key, reverse=True)
+        self.sort_entries(items, sort or DEFAULT_SORT)
         return items
 
+    def matches(self, entry: Dict[str, Any], status: Optional[str] = None, term: str = '') -> bool:
+        """True si ``entry`` entraria en ``query(status, term)``."""
+        if status and entry.get('status') != status:
+            return False
+        term = (term or '').strip().lower()
+        return not term or term in self._search_key(entry)
+
     def update_status(self, numbers: List[int], new_status: str) -> int:
         count = 0
-        for e in self.data.get('vales', []):
-            if int(e.get('number', -1)) in numbers:
-                e['status'] = new_status
-                count += 1
-        if count:
-            self._save()
+        with self._lock:
+            for e in self.data.get('vales', []):
+                if int(e.get('number', -1)) in numbers:
+                    e['status'] = new_status
+                    count += 1
+            if count:
+                self._touch()
+                self._save()
         return count
 
     def update_entry(self, number: int, **updates: Any) -> bool:
         changed = False
-        for e in self.data.get('vales', []):
-            if int(e.get('number', -1)) == int(number):
-                for k, v in updates.items():
-                    if e.get(k) != v:
-                        e[k] = v
-                        changed = True
-                break
-        if changed:
-            self._save()
+        with self._lock:
+            for e in self.data.get('vales', []):
+                if int(e.get('number', -1)) == int(number):
+                    for k, v in updates.items():
+                        if e.get(k) != v:
+                            e[k] = v
+                            changed = True
+                    break
+            if changed:
+                self._touch()
+                self._save()
         return changed
 
     def find_by_number(self, number: int) -> Optional[Dict[str, Any]]:
@@ -157,6 +262,10 @@ class ValeRegistry:
 
         Devuelve {'added': n, 'skipped': m}
         """
+        with self._lock:
+            return self._reindex()
+
+    def _reindex(self) -> Dict[str, int]:
         added = 0
         skipped = 0
         try:
@@ -200,7 +309,7 @@ class ValeRegistry:
                 'json': (os.path.basename(base + '.json') if os.path.exists(jpath) else ''),
                 'items_count': items_count,
             }
-            self.data['vales'].append(entry)
+            self._append(entry)
             added += 1
         if added:
             self._save()
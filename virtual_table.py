@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tabla virtual sobre ``ttk.Treeview`` para listados de decenas de miles de filas.
+
+El modelo es un arreglo de posiciones (iloc) sobre el DataFrame de inventario;
+solo las filas visibles mas un margen (overscan) existen como items del
+Treeview. El desplazamiento lo maneja la tabla: la barra vertical, la rueda y
+las flechas mueven un offset sobre el arreglo y la ventana se reconcilia con
+los items existentes con :class:`tree_sync.TreeSync` (se reutilizan los que
+siguen visibles y solo se reescriben las filas que cambiaron).
+
+Los iids los define el origen de filas (p. ej. la etiqueta de la fila en el
+inventario), por lo que la seleccion y los tags se manejan igual que en un
+Treeview comun. Con ``selectmode='extended'`` la seleccion multiple se
+conserva aunque sus filas salgan de la ventana.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tkinter import ttk
+
+from tree_sync import TreeSync
+from startup import lazy_module
+
+np = lazy_module('numpy')
+
+# rows(posiciones, indice_de_despliegue_inicial) -> [(iid, valores, tags)]
+RowSource = Callable[['np.ndarray', int], Sequence[Tuple[str, tuple, tuple]]]
+# locate(iid) -> posicion (iloc) en el inventario, o None
+Locator = Callable[[str], Optional[int]]
+
+
+class VirtualTable:
+    """Ventana deslizante de filas sobre un ``ttk.Treeview`` existente."""
+
+    def __init__(
+        self,
+        tree: ttk.Treeview,
+        vsb: ttk.Scrollbar,
+        rows: RowSource,
+        locate: Locator,
+        overscan: int = 10,
+    ) -> None:
+        self.tree = tree
+        self.vsb = vsb
+        self._rows = rows
+        self._locate = locate
+        self.overscan = max(0, int(overscan))
+        self.positions = np.empty(0, dtype=np.int64)
+        # posicion (iloc) -> indice de despliegue; se reconstruye con cada cambio de positions
+        self._index_of: Dict[int, int] = {}
+        self.offset = 0
+        self._visible = 20
+        self._row_height = 0
+        self._rendered: List[str] = []
+        self._selected: Optional[str] = None
+        # Seleccion multiple (orden de seleccion); incluye filas fuera de la ventana
+        self._marked: Dict[str, None] = {}
+        self._click_extends = False
+        self._sync = TreeSync(tree)
+
+        vsb.configure(command=self._on_scrollbar)
+        tree.configure(yscrollcommand=lambda *_a: None)
+        tree.bind('<Configure>', self._on_configure, add='+')
+        tree.bind('<<TreeviewSelect>>', self._on_select, add='+')
+        for seq, extends in (('<Button-1>', False), ('<Control-Button-1>', True), ('<Shift-Button-1>', True)):
+            tree.bind(seq, lambda _e, x=extends: setattr(self, '_click_extends', x), add='+')
+        for seq in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            tree.bind(seq, self._on_wheel)
+        for seq, delta in (('<Up>', -1), ('<Down>', 1), ('<Prior>', 'page-'), ('<Next>', 'page+'),
+                           ('<Home>', 'home'), ('<End>', 'end')):
+            tree.bind(seq, lambda _e, d=delta: self._on_key(d))
+
+    # ---------------- Modelo ----------------
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def set_positions(self, positions: np.ndarray, keep_offset: bool = False) -> None:
+        """Reemplaza las filas mostradas; conserva la seleccion si sigue presente."""
+        self._set_model(np.asarray(positions, dtype=np.int64))
+        if not keep_offset:
+            self.offset = 0
+        if self._selected is not None and self._display_index(self._selected) is None:
+            self._selected = None
+        if self._marked:
+            self._marked = {iid: None for iid in self._marked if self._display_index(iid) is not None}
+        self._render()
+
+    def refresh(self) -> None:
+        """Relee del origen las filas de la ventana (p. ej. tras un cambio de stock)."""
+        self._render()
+
+    def exists(self, iid: str) -> bool:
+        return self._display_index(iid) is not None
+
+    def remove(self, iid: str) -> bool:
+        """Quita una fila del listado (sin volver a filtrar)."""
+        return self.remove_many([iid]) == 1
+
+    def remove_many(self, iids: Sequence[str]) -> int:
+        """Quita varias filas con un solo render; devuelve cuantas se quitaron."""
+        found = {}
+        for iid in iids:
+            k = self._display_index(iid)
+            if k is not None:
+                found[iid] = k
+        if not found:
+            return 0
+        self._set_model(np.delete(self.positions, list(found.values())))
+        if self._selected in found:
+            self._selected = None
+        for iid in found:
+            self._marked.pop(iid, None)
+        self._render()
+        return len(found)
+
+    # ---------------- Seleccion ----------------
+    def focus(self) -> str:
+        """Iid seleccionado (aunque su fila este fuera de la ventana), o ''."""
+        return self._selected or ''
+
+    def selection(self) -> List[str]:
+        """Iids seleccionados, incluidos los que estan fuera de la ventana."""
+        if self._marked:
+            return list(self._marked)
+        return [self._selected] if self._selected else []
+
+    def select(self, iid: str, see: bool = True) -> bool:
+        k = self._display_index(iid)
+        if k is None:
+            return False
+        self._selected = iid
+        self._marked = {iid: None}
+        if see:
+            self._scroll_into_view(k)
+        self._render()
+        return True
+
+    def see(self, iid: str) -> None:
+        k = self._display_index(iid)
+        if k is not None:
+            self._scroll_into_view(k)
+            self._render()
+
+    # ---------------- Internals ----------------
+    def _display_index(self, iid: str) -> Optional[int]:
+        if not iid or not len(self.positions):
+            return None
+        if iid in self._rendered:
+            return self.offset + self._rendered.index(iid)
+        pos = self._locate(iid)
+        if pos is None:
+            return None
+        return self._index_of.get(pos)
+
+    def _set_model(self, positions: np.ndarray) -> None:
+        self.positions = positions
+        self._index_of = {p: k for k, p in enumerate(positions.tolist())}
+
+    def _max_offset(self) -> int:
+        return max(0, len(self.positions) - self._visible)
+
+    def _scroll_to(self, offset: int) -> None:
+        offset = min(max(0, int(offset)), self._max_offset())
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def _scroll_into_view(self, k: int) -> None:
+        if k < self.offset:
+            self.offset = k
+        elif k >= self.offset + self._visible:
+            self.offset = min(k - self._visible + 1, self._max_offset())
+
+    def _render(self) -> None:
+        tree = self.tree
+        self.offset = min(self.offset, self._max_offset())
+        end = min(len(self.positions), self.offset + self._visible + self.overscan)
+        rows = self._rows(self.positions[self.offset:end], self.offset) if end > self.offset else []
+        wanted = [r[0] for r in rows]
+        keep = set(wanted)
+        self._sync.apply(rows)
+        self._rendered = wanted
+        shown = tuple(iid for iid in (self._marked or {self._selected: None}) if iid in keep)
+        if set(tree.selection()) != set(shown):
+            tree.selection_set(shown)
+        if self._selected in keep:
+            tree.focus(self._selected)
+        tree.yview_moveto(0)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self) -> None:
+        n = len(self.positions)
+        if not n:
+            self.vsb.set(0.0, 1.0)
+            return
+        self.vsb.set(self.offset / n, min(1.0, (self.offset + self._visible) / n))
+
+    def _on_scrollbar(self, *args) -> None:
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self._scroll_to(round(float(args[1]) * len(self.positions)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            unit = self._visible if args[2] == 'pages' else 1
+            self._scroll_to(self.offset + step * unit)
+
+    def _on_wheel(self, event) -> str:
+        if getattr(event, 'num', None) == 4:
+            delta = -3
+        elif getattr(event, 'num', None) == 5:
+            delta = 3
+        else:
+            delta = -3 * int(event.delta / 120) if event.delta else 0
+        if delta:
+            self._scroll_to(self.offset + delta)
+        return 'break'
+
+    def _on_key(self, delta) -> str:
+        n = len(self.positions)
+        if not n:
+            return 'break'
+        cur = self._display_index(self._selected) if self._selected else None
+        if delta == 'home':
+            k = 0
+        elif delta == 'end':
+            k = n - 1
+        elif delta in ('page-', 'page+'):
+            step = self._visible if delta == 'page+' else -self._visible
+            k = (self.offset if cur is None else cur) + step
+        else:
+            k = (self.offset - 1 if cur is None else cur) + delta
+        k = min(max(0, k), n - 1)
+        self._scroll_into_view(k)
+        self._render()
+        rendered = self._rendered[k - self.offset] if 0 <= k - self.offset < len(self._rendered) else None
+        if rendered is not None:
+            self._selected = rendered
+            self._marked = {rendered: None}
+            self.tree.selection_set(rendered)
+            self.tree.focus(rendered)
+        return 'break'
+
+    def _on_select(self, _event=None) -> None:
+        sel = self.tree.selection()
+        window = set(self._rendered)
+        current = self._marked or ({self._selected: None} if self._selected else {})
+        if set(sel) == {iid for iid in current if iid in window}:
+            return  # eco de la seleccion que puso _render
+        # Ctrl/Shift+clic conserva lo seleccionado fuera de la ventana
+        extends = self._click_extends and str(self.tree.cget('selectmode')) == 'extended'
+        self._click_extends = False
+        marked = {iid: None for iid in self._marked if iid not in window} if extends else {}
+        marked.update((iid, None) for iid in sel)
+        self._marked = marked
+        focus = self.tree.focus()
+        if focus in sel:
+            self._selected = focus
+        elif sel:
+            self._selected = sel[0]
+        elif self._selected in window:
+            self._selected = None
+
+    def _on_configure(self, _event=None) -> None:
+        height = self.tree.winfo_height()
+        if self._rendered:
+            bbox = self.tree.bbox(self._rendered[0])
+            if bbox:
+                self._row_height = int(bbox[3]) or self._row_height
+                header = int(bbox[1])
+            else:
+                header = 24
+        else:
+            header = 24
+        row_h = self._row_height or 20
+        visible = max(1, (height - header) // row_h)
+        if visible != self._visible:
+            self._visible = visible
+            self._render()